@@ -7,6 +7,7 @@ import datetime
 import sys
 import os
 import asyncio
+import time
 import uuid
 import warnings
 from pathlib import Path
@@ -28,14 +29,13 @@ WEB_BACKEND_PATH = BASE_DIR / "Web" / "backend"
 if str(WEB_BACKEND_PATH) not in sys.path:
     sys.path.insert(0, str(WEB_BACKEND_PATH))
 
-from sqlmodel import Session, select, func
-from sqlalchemy import desc, bindparam
+from sqlmodel import Session, select
 from app.database import engine
 from app.models.subscription import Subscription
-from app.models.history import ElectricityHistory
+from app.services.history import HistoryService, HistoryReading
+from app.utils.history_partitions import maintain_history_partitions
 from app.config import settings
-from app.core.electricity import ECampusElectricity
-from app.core.buildings import get_building_index
+from app.core.electricity import AsyncECampusElectricity, configure_async_pool, close_async_pool
 
 # 配置日志记录器
 pylog.basicConfig(
@@ -52,6 +52,7 @@ pylog.basicConfig(
 # 从统一配置读取
 WAIT_TIME = settings.TRACKER_CHECK_INTERVAL
 HIS_LIMIT = settings.HISTORY_LIMIT
+TRACKER_CONCURRENCY = max(settings.TRACKER_CONCURRENCY, 1)
 TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 SHANGHAI_TZ = ZoneInfo("Asia/Shanghai")
 
@@ -60,6 +61,9 @@ RETRY_INTERVAL_SECONDS = 60  # 重试间隔：1分钟
 MAX_RETRY_COUNT = 3  # 最大重试次数：3次
 RETRY_DELAY_AFTER_NORMAL_QUERY = 300  # 正常查询轮次结束后等待5分钟再重查
 RETRY_LOG_RETENTION_DAYS = 7  # 重试日志保留7天
+HISTORY_MAINTENANCE_INTERVAL = 3600  # 历史数据裁剪的最小间隔（秒）
+
+_last_maintenance_time: Optional[float] = None
 
 
 class ErrorType(Enum):
@@ -82,6 +86,25 @@ class RetryRecord:
     retry_logs: List[Tuple[datetime.datetime, str, bool]] = field(default_factory=list)  # (时间, 错误信息, 是否成功)
 
 
+@dataclass
+class QueryTarget:
+    """一轮查询中的单个订阅快照（脱离数据库会话使用）"""
+    subscription_id: uuid.UUID
+    room_name: str
+    location: Optional[Dict[str, str]] = None
+
+
+@dataclass
+class QueryOutcome:
+    """单个订阅的查询结果，由写库阶段统一处理"""
+    target: QueryTarget
+    value: float
+    error_type: Optional[ErrorType]
+    error_message: Optional[str]
+    location: Optional[Dict[str, str]]
+    queried_at: datetime.datetime
+
+
 class RetryQueue:
     """重查队列管理器"""
     
@@ -213,10 +236,11 @@ class RetryQueue:
 retry_queue = RetryQueue()
 
 # 初始化电费查询服务
-electricity_service = ECampusElectricity({
+electricity_service = AsyncECampusElectricity({
     "shiroJID": settings.SHIRO_JID or "",
     "floor_offset_file": None
 })
+configure_async_pool(settings.UPSTREAM_MAX_CONNECTIONS, settings.UPSTREAM_MAX_CONCURRENCY)
 
 
 def get_shanghai_time() -> datetime.datetime:
@@ -224,93 +248,186 @@ def get_shanghai_time() -> datetime.datetime:
     return datetime.datetime.now(SHANGHAI_TZ)
 
 
-def elect_require(target_name: str) -> Tuple[float, Optional[ErrorType], Optional[str]]:
+async def elect_require(
+    target_name: str,
+    location: Optional[Dict[str, str]] = None,
+) -> Tuple[float, Optional[ErrorType], Optional[str], Optional[Dict[str, str]]]:
     """
     执行实际的查询操作。
 
     Args:
         target_name (str): 需要查询的目标名称（格式：楼栋 房间号，如 "10南 606"）。
+        location: 已保存的上游定位，存在时直接查询余额，上游报错才重新解析。
 
     Returns:
-        Tuple[float, Optional[ErrorType], Optional[str]]: 
-            - 成功时返回 (电费余额, None, None)
-            - 失败时返回 (0.0, ErrorType, 错误信息)
+        Tuple[float, Optional[ErrorType], Optional[str], Optional[Dict[str, str]]]: 
+            - 成功时返回 (电费余额, None, None, 上游定位)
+            - 失败时返回 (0.0, ErrorType, 错误信息, None)
     """
     pylog.info(f"开始为 '{target_name}' 执行查询...")
     
     parts = target_name.strip().split(' ')
     if len(parts) != 2:
         error_msg = f"查询 '{target_name}' 时参数数量不正确，应为2个（楼栋 房间号）"
-        return (0.0, ErrorType.PARAMETER_ERROR, error_msg)  # 参数错误，不重试
+        return (0.0, ErrorType.PARAMETER_ERROR, error_msg, None)  # 参数错误，不重试
 
-    build_part = parts[0]
     room_part = parts[1]
-    area = 1 if build_part.startswith('D') else 0
-
-    building_idx = get_building_index(area, build_part)
-    floor = int(room_part[0]) - 1
-    room_num = int(room_part[1:]) - 1
+    if not room_part.isdigit():
+        error_msg = f"查询 '{target_name}' 时房间号格式错误，应为3-4位数字"
+        return (0.0, ErrorType.PARAMETER_ERROR, error_msg, None)
 
     try:
-        result = electricity_service.query_room_surplus_by_human(
-            area_index=area,
-            building_name=build_part,
-            floor_number=int(room_part[0]),
-            room_number=int(room_part)
-        )
+        result = await electricity_service.query_room_surplus_resolved(target_name, location)
         
-        if result.get("exception"):
-            error_msg = f"网络错误: {result.get('exception', '未知网络错误')}"
-            return (0.0, ErrorType.NETWORK_ERROR, error_msg)
+        if (result.get("raw") or {}).get("exception"):
+            error_msg = f"网络错误: {result['raw']['exception']}"
+            return (0.0, ErrorType.NETWORK_ERROR, error_msg, None)
         
         if result.get("error") == 0:
-            return (result["data"]["surplus"], None, None)
+            return (result["data"]["surplus"], None, None, result["data"].get("location"))
         else:
             error_msg = result.get("error_description", "未知错误")
-            return (0.0, ErrorType.API_ERROR, error_msg)
+            return (0.0, ErrorType.API_ERROR, error_msg, None)
     
     except Exception as e:
         error_msg = f"查询异常: {str(e)}"
         if "timeout" in str(e).lower() or "connection" in str(e).lower() or "network" in str(e).lower():
-            return (0.0, ErrorType.NETWORK_ERROR, error_msg)
+            return (0.0, ErrorType.NETWORK_ERROR, error_msg, None)
         else:
-            return (0.0, ErrorType.API_ERROR, error_msg)
+            return (0.0, ErrorType.API_ERROR, error_msg, None)
 
 
+def save_resolved_location(session: Session, subscription_id: uuid.UUID, location: Optional[Dict[str, str]]):
+    """
+    保存订阅的上游定位，后续轮次直接查询余额。
+    不提交：与本轮历史记录在 HistoryService.ingest 的同一事务中提交（写入冲突回滚时一并丢弃，下一轮重新保存）。
+    """
+    if not location:
+        return
+    subscription = session.get(Subscription, subscription_id)
+    if subscription is None or subscription.resolved_location == location:
+        return
+    subscription.resolved_location = location
+    session.add(subscription)
+    pylog.info(f"订阅 {subscription.room_name} (ID: {subscription_id}) 已保存上游定位: {location}")
 
-def get_latest_history(session: Session, subscription_id: uuid.UUID) -> Optional[ElectricityHistory]:
-    """获取订阅的最新历史记录"""
-    timestamp_col = cast(Any, ElectricityHistory.timestamp)
-    statement = select(ElectricityHistory).where(
-        ElectricityHistory.subscription_id == subscription_id
-    ).order_by(desc(timestamp_col)).limit(1)
-    
-    return session.exec(statement).first()
+
+async def query_round(targets: List[QueryTarget]) -> List[QueryOutcome]:
+    """
+    并发执行一轮查询：最多 TRACKER_CONCURRENCY 个 worker 从队列中领取订阅，
+    只负责访问上游，不触碰数据库；结果按输入顺序返回。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for index, target in enumerate(targets):
+        queue.put_nowait((index, target))
+    outcomes: List[Optional[QueryOutcome]] = [None] * len(targets)
+
+    async def worker():
+        while True:
+            try:
+                index, target = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                value, error_type, error_message, location = await elect_require(target.room_name, target.location)
+            except Exception as e:
+                value, error_type, error_message, location = 0.0, ErrorType.NETWORK_ERROR, f"未知异常: {str(e)}", None
+            outcomes[index] = QueryOutcome(
+                target=target,
+                value=value,
+                error_type=error_type,
+                error_message=error_message,
+                location=location,
+                queried_at=get_shanghai_time().replace(tzinfo=None),
+            )
+
+    worker_count = min(TRACKER_CONCURRENCY, len(targets))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
+    return [outcome for outcome in outcomes if outcome is not None]
 
 
-def should_add_history(session: Session, subscription_id: uuid.UUID, new_value: float) -> bool:
+def load_query_targets(session: Session, subscription_ids: Optional[List[uuid.UUID]] = None) -> List[QueryTarget]:
+    """读取订阅快照；未指定 ID 时读取全部活跃订阅"""
+    statement = select(Subscription)
+    if subscription_ids is None:
+        statement = statement.where(Subscription.is_active == True)
+    else:
+        statement = statement.where(cast(Any, Subscription.id).in_(subscription_ids))
+    targets = []
+    for subscription in session.exec(statement).all():
+        if subscription.id is None:
+            pylog.warning(f"订阅 {subscription.room_name} 缺少 ID，已跳过。")
+            continue
+        targets.append(QueryTarget(
+            subscription_id=cast(uuid.UUID, subscription.id),
+            room_name=subscription.room_name,
+            location=subscription.resolved_location,
+        ))
+    return targets
+
+
+def ingest_outcomes(session: Session, outcomes: List[QueryOutcome], label: str = "") -> set:
     """
-    判断是否应该添加历史记录。
-    如果上一次查询与本次电费相同，且时间差小于2小时，则不保存。
+    批量写入成功的查询结果：保存变化的定位，一次读取最新记录、内存去重、单次批量插入，
+    定位与历史记录在同一事务中提交。
+    返回实际写入了新数据的订阅 ID 集合。
     """
-    latest = get_latest_history(session, subscription_id)
-    
-    if not latest:
-        return True
-    
-    if latest.surplus == new_value:
-        current_time = get_shanghai_time()
-        if latest.timestamp.tzinfo is None:
-            latest_time = latest.timestamp.replace(tzinfo=SHANGHAI_TZ)
+    for outcome in outcomes:
+        if outcome.location != outcome.target.location:
+            save_resolved_location(session, outcome.target.subscription_id, outcome.location)
+
+    readings = [
+        HistoryReading(outcome.target.subscription_id, outcome.value, outcome.queried_at)
+        for outcome in outcomes
+    ]
+    stored = HistoryService(session).ingest(readings)
+    stored_ids = {reading.subscription_id for reading in stored}
+
+    for outcome in outcomes:
+        target = outcome.target
+        if target.subscription_id in stored_ids:
+            pylog.info(f"房间 {target.room_name} (ID: {target.subscription_id}) {label}得到新数据，值: {outcome.value}, 时间: {outcome.queried_at.strftime(TIME_FORMAT)}")
         else:
-            latest_time = latest.timestamp.astimezone(SHANGHAI_TZ)
-        
-        time_difference = current_time - latest_time
-        if time_difference < datetime.timedelta(hours=2):
-            pylog.info(f"订阅 {subscription_id} 数据未变 (值: {new_value}) 且时间差小于2小时，跳过保存。")
-            return False
-    
-    return True
+            pylog.info(f"房间 {target.room_name} (ID: {target.subscription_id}) {label}数据未变化，跳过保存")
+
+    return stored_ids
+
+
+def apply_round_results(outcomes: List[QueryOutcome]):
+    """写库阶段：统一处理一轮查询结果，失败的订阅加入重查队列"""
+    succeeded: List[QueryOutcome] = []
+    for outcome in outcomes:
+        target = outcome.target
+        if outcome.error_type is None:
+            succeeded.append(outcome)
+            continue
+        if outcome.error_type == ErrorType.PARAMETER_ERROR:
+            pylog.error(f"订阅 {target.room_name} (ID: {target.subscription_id}) 参数错误，跳过处理: {outcome.error_message}")
+            continue
+        retry_queue.add_failed_subscription(
+            subscription_id=target.subscription_id,
+            room_name=target.room_name,
+            error_type=outcome.error_type,
+            error_message=outcome.error_message or "未知错误"
+        )
+
+    if not succeeded:
+        return
+
+    with Session(engine) as session:
+        try:
+            stored_ids = ingest_outcomes(session, succeeded)
+            pylog.info(f"本轮批量写入 {len(stored_ids)} 条新记录，{len(succeeded) - len(stored_ids)} 个房间数据未变化")
+        except Exception as e:
+            session.rollback()
+            pylog.error(f"批量写入历史记录失败，本轮成功查询的订阅将进入重查队列。错误详情: {e}")
+            for outcome in succeeded:
+                retry_queue.add_failed_subscription(
+                    subscription_id=outcome.target.subscription_id,
+                    room_name=outcome.target.room_name,
+                    error_type=ErrorType.NETWORK_ERROR,
+                    error_message=f"未知异常: {str(e)}"
+                )
 
 
 async def process_retry_queue():
@@ -351,45 +468,40 @@ async def process_retry_queue():
                     continue
             break
         
-        # 重试批次创建新的数据库会话
+        for record in ready_records:
+            pylog.info(f"重试查询订阅 {record.room_name} (ID: {record.subscription_id})，第 {record.retry_count + 1} 次重试")
+
+        # 重试批次同样并发查询，再用新的数据库会话写入
         with Session(engine) as session:
-            for record in ready_records:
+            known = {t.subscription_id: t for t in load_query_targets(session, [r.subscription_id for r in ready_records])}
+        targets = [
+            known.get(record.subscription_id) or QueryTarget(record.subscription_id, record.room_name)
+            for record in ready_records
+        ]
+        outcomes = await query_round(targets)
+
+        succeeded = [outcome for outcome in outcomes if outcome.error_type is None]
+        for outcome in outcomes:
+            if outcome.error_type is not None:
+                retry_queue.mark_retry_failed(
+                    outcome.target.subscription_id,
+                    f"{outcome.error_type.value}: {outcome.error_message}"
+                )
+
+        if succeeded:
+            with Session(engine) as session:
                 try:
-                    pylog.info(f"重试查询订阅 {record.room_name} (ID: {record.subscription_id})，第 {record.retry_count + 1} 次重试")
-                    
-                    new_value, error_type, error_message = elect_require(record.room_name)
-                    
-                    if error_type is None:
-                        record_time = get_shanghai_time().replace(tzinfo=None)
-                        
-                        if should_add_history(session, record.subscription_id, new_value):
-                            history = ElectricityHistory(
-                                subscription_id=record.subscription_id,
-                                surplus=new_value,
-                                timestamp=record_time
-                            )
-                            session.add(history)
-                            session.commit()
-                            pylog.info(f"房间 {record.room_name} (ID: {record.subscription_id}) 重试成功，得到新数据，值: {new_value}, 时间: {record_time.strftime(TIME_FORMAT)}")
-                        else:
-                            pylog.info(f"房间 {record.room_name} (ID: {record.subscription_id}) 重试成功，但数据未变化，跳过保存")
-                        
-                        cleanup_old_history(session, record.subscription_id)
-                        
+                    ingest_outcomes(session, succeeded, label="重试成功，")
+                    for outcome in succeeded:
                         retry_queue.mark_retry_success(
-                            record.subscription_id,
-                            f"重试成功，电费余额: {new_value}"
+                            outcome.target.subscription_id,
+                            f"重试成功，电费余额: {outcome.value}"
                         )
-                    else:
-                        retry_queue.mark_retry_failed(
-                            record.subscription_id,
-                            f"{error_type.value}: {error_message}"
-                        )
-                        
                 except Exception as e:
-                    error_msg = f"重试异常: {str(e)}"
-                    pylog.error(f"重试订阅 {record.room_name} (ID: {record.subscription_id}) 时发生异常: {e}")
-                    retry_queue.mark_retry_failed(record.subscription_id, error_msg)
+                    session.rollback()
+                    pylog.error(f"重试结果写入数据库时发生异常: {e}")
+                    for outcome in succeeded:
+                        retry_queue.mark_retry_failed(outcome.target.subscription_id, f"重试异常: {str(e)}")
         
         await asyncio.sleep(1)
     
@@ -400,45 +512,23 @@ async def process_retry_queue():
         pylog.info(f"重查队列处理完成，仍有 {remaining_count} 个订阅待重试（可能已达到最大重试次数，将在下次正常查询后继续重试）")
 
 
-def cleanup_old_history(session: Session, subscription_id: Optional[uuid.UUID]):
-    """清理超出限制的旧历史记录"""
-    if subscription_id is None:
+def run_history_maintenance(force: bool = False):
+    """周期性维护：维护历史分区，并用一条 DELETE 语句为所有订阅裁剪超出上限的旧历史记录"""
+    global _last_maintenance_time
+    now = time.monotonic()
+    if not force and _last_maintenance_time is not None and now - _last_maintenance_time < HISTORY_MAINTENANCE_INTERVAL:
         return
-    sub_id: uuid.UUID = subscription_id
-    sub_expr = bindparam("subscription_id", value=sub_id)
-    id_col = cast(Any, ElectricityHistory.id)
-    count_statement = select(func.count(id_col)).where(
-        ElectricityHistory.subscription_id == sub_expr
-    )
-    count = session.exec(count_statement).first()
-    
-    if count and count > HIS_LIMIT:
-        # 获取需要保留的记录（最新的）
-        timestamp_col = cast(Any, ElectricityHistory.timestamp)
-        keep_statement = cast(
-            Any,
-            select(ElectricityHistory).where(
-                ElectricityHistory.subscription_id == sub_expr
-            ).order_by(desc(timestamp_col)).limit(HIS_LIMIT),
-        )
-        
-        keep_records = list(session.exec(keep_statement).all())
-        keep_ids = {r.id for r in keep_records}
-        
-        all_statement = select(ElectricityHistory).where(
-            ElectricityHistory.subscription_id == sub_expr
-        )
-        all_records = list(session.exec(all_statement).all())
-        
-        deleted = 0
-        for record in all_records:
-            if record.id not in keep_ids:
-                session.delete(record)
-                deleted += 1
-        
+    _last_maintenance_time = now
+    try:
+        if settings.HISTORY_PARTITIONING:
+            # 分区模式：补齐未来月份分区，按月整体删除过期分区
+            maintain_history_partitions(engine, settings.HISTORY_RETENTION_MONTHS, get_shanghai_time().replace(tzinfo=None))
+        with Session(engine) as session:
+            deleted = HistoryService(session).trim_history(HIS_LIMIT)
         if deleted > 0:
-            session.commit()
-            pylog.info(f"订阅 {subscription_id} 历史数据超出数据上限，已删除 {deleted} 条旧记录")
+            pylog.info(f"历史数据维护完成，已删除 {deleted} 条超出上限的旧记录")
+    except Exception as e:
+        pylog.error(f"历史数据维护失败: {e}")
 
 
 async def main():
@@ -447,6 +537,7 @@ async def main():
     """
     pylog.info("正在初始化电费查询模块...")
     pylog.info("模块初始化成功。")
+    run_history_maintenance(force=True)
 
     while True:
         current_time_str = get_shanghai_time().strftime(TIME_FORMAT)
@@ -454,69 +545,31 @@ async def main():
 
         try:
             with Session(engine) as session:
-                statement = select(Subscription).where(Subscription.is_active == True)
-                subscriptions = list(session.exec(statement).all())
-                pylog.info(f"成功从数据库读取订阅，共找到 {len(subscriptions)} 条活跃订阅。")
-                
-                if len(subscriptions) == 0:
-                    pylog.warning(f"没有找到活跃订阅，将在 {WAIT_TIME} 秒后重试...")
-                    await asyncio.sleep(WAIT_TIME)
-                    continue
+                targets = load_query_targets(session)
+            pylog.info(f"成功从数据库读取订阅，共找到 {len(targets)} 条活跃订阅。")
+
+            if len(targets) == 0:
+                pylog.warning(f"没有找到活跃订阅，将在 {WAIT_TIME} 秒后重试...")
+                await asyncio.sleep(WAIT_TIME)
+                continue
+
+            # 第一阶段：并发查询上游；第二阶段：统一写库
+            round_start = time.perf_counter()
+            outcomes = await query_round(targets)
+            query_elapsed = time.perf_counter() - round_start
+            apply_round_results(outcomes)
+            round_elapsed = time.perf_counter() - round_start
+
+            pylog.info(
+                f"所有订阅房间已查询完毕，数据已写入数据库。"
+                f"本轮 {len(targets)} 个订阅，并发 {TRACKER_CONCURRENCY}，"
+                f"查询耗时 {query_elapsed:.2f} 秒，写库耗时 {round_elapsed - query_elapsed:.2f} 秒，"
+                f"总耗时 {round_elapsed:.2f} 秒"
+            )
+            if round_elapsed > WAIT_TIME:
+                pylog.warning(f"本轮耗时超过查询间隔 {WAIT_TIME} 秒，请考虑调大 TRACKER_CONCURRENCY")
 
-                for subscription in subscriptions:
-                    try:
-                        if subscription.id is None:
-                            pylog.warning(f"订阅 {subscription.room_name} 缺少 ID，已跳过。")
-                            continue
-                        sub_id: uuid.UUID = cast(uuid.UUID, subscription.id)
-
-                        # 执行查询
-                        new_value, error_type, error_message = elect_require(subscription.room_name)
-                        
-                        # 查询失败，处理错误
-                        if error_type is not None:
-                            if error_type == ErrorType.PARAMETER_ERROR:
-                                pylog.error(f"订阅 {subscription.room_name} (ID: {sub_id}) 参数错误，跳过处理: {error_message}")
-                                continue
-                            
-                            retry_queue.add_failed_subscription(
-                                subscription_id=sub_id,
-                                room_name=subscription.room_name,
-                                error_type=error_type,
-                                error_message=error_message or "未知错误"
-                            )
-                            continue
-                        
-                        # 查询成功，处理数据
-                        record_time = get_shanghai_time().replace(tzinfo=None)
-                        
-                        if should_add_history(session, sub_id, new_value):
-                            history = ElectricityHistory(
-                                subscription_id=sub_id,
-                                surplus=new_value,
-                                timestamp=record_time
-                            )
-                            session.add(history)
-                            session.commit()
-                            pylog.info(f"房间 {subscription.room_name} (ID: {sub_id}) 得到新数据，值: {new_value}, 时间: {record_time.strftime(TIME_FORMAT)}")
-                        else:
-                            pylog.info(f"房间 {subscription.room_name} (ID: {sub_id}) 数据未变化，跳过保存")
-                        
-                        # 清理旧的历史记录
-                        cleanup_old_history(session, sub_id)
-                        
-                    except Exception as e:
-                        pylog.error(f"处理房间 '{subscription.room_name}' (ID: {getattr(subscription, 'id', None)}) 时发生错误，已跳过。错误详情: {e}")
-                        if subscription.id:
-                            retry_queue.add_failed_subscription(
-                                subscription_id=cast(uuid.UUID, subscription.id),
-                                room_name=subscription.room_name,
-                                error_type=ErrorType.NETWORK_ERROR,
-                                error_message=f"未知异常: {str(e)}"
-                            )
-                        continue
-                
-                pylog.info(f"所有订阅房间已查询完毕，数据已写入数据库。")
+            run_history_maintenance()
             
             if not retry_queue.is_empty():
                 pylog.info(f"发现 {len(retry_queue.queue)} 个失败的订阅，将在 {RETRY_DELAY_AFTER_NORMAL_QUERY} 秒后开始重查...")
@@ -544,9 +597,16 @@ if __name__ == "__main__":
     pylog.info(f"数据库连接: {settings.DATABASE_URL}")
     pylog.info(f"查询间隔: {WAIT_TIME} 秒")
     pylog.info(f"历史记录上限: {HIS_LIMIT} 条")
+    pylog.info(f"查询并发数: {TRACKER_CONCURRENCY}")
     
+    async def run():
+        try:
+            await main()
+        finally:
+            await close_async_pool()
+
     try:
-        asyncio.run(main())
+        asyncio.run(run())
     except KeyboardInterrupt:
         print("\n程序被用户中断。")
         pylog.info("程序被用户中断。")
@@ -1,29 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select, func
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+from typing import List, Literal, Optional
+from datetime import datetime, timedelta
+import json
 import uuid
-from app.database import get_session
+from app.database import engine, get_session
 from app.models.user import User
 from app.models.history import ElectricityHistory
-from app.schemas.history import ElectricityHistoryResponse, HistoryStatsResponse
+from app.models.subscription_state import SubscriptionState
+from app.schemas.history import (
+    ElectricityHistoryResponse,
+    HistoryStatsResponse,
+    HistorySeriesPoint,
+    HistorySeriesResponse,
+    HistoryBatchRequest,
+    HistoryBatchItem,
+    HistoryBatchResponse,
+)
 from app.services.subscription import SubscriptionService
+from app.services.history import HistoryService, HistoryStats, floor_time, run_points, stats_from_state
+from app.utils.downsample import lttb_indices, parse_bucket
+from app.utils.export import EXPORT_MEDIA_TYPES, iter_export
+from app.utils.http_cache import conditional_get
+from app.utils.pagination import NEXT_CURSOR_HEADER, apply_desc_cursor, encode_cursor
 from app.dependencies import get_current_user
-from app.utils.timezone import to_shanghai_naive, now_naive
+from app.utils.timezone import to_shanghai_naive, now_naive, to_epoch_seconds
 
 router = APIRouter()
 
+# 降采样序列：默认时间跨度 / 默认点数 / 单次返回的点数上限
+DEFAULT_SERIES_SPAN = timedelta(days=30)
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+# 未指定 end 时默认窗口的截止时间按该步长（秒）向上取整，桶聚合时按桶宽取整
+SERIES_WINDOW_STEP = 300
+
+
+@router.get("/export")
+async def export_history(
+    subscription_id: Optional[List[uuid.UUID]] = Query(None, description="只导出指定订阅（可重复），默认导出全部可访问的订阅"),
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    以 CSV / NDJSON 流式导出历史记录（分块传输），
+    服务端游标分批读取，内存占用与导出行数无关。
+    """
+    service = SubscriptionService(session)
+    if subscription_id:
+        for sub_id in subscription_id:
+            if not service.get_subscription(sub_id, current_user.id, is_admin=current_user.is_admin):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Subscription {sub_id} not found"
+                )
+        ids = subscription_id
+    else:
+        ids = [sub.id for sub in service.get_user_subscriptions(current_user.id, include_all=current_user.is_admin)]
+
+    start = to_shanghai_naive(start_time)
+    end = to_shanghai_naive(end_time)
+
+    def generate():
+        # 使用独立会话，不依赖请求会话在流式响应期间的生命周期
+        with Session(engine) as export_session:
+            rows = HistoryService(export_session).iter_export_rows(ids, start, end)
+            yield from iter_export(rows, export_format)
+
+    filename = f"electricity_history_{now_naive():%Y%m%d_%H%M%S}.{export_format}"
+    return StreamingResponse(
+        generate(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 
 @router.get("/subscriptions/{subscription_id}", response_model=List[ElectricityHistoryResponse])
 async def get_subscription_history(
     subscription_id: uuid.UUID,
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，指定后忽略 skip"),
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
+    response_format: Literal["rows", "columnar"] = Query("rows", alias="format"),
+    runs: Literal["expand", "collapse"] = Query("expand", description="游程记录展开为首末两个读数，或按记录返回"),
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
+    """
+    按时间倒序分页；下一页游标在响应头 X-Next-Cursor 中返回，没有更多数据时不返回。
+    format=columnar 时返回 {"t": [Unix 秒...], "v": [余额...]}，不逐行构造响应模型。
+    分页按记录计数：runs=expand 时一条游程记录额外返回最后一次读到的读数（id 为空、run_end 为 True）；
+    runs=collapse 时每条记录返回一次（columnar 额外返回末次时间 "e" 与次数 "n"）。
+    """
     service = SubscriptionService(session)
     subscription = service.get_subscription(subscription_id, current_user.id)
     if not subscription:
@@ -31,8 +107,22 @@ async def get_subscription_history(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Subscription not found"
         )
+    not_modified = conditional_get(request, response, subscription_id, session.get(SubscriptionState, subscription_id))
+    if not_modified:
+        return not_modified
     
-    statement = select(ElectricityHistory).where(
+    columnar = response_format == "columnar"
+    if columnar:
+        statement = select(
+            ElectricityHistory.timestamp,
+            ElectricityHistory.id,
+            ElectricityHistory.surplus,
+            ElectricityHistory.last_seen,
+            ElectricityHistory.samples,
+        )
+    else:
+        statement = select(ElectricityHistory)
+    statement = statement.where(
         ElectricityHistory.subscription_id == subscription_id
     )
     
@@ -41,19 +131,224 @@ async def get_subscription_history(
     if end_time:
         statement = statement.where(ElectricityHistory.timestamp <= end_time)
     
-    statement = statement.order_by(ElectricityHistory.timestamp.desc())
-    statement = statement.offset(skip).limit(limit)
+    if cursor:
+        try:
+            statement = apply_desc_cursor(statement, ElectricityHistory.timestamp, ElectricityHistory.id, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        statement = statement.offset(skip)
+
+    statement = statement.order_by(ElectricityHistory.timestamp.desc(), ElectricityHistory.id.desc())
+    statement = statement.limit(limit + 1)
     
     history = list(session.exec(statement).all())
+    if len(history) > limit:
+        history = history[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(history[-1].timestamp, history[-1].id)
+    expand = runs == "expand"
+    if columnar:
+        if expand:
+            # 倒序返回，游程的末次读数排在首次读数之前
+            points = [point for row in history for point in reversed(run_points(row.timestamp, row.surplus, row.last_seen))]
+            payload = {
+                "t": [to_epoch_seconds(timestamp) for timestamp, _ in points],
+                "v": [round(value, 2) for _, value in points],
+            }
+        else:
+            payload = {
+                "t": [to_epoch_seconds(row.timestamp) for row in history],
+                "v": [round(row.surplus, 2) for row in history],
+                "e": [to_epoch_seconds(row.last_seen or row.timestamp) for row in history],
+                "n": [row.samples for row in history],
+            }
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+        return Response(json.dumps(payload, separators=(",", ":")), media_type="application/json", headers=headers)
+    items = []
     for item in history:
+        item = ElectricityHistoryResponse.model_validate(item)
         item.timestamp = to_shanghai_naive(item.timestamp)
+        item.last_seen = to_shanghai_naive(item.last_seen)
         item.created_at = to_shanghai_naive(item.created_at)
-    return history
+        if expand and item.last_seen and item.last_seen > item.timestamp:
+            items.append(item.model_copy(update={"id": None, "timestamp": item.last_seen, "run_end": True}))
+        items.append(item)
+    return items
+
+
+@router.get("/subscriptions/{subscription_id}/series", response_model=HistorySeriesResponse)
+async def get_subscription_series(
+    subscription_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[str] = Query(None, description="时间桶宽度，如 15m、1h、1d"),
+    max_points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS, description="LTTB 抽稀后的最大点数"),
+    runs: Literal["expand", "collapse"] = Query("expand", description="LTTB 模式下游程记录是否展开为首末两个读数"),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    降采样历史序列：
+    - bucket：在 SQL 中按时间桶聚合，返回每桶 min/max/avg/last
+    - max_points：LTTB 抽稀到不超过 max_points 个原始点（两者都未指定时默认此模式）
+    """
+    service = SubscriptionService(session)
+    subscription = service.get_subscription(subscription_id, current_user.id)
+    if not subscription:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subscription not found"
+        )
+    if bucket and max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bucket and max_points are mutually exclusive"
+        )
+    bucket_seconds = _parse_bucket(bucket) if bucket else None
+    start_time, end_time = _series_window(start, end, bucket_seconds or SERIES_WINDOW_STEP)
+    not_modified = conditional_get(
+        request, response, subscription_id, session.get(SubscriptionState, subscription_id), (start_time, end_time)
+    )
+    if not_modified:
+        return not_modified
+
+    history_service = HistoryService(session)
+    if bucket_seconds:
+        _check_bucket_count(bucket_seconds, start_time, end_time)
+        return HistorySeriesResponse(
+            subscription_id=subscription_id,
+            start=start_time,
+            end=end_time,
+            mode="bucket",
+            bucket_seconds=bucket_seconds,
+            points=_bucket_points(history_service.bucket_series(subscription_id, start_time, end_time, bucket_seconds)),
+        )
+
+    raw = history_service.raw_series(subscription_id, start_time, end_time, expand_runs=runs == "expand")
+    return HistorySeriesResponse(
+        subscription_id=subscription_id,
+        start=start_time,
+        end=end_time,
+        mode="lttb",
+        points=_lttb_points(raw, start_time, max_points or DEFAULT_SERIES_POINTS),
+    )
+
+
+@router.post("/batch", response_model=HistoryBatchResponse)
+async def get_history_batch(
+    payload: HistoryBatchRequest,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    一次返回多个订阅的降采样序列（及统计信息），供仪表盘的多个房间卡片共用：
+    一条查询校验全部订阅的访问权限，一条查询取出全部序列。
+    """
+    if payload.bucket and payload.max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bucket and max_points are mutually exclusive"
+        )
+    ids = list(dict.fromkeys(payload.subscription_ids))
+    accessible = SubscriptionService(session).filter_accessible(ids, current_user.id, is_admin=current_user.is_admin)
+    missing = [str(sub_id) for sub_id in ids if sub_id not in accessible]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Subscriptions not found: {', '.join(missing)}"
+        )
+
+    bucket_seconds = _parse_bucket(payload.bucket) if payload.bucket else None
+    start_time, end_time = _series_window(payload.start, payload.end, bucket_seconds or SERIES_WINDOW_STEP)
+    history_service = HistoryService(session)
+    if bucket_seconds:
+        _check_bucket_count(bucket_seconds, start_time, end_time)
+        buckets = history_service.bucket_series_many(ids, start_time, end_time, bucket_seconds)
+        series = {sub_id: _bucket_points(buckets.get(sub_id, [])) for sub_id in ids}
+    else:
+        raw = history_service.raw_series_many(ids, start_time, end_time)
+        max_points = payload.max_points or DEFAULT_SERIES_POINTS
+        series = {sub_id: _lttb_points(raw.get(sub_id, []), start_time, max_points) for sub_id in ids}
+
+    stats = {}
+    if payload.include_stats:
+        states = session.exec(select(SubscriptionState).where(SubscriptionState.subscription_id.in_(ids))).all()
+        stats = {
+            state.subscription_id: _stats_response(state.subscription_id, stats_from_state(state))
+            for state in states
+            if state.sample_count
+        }
+
+    return HistoryBatchResponse(
+        start=start_time,
+        end=end_time,
+        mode="bucket" if bucket_seconds else "lttb",
+        bucket_seconds=bucket_seconds,
+        items=[
+            HistoryBatchItem(subscription_id=sub_id, points=series[sub_id], stats=stats.get(sub_id))
+            for sub_id in ids
+        ],
+    )
+
+
+def _series_window(start: Optional[datetime], end: Optional[datetime], step_seconds: int):
+    """
+    解析序列的时间窗口：默认截至当前、跨度 DEFAULT_SERIES_SPAN。
+    未指定 end 时截止时间按 step_seconds 向上取整，同一步长内的请求得到相同的窗口与 ETag。
+    """
+    end_time = to_shanghai_naive(end) or floor_time(now_naive(), step_seconds) + timedelta(seconds=step_seconds)
+    start_time = to_shanghai_naive(start) or end_time - DEFAULT_SERIES_SPAN
+    if start_time >= end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be earlier than end"
+        )
+    return start_time, end_time
+
+
+def _parse_bucket(bucket: str) -> int:
+    try:
+        return parse_bucket(bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _check_bucket_count(bucket_seconds: int, start_time: datetime, end_time: datetime):
+    if (end_time - start_time).total_seconds() / bucket_seconds > MAX_SERIES_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many buckets, at most {MAX_SERIES_POINTS} per request"
+        )
+
+
+def _bucket_points(buckets) -> List[HistorySeriesPoint]:
+    return [
+        HistorySeriesPoint(
+            timestamp=item.bucket_start,
+            surplus=item.last_surplus,
+            min_surplus=item.min_surplus,
+            max_surplus=item.max_surplus,
+            avg_surplus=item.avg_surplus,
+            count=item.samples,
+            consumption=item.consumption,
+            recharge=item.recharge,
+        )
+        for item in buckets
+    ]
+
+
+def _lttb_points(raw, start_time: datetime, max_points: int) -> List[HistorySeriesPoint]:
+    indices = lttb_indices([((ts - start_time).total_seconds(), value) for ts, value in raw], max_points)
+    return [HistorySeriesPoint(timestamp=raw[i][0], surplus=raw[i][1]) for i in indices]
 
 
 @router.get("/stats/{subscription_id}", response_model=HistoryStatsResponse)
 async def get_history_stats(
     subscription_id: uuid.UUID,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
@@ -64,37 +359,19 @@ async def get_history_stats(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Subscription not found"
         )
-    
-    statement = select(
-        func.count(ElectricityHistory.id).label("total"),
-        func.max(ElectricityHistory.surplus).label("max_surplus"),
-        func.min(ElectricityHistory.surplus).label("min_surplus"),
-        func.avg(ElectricityHistory.surplus).label("avg_surplus"),
-        func.max(ElectricityHistory.timestamp).label("latest_timestamp")
-    ).where(ElectricityHistory.subscription_id == subscription_id)
-    
-    result = session.exec(statement).first()
-    
-    latest_statement = select(ElectricityHistory).where(
-        ElectricityHistory.subscription_id == subscription_id
-    ).order_by(ElectricityHistory.timestamp.desc()).limit(1)
-    latest = session.exec(latest_statement).first()
-    
-    if not result or result[0] == 0:
+    not_modified = conditional_get(request, response, subscription_id, session.get(SubscriptionState, subscription_id))
+    if not_modified:
+        return not_modified
+
+    stats = HistoryService(session).get_stats(subscription_id)
+    if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No history data found"
         )
-    
-    return HistoryStatsResponse(
-        subscription_id=subscription_id,
-        total_records=result[0] or 0,
-        latest_surplus=latest.surplus if latest else 0.0,
-        latest_timestamp=to_shanghai_naive(latest.timestamp) if latest else now_naive(),
-        min_surplus=float(result[2] or 0.0),
-        max_surplus=float(result[1] or 0.0),
-        avg_surplus=float(result[3] or 0.0)
-    )
 
+    return _stats_response(subscription_id, stats)
 
 
+def _stats_response(subscription_id: uuid.UUID, stats: HistoryStats) -> HistoryStatsResponse:
+    return HistoryStatsResponse(subscription_id=subscription_id, **stats._asdict())
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlmodel import Session, select
 from typing import List, Optional
 from datetime import datetime
@@ -7,6 +7,7 @@ from app.models.user import User
 from app.models.log import Log
 from app.schemas.log import LogResponse
 from app.dependencies import get_current_user
+from app.utils.pagination import NEXT_CURSOR_HEADER, apply_desc_cursor, encode_cursor
 from app.utils.timezone import to_shanghai_naive, now_naive
 
 router = APIRouter()
@@ -14,8 +15,10 @@ router = APIRouter()
 
 @router.get("", response_model=List[LogResponse])
 async def get_logs(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值，指定后忽略 skip"),
     level: Optional[str] = None,
     module: Optional[str] = None,
     start_time: Optional[datetime] = None,
@@ -34,10 +37,21 @@ async def get_logs(
     if end_time:
         statement = statement.where(Log.timestamp <= end_time)
     
-    statement = statement.order_by(Log.timestamp.desc())
-    statement = statement.offset(skip).limit(limit)
+    if cursor:
+        try:
+            statement = apply_desc_cursor(statement, Log.timestamp, Log.id, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        statement = statement.offset(skip)
+
+    statement = statement.order_by(Log.timestamp.desc(), Log.id.desc())
+    statement = statement.limit(limit + 1)
     
     logs = list(session.exec(statement).all())
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(logs[-1].timestamp, logs[-1].id)
     result = []
     for log in logs:
         timestamp = log.timestamp if log.timestamp else now_naive()
@@ -1,17 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select, func
+from sqlmodel import Session, select
 from typing import List
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from app.database import get_session
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.schemas.subscription import SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse
 from app.services.subscription import SubscriptionService
 from app.services.electricity import ElectricityService
+from app.services.history import HistoryReading, HistoryService
 from app.dependencies import get_current_user
 from app.models.user_subscription import UserSubscription
-from app.models.history import ElectricityHistory
 from app.utils.timezone import to_shanghai_naive, now_naive
 from app.utils.room_parser import RoomParseError
 from app.config import settings
@@ -25,32 +25,18 @@ async def get_subscriptions(
     session: Session = Depends(get_session)
 ):
     service = SubscriptionService(session)
-    subscriptions = service.get_user_subscriptions(current_user.id, include_all=current_user.is_admin)
+    rows = service.list_subscriptions_with_state(current_user.id, include_all=current_user.is_admin)
     results: List[SubscriptionResponse] = []
-    for sub in subscriptions:
-        mapping_stmt = select(UserSubscription).where(
-            UserSubscription.subscription_id == sub.id,
-            UserSubscription.user_id == current_user.id
-        )
-        mapping = session.exec(mapping_stmt).first()
-        is_owner = current_user.is_admin or (bool(mapping.is_owner) if mapping else False)
-
-        latest_stmt = (
-            select(ElectricityHistory)
-            .where(ElectricityHistory.subscription_id == sub.id)
-            .order_by(ElectricityHistory.timestamp.desc())
-            .limit(1)
-        )
-        latest = session.exec(latest_stmt).first()
-        current_surplus = float(latest.surplus) if latest else None
-        last_query_time = to_shanghai_naive(latest.timestamp) if latest else None
-
+    for sub, mapping_is_owner, state in rows:
+        is_owner = current_user.is_admin or bool(mapping_is_owner)
         results.append(
             SubscriptionResponse(
                 **sub.model_dump(),
                 is_owner=is_owner,
-                current_surplus=current_surplus,
-                last_query_time=last_query_time,
+                current_surplus=state.surplus if state else None,
+                last_query_time=to_shanghai_naive(state.last_query_at) if state else None,
+                burn_rate=state.burn_rate if state else None,
+                estimated_days_left=state.days_left if state else None,
                 email_recipient_count=len(sub.email_recipients or []),
             )
         )
@@ -167,12 +153,14 @@ async def query_subscription(
     mapping = session.exec(owner_stmt).first()
     target_user_id = str(mapping.user_id) if mapping else str(subscription.user_id or current_user.id)
 
-    electricity_service = ElectricityService(session, target_user_id)
-    room_info = electricity_service.query_room_surplus_by_room_name(subscription.room_name)
+    electricity_client = ElectricityService(session, target_user_id).get_async_client()
+    room_info = await electricity_client.query_room_surplus_resolved(
+        subscription.room_name, subscription.resolved_location
+    )
 
     if room_info.get("error") != 0:
         try:
-            cfg = electricity_service._get_ece_instance().config  # type: ignore
+            cfg = electricity_client.config
             sj = cfg.get("shiroJID", "")
             masked = f"{len(sj)} chars" if sj else "empty"
         except Exception:
@@ -190,49 +178,15 @@ async def query_subscription(
             },
         )
 
+    # 上游定位只暂存，与读数在 ingest 的同一事务中提交
+    service.save_resolved_location(subscription, room_info)
     surplus = float(room_info["data"]["surplus"])
     timestamp = now_naive()  # 使用上海时间
 
-    latest_stmt = (
-        select(ElectricityHistory)
-        .where(ElectricityHistory.subscription_id == subscription.id)
-        .order_by(ElectricityHistory.timestamp.desc())
-        .limit(1)
-    )
-    latest = session.exec(latest_stmt).first()
-    should_add = True
-    if latest and latest.surplus == surplus:
-        if timestamp - latest.timestamp < timedelta(hours=2):
-            should_add = False
-
+    stored = HistoryService(session).ingest([HistoryReading(subscription.id, surplus, timestamp)])
+    should_add = bool(stored)
     if should_add:
-        history = ElectricityHistory(
-            subscription_id=subscription.id,
-            surplus=surplus,
-            timestamp=timestamp
-        )
-        session.add(history)
-        session.commit()
-    else:
-        session.rollback()
-
-    count_stmt = select(func.count(ElectricityHistory.id)).where(
-        ElectricityHistory.subscription_id == subscription.id
-    )
-    count = session.exec(count_stmt).first()
-    if count and count > settings.HISTORY_LIMIT:
-        keep_stmt = (
-            select(ElectricityHistory)
-            .where(ElectricityHistory.subscription_id == subscription.id)
-            .order_by(ElectricityHistory.timestamp.desc())
-            .limit(settings.HISTORY_LIMIT)
-        )
-        keep_ids = {r.id for r in session.exec(keep_stmt).all()}
-        all_stmt = select(ElectricityHistory).where(ElectricityHistory.subscription_id == subscription.id)
-        for record in session.exec(all_stmt).all():
-            if record.id not in keep_ids:
-                session.delete(record)
-        session.commit()
+        HistoryService(session).trim_history(settings.HISTORY_LIMIT, [subscription.id])
 
     return {
         "surplus": surplus,
@@ -256,8 +210,8 @@ async def test_subscription(
             detail="Subscription not found"
         )
     
-    electricity_service = ElectricityService(session, str(current_user.id))
-    result = electricity_service.query_room_surplus_by_room_name(subscription.room_name)
+    electricity_client = ElectricityService(session, str(current_user.id)).get_async_client()
+    result = await electricity_client.query_room_surplus_by_room_name(subscription.room_name)
     return result
 
 
@@ -1,9 +1,11 @@
 """WebSocket API 路由：实时日志流"""
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.utils.logging import websocket_log_handler
+from pydantic import ValidationError
+from app.schemas.log import LogStreamFilter
+from app.utils.log_hub import log_hub
 import logging
 import asyncio
-from collections import deque
+import json
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -11,41 +13,67 @@ logger = logging.getLogger(__name__)
 
 @router.websocket("/logs")
 async def websocket_logs(websocket: WebSocket):
-    """WebSocket 端点：实时日志流"""
+    """
+    WebSocket 端点：实时日志流。
+    积压的日志合并为一个帧发送：{"type": "batch", "dropped": 丢弃条数, "messages": [...]}，
+    客户端跟不上时丢弃最旧的日志，而不是无限积压。
+    客户端可随时发送 {"type": "subscribe", "level": "WARNING", "module": "pm2.", "process": ["tracker"]}
+    设置过滤条件（见 LogStreamFilter），服务端只推送匹配的日志。
+    """
     await websocket.accept()
-    
-    message_queue = deque()
-    websocket._message_queue = message_queue
-    websocket_log_handler.add_connection(websocket)
+
+    subscriber = log_hub.subscribe()
     logger.info("WebSocket connection established for log streaming")
-    
+    # 日志帧（后台任务）与对客户端消息的确认（接收循环）写同一个连接，发送必须串行
+    send_lock = asyncio.Lock()
+
+    async def send_text(text: str):
+        async with send_lock:
+            await websocket.send_text(text)
+
     async def send_messages():
-        """后台任务：发送队列中的消息"""
+        """后台任务：有消息就把当前积压的全部消息作为一个帧发送"""
         while True:
-            if message_queue:
-                try:
-                    message = message_queue.popleft()
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error sending message: {e}")
-                    break
-            await asyncio.sleep(0.1)
-    
+            frame = await subscriber.next_frame()
+            try:
+                await send_text(frame)
+            except Exception as e:
+                logger.error(f"Error sending message: {e}")
+                break
+
     send_task = asyncio.create_task(send_messages())
-    
+
     try:
         while True:
             try:
                 data = await websocket.receive_text()
-                await websocket.send_json({"type": "ack", "message": "received"})
+                reply = _handle_client_message(subscriber, data)
+                await send_text(json.dumps(reply, separators=(",", ":"), ensure_ascii=False))
+            except WebSocketDisconnect:
+                raise
             except Exception as e:
                 logger.error(f"Error in websocket loop: {e}")
                 break
     except WebSocketDisconnect:
-        send_task.cancel()
-        websocket_log_handler.remove_connection(websocket)
         logger.info("WebSocket connection closed")
     except Exception as e:
-        send_task.cancel()
         logger.error(f"WebSocket error: {e}")
-        websocket_log_handler.remove_connection(websocket)
+    finally:
+        send_task.cancel()
+        log_hub.unsubscribe(subscriber)
+
+
+def _handle_client_message(subscriber, data: str) -> dict:
+    """处理客户端消息：subscribe 更新过滤条件，其他消息（如 ping）仅确认"""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict) or payload.get("type") != "subscribe":
+        return {"type": "ack", "message": "received"}
+    try:
+        stream_filter = LogStreamFilter.model_validate(payload)
+    except ValidationError as e:
+        return {"type": "error", "message": f"Invalid filter: {e.errors()[0]['msg']}"}
+    subscriber.set_filter(stream_filter.level, stream_filter.module, stream_filter.process)
+    return {"type": "ack", "message": "filter updated", "filter": stream_filter.model_dump()}
@@ -38,6 +38,14 @@ class Settings(BaseSettings):
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/app.log"
+    # 数据库日志：队列容量 / 每批写入条数 / 最长攒批时间（毫秒）/ 队列满时 drop 丢弃或 block 等待
+    LOG_DB_QUEUE_SIZE: int = 10000
+    LOG_DB_BATCH_SIZE: int = 500
+    LOG_DB_FLUSH_INTERVAL_MS: int = 1000
+    LOG_DB_OVERFLOW: str = "drop"
+    # 日志保留天数；设置归档目录时，删除前先把日志按天追加到 logs-YYYY-MM-DD.ndjson.gz
+    LOG_RETENTION_DAYS: int = 30
+    LOG_ARCHIVE_DIR: Optional[str] = None
     
     # SMTP 邮件配置
     SMTP_SERVER: str = "smtp.qq.com"
@@ -50,6 +58,9 @@ class Settings(BaseSettings):
     # 易校园 API 配置
     SHIRO_JID: Optional[str] = None
     API_BASE_URL: str = "https://application.xiaofubao.com/app/electric"
+    # 异步客户端：共享长连接池大小 / 同时在途的最大上游请求数
+    UPSTREAM_MAX_CONNECTIONS: int = 20
+    UPSTREAM_MAX_CONCURRENCY: int = 10
     
     # QQ Bot 配置
     QQ_APPID: Optional[str] = None
@@ -58,6 +69,14 @@ class Settings(BaseSettings):
     # Tracker 配置
     TRACKER_CHECK_INTERVAL: int = 3600
     HISTORY_LIMIT: int = 2400
+    TRACKER_CONCURRENCY: int = 8
+    # 历史表按月分区（仅 PostgreSQL）；保留月数 > 0 时按月删除过期分区
+    HISTORY_PARTITIONING: bool = False
+    HISTORY_RETENTION_MONTHS: int = 0
+    # 紧凑历史表：bigint 自增主键 + 整数分存储余额（已有数据需先运行迁移脚本）
+    HISTORY_COMPACT_SCHEMA: bool = False
+    # 游程存储：余额未变时延长最新一条记录（last_seen / samples），不再每隔 2 小时写入重复记录
+    HISTORY_RUN_LENGTH: bool = False
     
     # 图床配置
     UPLOADER_TOKEN: Optional[str] = None
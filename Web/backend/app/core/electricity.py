@@ -1,4 +1,5 @@
 """电费核心查询"""
+import asyncio
 import json
 import logging
 import os
@@ -10,8 +11,9 @@ from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import formataddr
 from threading import RLock
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Generator, List, Optional, Tuple
 
+import httpx
 import requests
 import urllib3
 
@@ -30,6 +32,20 @@ _OFFSET_FILE = None
 _OFFSET_CACHE: Dict[str, int] = {}
 _OFFSET_LOADED = False
 
+_API_BASE_URL = "https://application.xiaofubao.com/app/electric"
+
+# 异步连接池（进程内共享：锁 / 客户端 / 并发信号量 / 所属事件循环 / 负责关闭客户端的守护任务 / 容量配置）
+_ASYNC_POOL_LOCK = RLock()
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+_ASYNC_SEMAPHORE: Optional[asyncio.Semaphore] = None
+_ASYNC_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_ASYNC_CLOSER: Optional["asyncio.Task[None]"] = None
+_ASYNC_MAX_CONNECTIONS = 20
+_ASYNC_MAX_IN_FLIGHT = 10
+
+# 查询步骤：产出待发送的 (uri, params)，接收上游返回的 JSON，最终返回查询结果
+_Steps = Generator[Tuple[str, Dict[str, Any]], Dict[str, Any], Dict[str, Any]]
+
 
 def configure_offset_file(file_path: Optional[str]):
     """
@@ -161,15 +177,23 @@ def _detect_offset(room_list, original_index: int, expected_number: int):
     return None
 
 
+def _is_expected_room(room_entry, expected_number: int) -> bool:
+    return bool(room_entry) and _extract_room_number(room_entry) == expected_number
+
+
+def _cached_offset_matches(area_id: str, building_code: str, floor_code: str, room_list, original_index: int, expected_number: int) -> bool:
+    """判断按已缓存的偏移量取到的条目是否仍是期望的房间。"""
+    cached_offset = _get_cached_offset(area_id, building_code, floor_code)
+    return _is_expected_room(_fetch_room_by_index(room_list, original_index + cached_offset), expected_number)
+
+
 def _resolve_room_entry(area_id: str, building_code: str, floor_code: str, room_list, original_index: int, expected_number: int):
     """
     结合缓存与实时校验，输出目标房间条目。
     """
-    cached_offset = _get_cached_offset(area_id, building_code, floor_code)
-    candidate_index = original_index + cached_offset
-    candidate_entry = _fetch_room_by_index(room_list, candidate_index)
-    if candidate_entry and _extract_room_number(candidate_entry) == expected_number:
-        return candidate_entry
+    if _cached_offset_matches(area_id, building_code, floor_code, room_list, original_index, expected_number):
+        cached_offset = _get_cached_offset(area_id, building_code, floor_code)
+        return _fetch_room_by_index(room_list, original_index + cached_offset)
 
     detected_offset = _detect_offset(room_list, original_index, expected_number)
     if detected_offset is not None:
@@ -192,8 +216,84 @@ def _resolve_room_entry(area_id: str, building_code: str, floor_code: str, room_
     return fallback_entry
 
 
-class ECampusElectricity:
-    """校园电费信息查询核心类（含楼层偏移自校准）"""
+def configure_async_pool(max_connections: Optional[int] = None, max_in_flight: Optional[int] = None):
+    """
+    配置异步客户端的长连接池容量与同时在途的最大上游请求数。
+    已创建的连接池会被关闭，下次取用时按新配置重建。
+    """
+    global _ASYNC_MAX_CONNECTIONS, _ASYNC_MAX_IN_FLIGHT
+    with _ASYNC_POOL_LOCK:
+        if max_connections:
+            _ASYNC_MAX_CONNECTIONS = max(int(max_connections), 1)
+        if max_in_flight:
+            _ASYNC_MAX_IN_FLIGHT = max(int(max_in_flight), 1)
+        _retire_async_pool()
+
+
+async def _close_when_cancelled(client: httpx.AsyncClient):
+    """
+    守护任务：一直挂起，被取消时在本事件循环中关闭客户端。
+    连接池被替换、调用 close_async_pool，或 asyncio.run 结束前取消剩余任务时触发，
+    因此客户端总是在其所属的事件循环关闭之前关闭，不会遗留未关闭的连接。
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+def _retire_async_pool() -> Optional["asyncio.Task[None]"]:
+    """
+    丢弃当前连接池（调用方持有锁）：取消其守护任务，由守护任务在所属事件循环中关闭客户端。
+    返回该守护任务，所属事件循环已结束（客户端已随之关闭）或没有连接池时返回 None。
+    """
+    global _ASYNC_CLIENT, _ASYNC_SEMAPHORE, _ASYNC_LOOP, _ASYNC_CLOSER
+    closer, loop = _ASYNC_CLOSER, _ASYNC_LOOP
+    _ASYNC_CLIENT = _ASYNC_SEMAPHORE = _ASYNC_LOOP = _ASYNC_CLOSER = None
+    if closer is None or loop is None or loop.is_closed():
+        return None
+    loop.call_soon_threadsafe(closer.cancel)
+    return closer
+
+
+def _get_async_pool() -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    """取得当前事件循环下共享的 httpx 客户端与并发信号量，必要时创建。"""
+    global _ASYNC_CLIENT, _ASYNC_SEMAPHORE, _ASYNC_LOOP, _ASYNC_CLOSER
+    loop = asyncio.get_running_loop()
+    with _ASYNC_POOL_LOCK:
+        if _ASYNC_CLIENT is None or _ASYNC_SEMAPHORE is None or _ASYNC_LOOP is not loop:
+            # 旧连接池属于其他事件循环：在其所属循环中关闭
+            _retire_async_pool()
+            client = httpx.AsyncClient(
+                verify=False,
+                timeout=10,
+                limits=httpx.Limits(
+                    max_connections=_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=_ASYNC_MAX_CONNECTIONS,
+                ),
+            )
+            _ASYNC_CLIENT = client
+            _ASYNC_SEMAPHORE = asyncio.Semaphore(_ASYNC_MAX_IN_FLIGHT)
+            _ASYNC_LOOP = loop
+            _ASYNC_CLOSER = loop.create_task(_close_when_cancelled(client))
+            return client, _ASYNC_SEMAPHORE
+        return _ASYNC_CLIENT, _ASYNC_SEMAPHORE
+
+
+async def close_async_pool():
+    """关闭共享的异步连接池（应用退出时调用），在当前事件循环中等待关闭完成。"""
+    with _ASYNC_POOL_LOCK:
+        closer = _retire_async_pool()
+    if closer is not None and closer.get_loop() is asyncio.get_running_loop():
+        await asyncio.wait([closer])
+
+
+class _ECampusElectricityBase:
+    """
+    同步 / 异步客户端共用的配置、缓存、请求构造与响应解析逻辑。
+    每个查询写成一次 _xxx_steps 生成器：产出 (uri, params) 并接收上游 JSON，
+    子类只负责用各自的传输方式发送请求（_run / _request）。
+    """
 
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """
@@ -213,13 +313,15 @@ class ECampusElectricity:
         if config:
             self.config.update(config)
         configure_offset_file(self.config.get("floor_offset_file"))
-        # 复用长连接，减少 TLS 握手耗时
-        self._session = requests.Session()
-        # 简单内存缓存，避免频繁重复拉取区域/楼栋/楼层
+        # 简单内存缓存，避免频繁重复拉取区域/楼栋/楼层/房间列表
         self._cache_ttl = 300  # 秒
+        self._cache_max_entries = 512  # 每类缓存的最大条目数
         self._area_cache: Dict[str, Any] = {}
         self._building_cache: Dict[str, Any] = {}
         self._floor_cache: Dict[str, Any] = {}
+        self._room_cache: Dict[str, Any] = {}
+        # 在新拉取的房间列表中也未定位到的房间（负缓存），避免每次查询都重新拉取
+        self._room_miss_cache: Dict[str, Any] = {}
 
     def set_config(self, config: Dict[str, Any]):
         """更新配置"""
@@ -227,9 +329,7 @@ class ECampusElectricity:
         if "floor_offset_file" in config:
             configure_offset_file(config.get("floor_offset_file"))
 
-    def school_info(self) -> Dict[str, Any]:
-        """获取学校信息"""
-        data = self._request("getCoutomConfig", {"customType": 1})
+    def _school_info_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
         if data.get("success"):
             return {
                 "error": 0,
@@ -240,13 +340,7 @@ class ECampusElectricity:
             }
         return self._error_response(data)
 
-    def query_area(self) -> Dict[str, Any]:
-        """查询校区信息"""
-        cached = self._get_cache(self._area_cache, "all")
-        if cached:
-            return cached
-
-        data = self._request("queryArea", {"type": 1})
+    def _area_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
         if data.get("success"):
             for item in data["rows"]:
                 item.pop("paymentChannel", None)
@@ -257,64 +351,12 @@ class ECampusElectricity:
             return result
         return self._error_response(data)
 
-    def query_building(self, area_id: str) -> Dict[str, Any]:
-        """查询指定校区的楼栋信息"""
-        cached = self._get_cache(self._building_cache, area_id)
-        if cached:
-            return cached
-
-        data = self._request("queryBuilding", {"areaId": area_id})
-        if data.get("success"):
-            result = {"error": 0, "data": data["rows"]}
-            self._set_cache(self._building_cache, area_id, result)
-            return result
-        return self._error_response(data)
-
-    def query_floor(self, area_id: str, building_code: str) -> Dict[str, Any]:
-        """查询指定楼栋的楼层信息"""
-        cache_key = f"{area_id}|{building_code}"
-        cached = self._get_cache(self._floor_cache, cache_key)
-        if cached:
-            return cached
-
-        data = self._request(
-            "queryFloor",
-            {
-                "areaId": area_id,
-                "buildingCode": building_code,
-            },
-        )
-        if data.get("success"):
-            result = {"error": 0, "data": data["rows"]}
-            self._set_cache(self._floor_cache, cache_key, result)
-            return result
-        return self._error_response(data)
-
-    def query_room(self, area_id: str, building_code: str, floor_code: str) -> Dict[str, Any]:
-        """查询指定楼层的房间信息"""
-        data = self._request(
-            "queryRoom",
-            {
-                "areaId": area_id,
-                "buildingCode": building_code,
-                "floorCode": floor_code,
-            },
-        )
+    def _rows_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
         if data.get("success"):
             return {"error": 0, "data": data["rows"]}
         return self._error_response(data)
 
-    def query_room_surplus(self, area_id: str, building_code: str, floor_code: str, room_code: str) -> Dict[str, Any]:
-        """查询指定房间的电费余额"""
-        data = self._request(
-            "queryRoomSurplus",
-            {
-                "areaId": area_id,
-                "buildingCode": building_code,
-                "floorCode": floor_code,
-                "roomCode": room_code,
-            },
-        )
+    def _surplus_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
         if data.get("success"):
             return {
                 "error": 0,
@@ -325,10 +367,8 @@ class ECampusElectricity:
             }
         return self._error_response(data)
 
-    def query_room_surplus_by_human(self, area_index: int, building_name: str, floor_number: int, room_number: int) -> Dict[str, Any]:
-        """
-        使用人类（？可读的楼栋+房间号进行查询，并自动纠正楼层偏移。
-        """
+    def _parse_human_location(self, area_index: int, building_name: str, floor_number: int, room_number: int) -> Dict[str, Any]:
+        """校验人类可读的楼栋+房间号，换算为上游列表中的下标。"""
         try:
             area_idx = int(area_index)
         except (TypeError, ValueError):
@@ -353,45 +393,171 @@ class ECampusElectricity:
         except ValueError:
             return {"error": 1, "error_description": "房间号格式错误"}
 
-        expected_number = (floor_idx + 1) * 100 + (room_idx + 1)
+        return {
+            "error": 0,
+            "data": {
+                "area_idx": area_idx,
+                "building_idx": building_idx,
+                "floor_idx": floor_idx,
+                "room_idx": room_idx,
+                "expected_number": (floor_idx + 1) * 100 + (room_idx + 1),
+            },
+        }
+
+    def _parse_room_name(self, room_name: str) -> Dict[str, Any]:
+        """
+        解析 Bot 写法的房间名
+        - "D9东 425"
+        - "10南 101"
+        - "D9东425"（无空格也可）
+        """
+        if not room_name:
+            return {"error": 1, "error_description": "房间名不能为空"}
+
+        parts = room_name.strip().split()
+        building = None
+        room_token = None
+
+        if len(parts) == 2:
+            building, room_token = parts
+        elif len(parts) == 1:
+            match = re.match(r"^(.+?)(\d{3,4})$", parts[0])
+            if match:
+                building, room_token = match.group(1), match.group(2)
+        if not building or not room_token:
+            return {"error": 1, "error_description": "房间名格式应为 '楼栋 房间号'，如 D9东 425"}
+
+        area_idx = 1 if building.startswith("D") else 0
+        try:
+            floor_num = int(room_token[0])
+            room_num_full = int(room_token)
+        except (ValueError, IndexError):
+            return {"error": 1, "error_description": "房间号格式错误，应为3-4位数字"}
+
+        return {
+            "error": 0,
+            "data": {
+                "area_index": area_idx,
+                "building_name": building,
+                "floor_number": floor_num,
+                "room_number": room_num_full,
+            },
+        }
 
-        area_info = self.query_area()
+    def _school_info_steps(self) -> _Steps:
+        data = yield "getCoutomConfig", {"customType": 1}
+        return self._school_info_result(data)
+
+    def _query_area_steps(self) -> _Steps:
+        cached = self._get_cache(self._area_cache, "all")
+        if cached:
+            return cached
+
+        data = yield "queryArea", {"type": 1}
+        return self._area_result(data)
+
+    def _query_building_steps(self, area_id: str) -> _Steps:
+        cached = self._get_cache(self._building_cache, area_id)
+        if cached:
+            return cached
+
+        data = yield "queryBuilding", {"areaId": area_id}
+        result = self._rows_result(data)
+        if result.get("error") == 0:
+            self._set_cache(self._building_cache, area_id, result)
+        return result
+
+    def _query_floor_steps(self, area_id: str, building_code: str) -> _Steps:
+        cache_key = f"{area_id}|{building_code}"
+        cached = self._get_cache(self._floor_cache, cache_key)
+        if cached:
+            return cached
+
+        data = yield "queryFloor", {
+            "areaId": area_id,
+            "buildingCode": building_code,
+        }
+        result = self._rows_result(data)
+        if result.get("error") == 0:
+            self._set_cache(self._floor_cache, cache_key, result)
+        return result
+
+    def _query_room_steps(self, area_id: str, building_code: str, floor_code: str) -> _Steps:
+        cache_key = _offset_key(area_id, building_code, floor_code)
+        cached = self._get_cache(self._room_cache, cache_key)
+        if cached:
+            return cached
+
+        data = yield "queryRoom", {
+            "areaId": area_id,
+            "buildingCode": building_code,
+            "floorCode": floor_code,
+        }
+        result = self._rows_result(data)
+        if result.get("error") == 0:
+            self._set_cache(self._room_cache, cache_key, result)
+        return result
+
+    def _query_room_surplus_steps(self, area_id: str, building_code: str, floor_code: str, room_code: str) -> _Steps:
+        data = yield "queryRoomSurplus", {
+            "areaId": area_id,
+            "buildingCode": building_code,
+            "floorCode": floor_code,
+            "roomCode": room_code,
+        }
+        return self._surplus_result(data)
+
+    def _query_room_surplus_by_human_steps(self, area_index: int, building_name: str, floor_number: int, room_number: int) -> _Steps:
+        location = self._parse_human_location(area_index, building_name, floor_number, room_number)
+        if location.get("error") != 0:
+            return location
+        loc = location["data"]
+
+        area_info = yield from self._query_area_steps()
         if area_info.get("error") != 0:
             return area_info
         try:
-            area_id = area_info["data"][area_idx]["id"]
+            area_id = area_info["data"][loc["area_idx"]]["id"]
         except Exception:
             return {"error": 1, "error_description": "无法获取校区信息，请检查区域编号"}
 
-        building_list = self.query_building(area_id)
+        building_list = yield from self._query_building_steps(area_id)
         if building_list.get("error") != 0:
             return building_list
         try:
-            building_code = building_list["data"][building_idx]["buildingCode"]
+            building_code = building_list["data"][loc["building_idx"]]["buildingCode"]
         except Exception:
             return {"error": 1, "error_description": "无法匹配楼栋，请检查楼栋名称"}
 
-        floor_list = self.query_floor(area_id, building_code)
+        floor_list = yield from self._query_floor_steps(area_id, building_code)
         if floor_list.get("error") != 0:
             return floor_list
         try:
-            floor_code = floor_list["data"][floor_idx]["floorCode"]
+            floor_code = floor_list["data"][loc["floor_idx"]]["floorCode"]
         except Exception:
             return {"error": 1, "error_description": "无法匹配楼层，请检查房间号"}
 
-        room_list = self.query_room(area_id, building_code, floor_code)
+        fresh = not self._has_cached_rooms(area_id, building_code, floor_code)
+        room_list = yield from self._query_room_steps(area_id, building_code, floor_code)
         if room_list.get("error") != 0:
             return room_list
-        rooms = room_list.get("data", [])
-
         target_entry = _resolve_room_entry(
-            area_id,
-            building_code,
-            floor_code,
-            rooms,
-            room_idx,
-            expected_number,
+            area_id, building_code, floor_code, room_list.get("data", []), loc["room_idx"], loc["expected_number"]
         )
+
+        missed = not _is_expected_room(target_entry, loc["expected_number"])
+        if missed and not fresh and self._invalidate_stale_rooms(area_id, building_code, floor_code, loc["expected_number"]):
+            fresh = True
+            room_list = yield from self._query_room_steps(area_id, building_code, floor_code)
+            if room_list.get("error") != 0:
+                return room_list
+            target_entry = _resolve_room_entry(
+                area_id, building_code, floor_code, room_list.get("data", []), loc["room_idx"], loc["expected_number"]
+            )
+            missed = not _is_expected_room(target_entry, loc["expected_number"])
+        if missed and fresh:
+            self._remember_room_miss(area_id, building_code, floor_code, loc["expected_number"])
+
         if not target_entry:
             return {"error": 1, "error_description": "未能定位房间数据"}
 
@@ -399,7 +565,147 @@ class ECampusElectricity:
         if not room_code:
             return {"error": 1, "error_description": "房间数据异常，缺少 roomCode"}
 
-        return self.query_room_surplus(area_id, building_code, floor_code, room_code)
+        result = yield from self._query_room_surplus_steps(area_id, building_code, floor_code, room_code)
+        return self._with_location(result, area_id, building_code, floor_code, room_code)
+
+    def _query_room_surplus_by_room_name_steps(self, room_name: str) -> _Steps:
+        parsed = self._parse_room_name(room_name)
+        if parsed.get("error") != 0:
+            return parsed
+        return (yield from self._query_room_surplus_by_human_steps(**parsed["data"]))
+
+    def _query_room_surplus_resolved_steps(self, room_name: str, location: Optional[Dict[str, str]]) -> _Steps:
+        if location:
+            result = yield from self._query_room_surplus_steps(**location)
+            if not self._should_reresolve(result):
+                return self._with_location(result, **location)
+            logger.info("已保存的房间定位失效，重新解析：%s", room_name)
+        return (yield from self._query_room_surplus_by_room_name_steps(room_name))
+
+    def _with_location(self, result: Dict[str, Any], area_id: str, building_code: str, floor_code: str, room_code: str) -> Dict[str, Any]:
+        """在成功结果中附带上游真实的房间定位，调用方可保存后直接查询余额"""
+        if result.get("error") == 0:
+            result["data"]["location"] = {
+                "area_id": area_id,
+                "building_code": building_code,
+                "floor_code": floor_code,
+                "room_code": room_code,
+            }
+        return result
+
+    def _should_reresolve(self, result: Dict[str, Any]) -> bool:
+        """已保存定位查询失败时，仅在上游返回业务错误（而非网络异常）时重新走完整定位链"""
+        if result.get("error") == 0:
+            return False
+        raw = result.get("raw") or {}
+        return not raw.get("exception")
+
+    def _error_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """生成错误响应，包含原始状态码和服务端 message"""
+        status_code = data.get("statusCode", 0)
+        message = data.get("message") or self._errcode(status_code)
+        return {
+            "error": 1,
+            "statusCode": status_code,
+            "error_description": message or "未知错误",
+            "raw": data,
+        }
+
+    def _errcode(self, code: int) -> str:
+        """根据错误代码获取错误描述"""
+        error_codes = {
+            233: "shiroJID无效",
+        }
+        return error_codes.get(code, "未知错误")
+
+    def _build_request(self, uri: str, params: Dict[str, Any]):
+        url = f"{_API_BASE_URL}/{uri}"
+        params.update(
+            {
+                "platform": "YUNMA_APP",
+            }
+        )
+        headers = {
+            "Cookie": f"shiroJID={self.config['shiroJID']}",
+        }
+        return url, params, headers
+
+    def _get_cache(self, cache_store: Dict[str, Any], key: str):
+        item = cache_store.get(key)
+        if not item:
+            return None
+        data, ts = item
+        if time.time() - ts > self._cache_ttl:
+            cache_store.pop(key, None)
+            return None
+        return data
+
+    def _set_cache(self, cache_store: Dict[str, Any], key: str, value: Any):
+        cache_store.pop(key, None)
+        cache_store[key] = (value, time.time())
+        # 字典保持插入顺序，超出上限时淘汰最早写入的条目
+        while len(cache_store) > self._cache_max_entries:
+            cache_store.pop(next(iter(cache_store)), None)
+
+    def _has_cached_rooms(self, area_id: str, building_code: str, floor_code: str) -> bool:
+        return self._get_cache(self._room_cache, _offset_key(area_id, building_code, floor_code)) is not None
+
+    def _room_miss_key(self, area_id: str, building_code: str, floor_code: str, expected_number: int) -> str:
+        return f"{_offset_key(area_id, building_code, floor_code)}|{expected_number}"
+
+    def _remember_room_miss(self, area_id: str, building_code: str, floor_code: str, expected_number: int):
+        """刚拉取的房间列表中也找不到该房间：在缓存有效期内不再因它重新拉取"""
+        self._set_cache(self._room_miss_cache, self._room_miss_key(area_id, building_code, floor_code, expected_number), True)
+
+    def _invalidate_stale_rooms(self, area_id: str, building_code: str, floor_code: str, expected_number: int) -> bool:
+        """
+        缓存的房间列表中定位不到目标房间时（楼层房间增删等），失效该楼层缓存。
+        该房间最近一次在新拉取的列表中同样未找到时不失效。返回 True 表示调用方应重新拉取房间列表。
+        """
+        if self._get_cache(self._room_miss_cache, self._room_miss_key(area_id, building_code, floor_code, expected_number)):
+            return False
+        self._room_cache.pop(_offset_key(area_id, building_code, floor_code), None)
+        logger.info("楼层房间列表缓存失效：%s", _offset_key(area_id, building_code, floor_code))
+        return True
+
+
+class ECampusElectricity(_ECampusElectricityBase):
+    """校园电费信息查询核心类（含楼层偏移自校准）"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        super().__init__(config)
+        # 复用长连接，减少 TLS 握手耗时
+        self._session = requests.Session()
+
+    def school_info(self) -> Dict[str, Any]:
+        """获取学校信息"""
+        return self._run(self._school_info_steps())
+
+    def query_area(self) -> Dict[str, Any]:
+        """查询校区信息"""
+        return self._run(self._query_area_steps())
+
+    def query_building(self, area_id: str) -> Dict[str, Any]:
+        """查询指定校区的楼栋信息"""
+        return self._run(self._query_building_steps(area_id))
+
+    def query_floor(self, area_id: str, building_code: str) -> Dict[str, Any]:
+        """查询指定楼栋的楼层信息"""
+        return self._run(self._query_floor_steps(area_id, building_code))
+
+    def query_room(self, area_id: str, building_code: str, floor_code: str) -> Dict[str, Any]:
+        """查询指定楼层的房间信息"""
+        return self._run(self._query_room_steps(area_id, building_code, floor_code))
+
+    def query_room_surplus(self, area_id: str, building_code: str, floor_code: str, room_code: str) -> Dict[str, Any]:
+        """查询指定房间的电费余额"""
+        return self._run(self._query_room_surplus_steps(area_id, building_code, floor_code, room_code))
+
+    def query_room_surplus_by_human(self, area_index: int, building_name: str, floor_number: int, room_number: int) -> Dict[str, Any]:
+        """
+        使用人类（？可读的楼栋+房间号进行查询，并自动纠正楼层偏移。
+        """
+        return self._run(self._query_room_surplus_by_human_steps(area_index, building_name, floor_number, room_number))
 
     def query_room_surplus_by_room_name(self, room_name: str) -> Dict[str, Any]:
         """
@@ -408,30 +714,14 @@ class ECampusElectricity:
         - "10南 101"
         - "D9东425"（无空格也可）
         """
-        if not room_name:
-            return {"error": 1, "error_description": "房间名不能为空"}
-
-        parts = room_name.strip().split()
-        building = None
-        room_token = None
-
-        if len(parts) == 2:
-            building, room_token = parts
-        elif len(parts) == 1:
-            match = re.match(r"^(.+?)(\d{3,4})$", parts[0])
-            if match:
-                building, room_token = match.group(1), match.group(2)
-        if not building or not room_token:
-            return {"error": 1, "error_description": "房间名格式应为 '楼栋 房间号'，如 D9东 425"}
-
-        area_idx = 1 if building.startswith("D") else 0
-        try:
-            floor_num = int(room_token[0])
-            room_num_full = int(room_token)
-        except (ValueError, IndexError):
-            return {"error": 1, "error_description": "房间号格式错误，应为3-4位数字"}
+        return self._run(self._query_room_surplus_by_room_name_steps(room_name))
 
-        return self.query_room_surplus_by_human(area_idx, building, floor_num, room_num_full)
+    def query_room_surplus_resolved(self, room_name: str, location: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        优先使用已保存的上游定位（area_id/building_code/floor_code/room_code）直接查询余额，
+        上游报错时再按房间名完整解析。成功结果的 data["location"] 为最新定位。
+        """
+        return self._run(self._query_room_surplus_resolved_steps(room_name, location))
 
     def check_and_alert(self, room_info: Dict[str, Any], recipients: List[str], threshold: Optional[float] = None) -> bool:
         """检查电费余额并在需要时发送告警邮件"""
@@ -490,34 +780,17 @@ class ECampusElectricity:
             logger.error("发送邮件异常：%s", e)
             return False
 
-    def _error_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """生成错误响应，包含原始状态码和服务端 message"""
-        status_code = data.get("statusCode", 0)
-        message = data.get("message") or self._errcode(status_code)
-        return {
-            "error": 1,
-            "statusCode": status_code,
-            "error_description": message or "未知错误",
-            "raw": data,
-        }
-
-    def _errcode(self, code: int) -> str:
-        """根据错误代码获取错误描述"""
-        error_codes = {
-            233: "shiroJID无效",
-        }
-        return error_codes.get(code, "未知错误")
+    def _run(self, steps: _Steps) -> Dict[str, Any]:
+        """逐个发送查询步骤产出的请求，返回最终结果"""
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self._request(*request))
+        except StopIteration as stop:
+            return stop.value
 
     def _request(self, uri: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        url = f"https://application.xiaofubao.com/app/electric/{uri}"
-        params.update(
-            {
-                "platform": "YUNMA_APP",
-            }
-        )
-        headers = {
-            "Cookie": f"shiroJID={self.config['shiroJID']}",
-        }
+        url, params, headers = self._build_request(uri, params)
 
         try:
             response = self._session.post(
@@ -532,15 +805,70 @@ class ECampusElectricity:
             logger.error("Request Error: %s", e)
             return {"success": False, "exception": str(e)}
 
-    def _get_cache(self, cache_store: Dict[str, Any], key: str):
-        item = cache_store.get(key)
-        if not item:
-            return None
-        data, ts = item
-        if time.time() - ts > self._cache_ttl:
-            cache_store.pop(key, None)
-            return None
-        return data
 
-    def _set_cache(self, cache_store: Dict[str, Any], key: str, value: Any):
-        cache_store[key] = (value, time.time())
+class AsyncECampusElectricity(_ECampusElectricityBase):
+    """
+    基于 asyncio 的查询客户端，接口与 ECampusElectricity 一致（均为协程）。
+    所有实例共享同一个长连接池，并受 configure_async_pool 设置的最大并发数约束。
+    """
+
+    async def school_info(self) -> Dict[str, Any]:
+        """获取学校信息"""
+        return await self._run(self._school_info_steps())
+
+    async def query_area(self) -> Dict[str, Any]:
+        """查询校区信息"""
+        return await self._run(self._query_area_steps())
+
+    async def query_building(self, area_id: str) -> Dict[str, Any]:
+        """查询指定校区的楼栋信息"""
+        return await self._run(self._query_building_steps(area_id))
+
+    async def query_floor(self, area_id: str, building_code: str) -> Dict[str, Any]:
+        """查询指定楼栋的楼层信息"""
+        return await self._run(self._query_floor_steps(area_id, building_code))
+
+    async def query_room(self, area_id: str, building_code: str, floor_code: str) -> Dict[str, Any]:
+        """查询指定楼层的房间信息"""
+        return await self._run(self._query_room_steps(area_id, building_code, floor_code))
+
+    async def query_room_surplus(self, area_id: str, building_code: str, floor_code: str, room_code: str) -> Dict[str, Any]:
+        """查询指定房间的电费余额"""
+        return await self._run(self._query_room_surplus_steps(area_id, building_code, floor_code, room_code))
+
+    async def query_room_surplus_by_human(self, area_index: int, building_name: str, floor_number: int, room_number: int) -> Dict[str, Any]:
+        """使用可读的楼栋+房间号进行查询，并自动纠正楼层偏移。"""
+        return await self._run(self._query_room_surplus_by_human_steps(area_index, building_name, floor_number, room_number))
+
+    async def query_room_surplus_by_room_name(self, room_name: str) -> Dict[str, Any]:
+        """兼容 Bot 写法的房间名查询，如 "D9东 425" / "D9东425"。"""
+        return await self._run(self._query_room_surplus_by_room_name_steps(room_name))
+
+    async def query_room_surplus_resolved(self, room_name: str, location: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """优先使用已保存的上游定位直接查询余额，上游报错时再按房间名完整解析。"""
+        return await self._run(self._query_room_surplus_resolved_steps(room_name, location))
+
+    async def _run(self, steps: _Steps) -> Dict[str, Any]:
+        """逐个发送查询步骤产出的请求（等待期间不阻塞事件循环），返回最终结果"""
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(await self._request(*request))
+        except StopIteration as stop:
+            return stop.value
+
+    async def _request(self, uri: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        url, params, headers = self._build_request(uri, params)
+        client, semaphore = _get_async_pool()
+
+        try:
+            async with semaphore:
+                response = await client.post(
+                    url,
+                    params=params,
+                    headers=headers,
+                )
+            return response.json()
+        except Exception as e:
+            logger.error("Request Error: %s", e)
+            return {"success": False, "exception": str(e)}
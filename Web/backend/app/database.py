@@ -1,7 +1,11 @@
 """使用 SQLModel 的数据库连接和会话管理"""
+import logging
+from sqlalchemy import inspect
 from sqlmodel import SQLModel, create_engine, Session
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(
     settings.DATABASE_URL,
     echo=False,
@@ -12,10 +16,36 @@ engine = create_engine(
 
 
 def init_db():
-    """初始化数据库：创建所有表"""
+    """初始化数据库：创建所有表（启用 HISTORY_PARTITIONING 时历史表建为按月分区表）"""
+    if settings.HISTORY_PARTITIONING and engine.dialect.name == "postgresql":
+        _init_partitioned_history()
     SQLModel.metadata.create_all(engine)
 
 
+def _init_partitioned_history():
+    from app.utils.history_partitions import (
+        HISTORY_TABLE,
+        create_partitioned_history_table,
+        ensure_upcoming_partitions,
+        is_history_partitioned,
+    )
+    from app.utils.timezone import now_naive
+
+    # 先建历史表依赖的其他表，再手工创建分区父表，create_all 会跳过已存在的表
+    tables = [t for t in SQLModel.metadata.sorted_tables if t.name != HISTORY_TABLE]
+    SQLModel.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(HISTORY_TABLE):
+            create_partitioned_history_table(conn)
+        if is_history_partitioned(conn):
+            ensure_upcoming_partitions(conn, now_naive().date())
+        else:
+            logger.warning(
+                "%s 仍为普通表，请运行 scripts/migrate_history_to_partitioned.py 迁移为分区表",
+                HISTORY_TABLE,
+            )
+
+
 def get_session():
     """获取数据库会话的依赖项"""
     with Session(engine) as session:
@@ -1,10 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.config import settings
 from app.database import init_db
-from app.models import user, subscription, history, config, log, user_subscription
+from app.core.electricity import configure_async_pool, close_async_pool
+from app.models import user, subscription, subscription_state, history, rollup, config, log, user_subscription
 from app.api import auth, subscriptions, history as history_api, config as config_api, logs, websocket, admin
 from app.utils.logging import setup_logging
+from app.utils.pagination import NEXT_CURSOR_HEADER
 from app.utils.pm2_log_monitor import pm2_log_monitor
 
 app = FastAPI(
@@ -26,9 +29,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH", "HEAD"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # 携带凭据的请求不认通配符，前端需要读取的响应头必须逐个列出
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Content-Disposition"],
     max_age=600,
 )
+# 压缩较大的 JSON 响应（如历史数据），小响应不压缩
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(subscriptions.router, prefix="/api/subscriptions", tags=["subscriptions"])
 app.include_router(history_api.router, prefix="/api/history", tags=["history"])
@@ -41,6 +47,7 @@ app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    configure_async_pool(settings.UPSTREAM_MAX_CONNECTIONS, settings.UPSTREAM_MAX_CONCURRENCY)
     # 启动PM2日志监控器
     pm2_log_monitor.start()
 
@@ -48,7 +55,8 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     # 停止PM2日志监控器
-    pm2_log_monitor.stop()
+    await pm2_log_monitor.stop()
+    await close_async_pool()
 
 
 @app.get("/")
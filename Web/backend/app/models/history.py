@@ -1,20 +1,51 @@
 """电费历史数据存储模型"""
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field
+from sqlmodel.sql.sqltypes import GUID
+from sqlalchemy import BigInteger, Column, Float, ForeignKey, Identity, Index, Integer
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 import uuid
+from app.config import settings
+from app.models.types import Cents
 from app.utils.timezone import now_naive
 
+# 启用紧凑表结构时主键为数据库生成的 bigint，写入时无需提供 id
+COMPACT_HISTORY = settings.HISTORY_COMPACT_SCHEMA
 
-class ElectricityHistory(SQLModel, table=True):
-    """电费历史数据存储模型"""
-    __tablename__ = "electricity_history"
-    
-    id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, primary_key=True)
-    subscription_id: uuid.UUID = Field(foreign_key="subscriptions.id", index=True)
-    surplus: float = Field(description="电费余额（元）")
-    timestamp: datetime = Field(default_factory=now_naive, index=True)
-    created_at: datetime = Field(default_factory=now_naive)
+# 两种表结构只在主键、余额列类型与时间索引上不同
+if COMPACT_HISTORY:
+    # 紧凑结构：bigint 自增主键使插入按顺序追加，余额以整数分存储，timestamp 使用 BRIN 索引。
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增，本地开发库使用该变体
+    _ID_COLUMN = Column("id", BigInteger().with_variant(Integer, "sqlite"), Identity(), primary_key=True)
+    _SURPLUS_TYPE = Cents
+    _INDEXES = (Index("idx_history_timestamp_brin", "timestamp", postgresql_using="brin"),)
+else:
+    _ID_COLUMN = Column("id", GUID(), primary_key=True, default=uuid.uuid4)
+    _SURPLUS_TYPE = Float
+    _INDEXES = (
+        Index("ix_electricity_history_subscription_id", "subscription_id"),
+        Index("ix_electricity_history_timestamp", "timestamp"),
+    )
 
 
+class ElectricityHistory(SQLModel, table=True):
+    """电费历史数据存储模型"""
+    __tablename__ = "electricity_history"  # type: ignore
+    # 同一订阅同一时刻只有一条记录（写入时 ON CONFLICT DO NOTHING）；
+    # 同时用于按订阅取最新记录及游标分页按时间倒序扫描
+    __table_args__ = (
+        Index("uq_history_subscription_timestamp", "subscription_id", "timestamp", unique=True),
+        *_INDEXES,
+    )
 
+    id: Optional[Union[uuid.UUID, int]] = Field(default=None, sa_column=_ID_COLUMN)
+    # 删除订阅时级联删除历史（与 init.sql 及分区表 DDL 一致）
+    subscription_id: uuid.UUID = Field(
+        sa_column=Column(GUID(), ForeignKey("subscriptions.id", ondelete="CASCADE"), nullable=False)
+    )
+    surplus: float = Field(sa_column=Column(_SURPLUS_TYPE, nullable=False), description="电费余额（元），紧凑结构下以分存储")
+    timestamp: datetime = Field(default_factory=now_naive)
+    # 游程存储（HISTORY_RUN_LENGTH）：timestamp 为首次读到该余额的时间
+    last_seen: Optional[datetime] = Field(default=None, description="游程中最后一次读到该余额的时间，为空表示同 timestamp")
+    samples: int = Field(default=1, description="游程内的读数次数")
+    created_at: datetime = Field(default_factory=now_naive)
@@ -1,6 +1,6 @@
 """应用日志存储模型"""
 from sqlmodel import SQLModel, Field, Column
-from sqlalchemy import Text
+from sqlalchemy import BigInteger, Index, Text
 from datetime import datetime
 from typing import Optional
 import uuid
@@ -10,6 +10,8 @@ from app.utils.timezone import now_naive
 class Log(SQLModel, table=True):
     """应用日志存储模型"""
     __tablename__ = "logs"
+    # 游标分页按 (timestamp, id) 倒序扫描
+    __table_args__ = (Index("idx_logs_timestamp_id", "timestamp", "id"),)
     
     id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, primary_key=True)
     level: str = Field(max_length=20, index=True, description="日志级别：INFO, WARNING, ERROR, DEBUG")
@@ -17,3 +19,12 @@ class Log(SQLModel, table=True):
     module: Optional[str] = Field(default=None, max_length=100, index=True)
     timestamp: datetime = Field(default_factory=now_naive, index=True)
 
+
+class LogTailOffset(SQLModel, table=True):
+    """PM2 日志文件的已读取位置（内部状态，不出现在配置接口中），与对应的日志在同一事务中写入"""
+    __tablename__ = "log_tail_offsets"
+
+    file_key: str = Field(primary_key=True, max_length=500, description="日志文件的绝对路径")
+    inode: int = Field(sa_column=Column(BigInteger, nullable=False))
+    position: int = Field(sa_column=Column(BigInteger, nullable=False), description="已处理到的字节位置")
+    updated_at: datetime = Field(default_factory=now_naive)
@@ -0,0 +1,42 @@
+"""电费历史按小时/按天汇总的预聚合模型"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, ForeignKey, Uuid
+from datetime import datetime
+import uuid
+
+
+class HistoryRollupBase(SQLModel):
+    """
+    单个订阅在一个时间桶内的汇总。
+    consumption / recharge 为桶内相邻读数之间余额的下降 / 上升合计，
+    跨桶的变化计入后一条读数所在的桶。
+    """
+    bucket_start: datetime = Field(primary_key=True, description="桶起始时间（上海时间）")
+    consumption: float = Field(default=0.0, description="桶内用电消耗（元）")
+    recharge: float = Field(default=0.0, description="桶内充值金额（元）")
+    min_surplus: float
+    max_surplus: float
+    sum_surplus: float = Field(description="桶内读数之和，用于计算平均值")
+    samples: int = Field(default=0, description="桶内读数条数")
+    first_surplus: float
+    first_timestamp: datetime
+    last_surplus: float
+    last_timestamp: datetime
+
+
+class HistoryRollupHourly(HistoryRollupBase, table=True):
+    """按小时汇总"""
+    __tablename__ = "electricity_history_hourly"
+
+    subscription_id: uuid.UUID = Field(
+        sa_column=Column(Uuid, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True)
+    )
+
+
+class HistoryRollupDaily(HistoryRollupBase, table=True):
+    """按天汇总"""
+    __tablename__ = "electricity_history_daily"
+
+    subscription_id: uuid.UUID = Field(
+        sa_column=Column(Uuid, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True)
+    )
@@ -2,7 +2,7 @@
 from sqlmodel import SQLModel, Field, Relationship, Column
 from sqlalchemy import JSON
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 import uuid
 
 
@@ -17,6 +17,11 @@ class Subscription(SQLModel, table=True):
     building_code: str = Field(max_length=50)
     floor_code: str = Field(max_length=50)
     room_code: str = Field(max_length=50)
+    # 上游真实定位（areaId/buildingCode/floorCode/roomCode），首次查询成功后由 Tracker 写入
+    resolved_location: Optional[Dict[str, str]] = Field(
+        default=None,
+        sa_column=Column(JSON)
+    )
     threshold: float = Field(default=20.0, description="告警阈值（元）")
     email_recipients: List[str] = Field(
         default_factory=list,
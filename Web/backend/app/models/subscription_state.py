@@ -0,0 +1,27 @@
+"""订阅当前状态模型：由写入路径维护的最新读数与用电速率"""
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, ForeignKey, Uuid
+from datetime import datetime
+from typing import Optional
+import uuid
+from app.utils.timezone import now_naive
+
+
+class SubscriptionState(SQLModel, table=True):
+    """每个订阅一行，与历史记录在同一事务中更新"""
+    __tablename__ = "subscription_states"
+
+    subscription_id: uuid.UUID = Field(
+        sa_column=Column(Uuid, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True)
+    )
+    surplus: float = Field(description="最新一条历史记录的余额（元）")
+    last_reading_at: datetime = Field(description="最新一条历史记录的时间")
+    last_query_at: datetime = Field(description="最近一次成功查询的时间（含未写入历史的重复读数）")
+    burn_rate: Optional[float] = Field(default=None, description="近期平均用电速率（元/小时），指数加权")
+    days_left: Optional[float] = Field(default=None, description="按 burn_rate 估算的剩余天数")
+    # 现存历史记录的统计聚合，用于 O(1) 提供统计信息；写入时增量累加，裁剪 / 删除分区后重新计算
+    sample_count: int = Field(default=0, description="历史记录条数")
+    surplus_sum: float = Field(default=0.0, description="余额之和，用于计算平均值")
+    min_surplus: Optional[float] = None
+    max_surplus: Optional[float] = None
+    updated_at: datetime = Field(default_factory=now_naive)
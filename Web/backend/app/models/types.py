@@ -0,0 +1,19 @@
+"""自定义列类型"""
+from sqlalchemy import Integer
+from sqlalchemy.types import TypeDecorator
+
+
+class Cents(TypeDecorator):
+    """以整数分存储金额，读写时对外表现为以元为单位的 float"""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int(round(float(value) * 100))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / 100
@@ -1,17 +1,23 @@
 """电费历史相关的 Pydantic 模式"""
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
 from datetime import datetime
 import uuid
 
 
 class ElectricityHistoryResponse(BaseModel):
-    """电费历史响应模式"""
-    id: uuid.UUID
+    """
+    电费历史响应模式（紧凑历史表的 id 为整数）。
+    runs=expand 时游程额外返回一个末次读数点：run_end 为 True，id 为空（不对应单独的记录）。
+    """
+    id: Optional[Union[uuid.UUID, int]] = None
     subscription_id: uuid.UUID
     surplus: float
     timestamp: datetime
+    last_seen: Optional[datetime] = None
+    samples: int = 1
     created_at: datetime
+    run_end: bool = False
     
     class Config:
         from_attributes = True
@@ -28,4 +34,52 @@ class HistoryStatsResponse(BaseModel):
     avg_surplus: float
 
 
+class HistorySeriesPoint(BaseModel):
+    """
+    降采样序列点：surplus 为桶内最后一次读数（LTTB 模式下为被选中的原始读数）。
+    consumption / recharge 仅在 1h、1d 桶（读取汇总表）时提供。
+    """
+    timestamp: datetime
+    surplus: float
+    min_surplus: Optional[float] = None
+    max_surplus: Optional[float] = None
+    avg_surplus: Optional[float] = None
+    count: int = 1
+    consumption: Optional[float] = None
+    recharge: Optional[float] = None
+
+
+class HistorySeriesResponse(BaseModel):
+    """降采样历史序列响应模式"""
+    subscription_id: uuid.UUID
+    start: datetime
+    end: datetime
+    mode: str
+    bucket_seconds: Optional[int] = None
+    points: List[HistorySeriesPoint]
+
+
+class HistoryBatchRequest(BaseModel):
+    """多订阅批量序列请求；bucket 与 max_points 的含义同单订阅 series 接口"""
+    subscription_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=50)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    bucket: Optional[str] = None
+    max_points: Optional[int] = Field(None, ge=3, le=5000)
+    include_stats: bool = True
+
+
+class HistoryBatchItem(BaseModel):
+    """批量响应中单个订阅的序列与统计"""
+    subscription_id: uuid.UUID
+    points: List[HistorySeriesPoint]
+    stats: Optional[HistoryStatsResponse] = None
+
 
+class HistoryBatchResponse(BaseModel):
+    """多订阅批量序列响应模式"""
+    start: datetime
+    end: datetime
+    mode: str
+    bucket_seconds: Optional[int] = None
+    items: List[HistoryBatchItem]
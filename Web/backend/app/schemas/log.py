@@ -1,6 +1,6 @@
 """日志相关的 Pydantic 模式"""
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 import uuid
 
@@ -18,3 +18,20 @@ class LogResponse(BaseModel):
 
 
 
+
+
+class LogStreamFilter(BaseModel):
+    """实时日志流的过滤条件，客户端通过 WebSocket 发送 {"type": "subscribe", ...}；未提供的项不过滤"""
+    level: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]] = Field(None, description="最低日志级别")
+    module: Optional[str] = Field(None, max_length=100, description="模块名前缀，如 pm2.tracker")
+    process: Optional[List[str]] = Field(None, description="进程名，如 web-backend、tracker")
+
+    @field_validator("level", mode="before")
+    @classmethod
+    def normalize_level(cls, value):
+        return value.upper() if isinstance(value, str) else value
+
+    @field_validator("process", mode="before")
+    @classmethod
+    def wrap_process(cls, value: Union[str, List[str], None]):
+        return [value] if isinstance(value, str) else value
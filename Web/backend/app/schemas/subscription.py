@@ -44,6 +44,8 @@ class SubscriptionResponse(SubscriptionBase):
     is_owner: Optional[bool] = None
     current_surplus: Optional[float] = None
     last_query_time: Optional[datetime] = None
+    burn_rate: Optional[float] = None  # 近期用电速率（元/小时）
+    estimated_days_left: Optional[float] = None
     email_recipient_count: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
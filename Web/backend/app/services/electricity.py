@@ -1,6 +1,6 @@
 from typing import Any, Dict, Optional
 from sqlmodel import Session, select
-from app.core.electricity import ECampusElectricity
+from app.core.electricity import AsyncECampusElectricity, ECampusElectricity
 from app.models.config import Config
 
 
@@ -9,12 +9,20 @@ class ElectricityService:
         self.session = session
         self.user_id = user_id
         self._ece = None
+        self._async_ece = None
     
     def _get_ece_instance(self) -> ECampusElectricity:
         if self._ece is None:
             config = self._load_config()
             self._ece = ECampusElectricity(config)
         return self._ece
+
+    def get_async_client(self) -> AsyncECampusElectricity:
+        """返回使用相同配置的异步客户端，供 async 路由 / 事件循环内使用"""
+        if self._async_ece is None:
+            config = self._load_config()
+            self._async_ece = AsyncECampusElectricity(config)
+        return self._async_ece
     
     def _load_config(self) -> Dict[str, Any]:
         def fetch_key(key: str):
@@ -73,5 +81,9 @@ class ElectricityService:
         ece = self._get_ece_instance()
         return ece.query_room_surplus_by_room_name(room_name)
 
+    def query_room_surplus_resolved(self, room_name: str, location: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        ece = self._get_ece_instance()
+        return ece.query_room_surplus_resolved(room_name, location)
+
 
 
@@ -0,0 +1,818 @@
+"""电费历史写入服务：批量读取最新记录、内存去重、一次性批量写入，并同步维护小时/天汇总"""
+from sqlmodel import Session, col, select, func
+from sqlalchemy import ColumnElement, Float, bindparam, case, delete, extract, literal, type_coerce, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import math
+import uuid
+from app.config import settings
+from app.models.history import COMPACT_HISTORY, ElectricityHistory
+from app.models.rollup import HistoryRollupDaily, HistoryRollupHourly
+from app.models.subscription import Subscription
+from app.models.subscription_state import SubscriptionState
+from app.utils.timezone import now_naive, to_shanghai_naive
+
+# 与上一条记录数值相同且间隔小于该时长时，不重复写入
+DUPLICATE_WINDOW = timedelta(hours=2)
+EPOCH = datetime(1970, 1, 1)
+# 游程存储：余额未变时只延长最新一条记录的 last_seen / samples
+RUN_LENGTH_HISTORY = settings.HISTORY_RUN_LENGTH
+# 用电速率指数加权的时间常数：越早的区间权重按 e^(-Δt/24h) 衰减
+BURN_RATE_HORIZON = timedelta(hours=24)
+
+# 桶宽（秒） -> 对应的汇总表
+ROLLUP_MODELS = {
+    3600: HistoryRollupHourly,
+    86400: HistoryRollupDaily,
+}
+
+
+class HistoryReading(NamedTuple):
+    """一次成功查询得到的读数（timestamp 为上海时间 naive）"""
+    subscription_id: uuid.UUID
+    surplus: float
+    timestamp: datetime
+
+
+class SeriesBucket(NamedTuple):
+    """时间桶聚合结果；consumption / recharge 仅在读取汇总表时提供"""
+    bucket_start: datetime
+    min_surplus: float
+    max_surplus: float
+    avg_surplus: float
+    last_surplus: float
+    samples: int
+    consumption: Optional[float] = None
+    recharge: Optional[float] = None
+
+
+class HistoryStats(NamedTuple):
+    total_records: int
+    min_surplus: float
+    max_surplus: float
+    avg_surplus: float
+    latest_surplus: float
+    latest_timestamp: datetime
+
+
+def stats_from_state(state: SubscriptionState) -> HistoryStats:
+    """由订阅当前状态中的统计聚合构造汇总统计（调用方保证 sample_count > 0）"""
+    return HistoryStats(
+        total_records=state.sample_count,
+        min_surplus=state.min_surplus if state.min_surplus is not None else state.surplus,
+        max_surplus=state.max_surplus if state.max_surplus is not None else state.surplus,
+        avg_surplus=state.surplus_sum / state.sample_count,
+        latest_surplus=state.surplus,
+        latest_timestamp=to_shanghai_naive(state.last_reading_at),
+    )
+
+
+def floor_time(timestamp: datetime, bucket_seconds: int) -> datetime:
+    """按固定桶宽向下取整（与 SQL 中 epoch - epoch % n 的分桶方式一致）"""
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % bucket_seconds)
+
+
+class RollupAccumulator:
+    """
+    在内存中把一批读数累加为各汇总表的行。
+    previous 为该订阅上一条读数的余额，用于计算消耗 / 充值；没有上一条时只计入 min/max 等。
+    samples 为该读数代表的读数次数（重建时游程末尾的点代表除首次外的全部读数）。
+    """
+
+    def __init__(self):
+        self.rows: Dict[Tuple[int, uuid.UUID, datetime], dict] = {}
+
+    def add(self, reading: "HistoryReading", previous: Optional[float], samples: int = 1):
+        delta = 0.0 if previous is None else reading.surplus - previous
+        for bucket_seconds in ROLLUP_MODELS:
+            bucket_start = floor_time(reading.timestamp, bucket_seconds)
+            key = (bucket_seconds, reading.subscription_id, bucket_start)
+            row = self.rows.get(key)
+            if row is None:
+                row = self.rows[key] = {
+                    "subscription_id": reading.subscription_id,
+                    "bucket_start": bucket_start,
+                    "consumption": 0.0,
+                    "recharge": 0.0,
+                    "min_surplus": reading.surplus,
+                    "max_surplus": reading.surplus,
+                    "sum_surplus": 0.0,
+                    "samples": 0,
+                    "first_surplus": reading.surplus,
+                    "first_timestamp": reading.timestamp,
+                    "last_surplus": reading.surplus,
+                    "last_timestamp": reading.timestamp,
+                }
+            if delta < 0:
+                row["consumption"] += -delta
+            elif delta > 0:
+                row["recharge"] += delta
+            row["min_surplus"] = min(row["min_surplus"], reading.surplus)
+            row["max_surplus"] = max(row["max_surplus"], reading.surplus)
+            row["sum_surplus"] += reading.surplus * samples
+            row["samples"] += samples
+            if reading.timestamp < row["first_timestamp"]:
+                row["first_surplus"] = reading.surplus
+                row["first_timestamp"] = reading.timestamp
+            if reading.timestamp >= row["last_timestamp"]:
+                row["last_surplus"] = reading.surplus
+                row["last_timestamp"] = reading.timestamp
+
+    def rows_by_model(self):
+        grouped: Dict[type, List[dict]] = {}
+        for (bucket_seconds, _, _), row in self.rows.items():
+            grouped.setdefault(ROLLUP_MODELS[bucket_seconds], []).append(row)
+        return grouped.items()
+
+    def clear(self):
+        self.rows.clear()
+
+
+def update_burn_rate(
+    burn_rate: Optional[float], previous: Tuple[float, datetime], surplus: float, timestamp: datetime
+) -> Optional[float]:
+    """用相邻两条读数之间的平均消耗更新指数加权用电速率（元/小时），充值区间不参与"""
+    previous_surplus, previous_time = previous
+    hours = (timestamp - previous_time).total_seconds() / 3600
+    if hours <= 0 or surplus > previous_surplus:
+        return burn_rate
+    rate = (previous_surplus - surplus) / hours
+    if burn_rate is None:
+        return rate
+    alpha = 1 - math.exp(-hours * 3600 / BURN_RATE_HORIZON.total_seconds())
+    return alpha * rate + (1 - alpha) * burn_rate
+
+
+def estimate_days_left(surplus: float, burn_rate: Optional[float]) -> Optional[float]:
+    """按当前用电速率估算剩余天数，速率未知或为 0 时返回 None"""
+    if not burn_rate or burn_rate <= 0:
+        return None
+    return max(surplus, 0.0) / (burn_rate * 24)
+
+
+class StateAccumulator:
+    """
+    在内存中维护一批订阅的当前状态，写入时整体 upsert 到 subscription_states。
+    states 为 subscription_id -> {surplus, last_reading_at, last_query_at, burn_rate,
+    sample_count, surplus_sum, min_surplus, max_surplus}。
+    """
+
+    def __init__(self, states: Optional[Dict[uuid.UUID, dict]] = None):
+        self.states: Dict[uuid.UUID, dict] = states or {}
+        self.touched: set = set()
+
+    def latest(self, subscription_id: uuid.UUID) -> Optional[Tuple[float, datetime]]:
+        state = self.states.get(subscription_id)
+        return (state["surplus"], state["last_reading_at"]) if state else None
+
+    def seen_until(self, subscription_id: uuid.UUID) -> Optional[datetime]:
+        """
+        已处理过的最晚读数时间，不晚于它的读数视为重放。
+        游程存储下游程只记录起始时间，延长过的读数由 last_query_at 覆盖。
+        """
+        state = self.states.get(subscription_id)
+        if state is None:
+            return None
+        return state["last_query_at"] if RUN_LENGTH_HISTORY else state["last_reading_at"]
+
+    def observe(self, reading: "HistoryReading"):
+        """一次成功查询（无论是否写入历史），只更新最近查询时间"""
+        state = self.states.get(reading.subscription_id)
+        if state and reading.timestamp > state["last_query_at"]:
+            state["last_query_at"] = reading.timestamp
+            self.touched.add(reading.subscription_id)
+
+    def record(self, reading: "HistoryReading"):
+        """一条写入历史的读数：更新最新读数与用电速率"""
+        state = self.states.get(reading.subscription_id)
+        if state is None:
+            state = self.states[reading.subscription_id] = {
+                "surplus": reading.surplus,
+                "last_reading_at": reading.timestamp,
+                "last_query_at": reading.timestamp,
+                "burn_rate": None,
+                "sample_count": 0,
+                "surplus_sum": 0.0,
+                "min_surplus": reading.surplus,
+                "max_surplus": reading.surplus,
+            }
+        else:
+            state["burn_rate"] = update_burn_rate(
+                state["burn_rate"], (state["surplus"], state["last_reading_at"]), reading.surplus, reading.timestamp
+            )
+            state["surplus"] = reading.surplus
+            state["last_reading_at"] = reading.timestamp
+            state["last_query_at"] = max(state["last_query_at"], reading.timestamp)
+        state["sample_count"] += 1
+        state["surplus_sum"] += reading.surplus
+        state["min_surplus"] = reading.surplus if state["min_surplus"] is None else min(state["min_surplus"], reading.surplus)
+        state["max_surplus"] = reading.surplus if state["max_surplus"] is None else max(state["max_surplus"], reading.surplus)
+        self.touched.add(reading.subscription_id)
+
+    def rows(self) -> List[dict]:
+        updated_at = now_naive()
+        return [
+            {
+                "subscription_id": subscription_id,
+                **self.states[subscription_id],
+                "days_left": estimate_days_left(self.states[subscription_id]["surplus"], self.states[subscription_id]["burn_rate"]),
+                "updated_at": updated_at,
+            }
+            for subscription_id in self.touched
+        ]
+
+
+def should_record(latest: Optional[Tuple[float, datetime]], surplus: float, timestamp: datetime) -> bool:
+    """
+    判断读数是否需要写入。
+    latest 为上一条记录的 (surplus, timestamp)；数值未变且间隔小于 DUPLICATE_WINDOW 时跳过。
+    """
+    if latest is None:
+        return True
+    latest_surplus, latest_time = latest
+    if latest_surplus != surplus:
+        return True
+    return timestamp - to_shanghai_naive(latest_time) >= DUPLICATE_WINDOW
+
+
+def run_points(timestamp: datetime, surplus: float, last_seen: Optional[datetime]) -> List[Tuple[datetime, float]]:
+    """把一条记录（游程）展开为读数点：首次读到的时间，以及更晚的最后一次读到的时间"""
+    if last_seen and last_seen > timestamp:
+        return [(timestamp, surplus), (last_seen, surplus)]
+    return [(timestamp, surplus)]
+
+
+class HistoryService:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_latest_map(self, subscription_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, ElectricityHistory]:
+        """用一条窗口函数查询取出每个订阅的最新一条历史记录"""
+        ids = list(set(subscription_ids))
+        if not ids:
+            return {}
+        ranked = (
+            select(
+                ElectricityHistory,
+                func.row_number().over(
+                    partition_by=col(ElectricityHistory.subscription_id),
+                    order_by=col(ElectricityHistory.timestamp).desc(),
+                ).label("rn"),
+            )
+            .where(col(ElectricityHistory.subscription_id).in_(ids))
+            .subquery()
+        )
+        latest = aliased(ElectricityHistory, ranked)
+        statement = select(latest).where(ranked.c.rn == 1)
+        return {row.subscription_id: row for row in self.session.exec(statement).all()}
+
+    def load_states(self, subscription_ids: Iterable[uuid.UUID], for_update: bool = False) -> StateAccumulator:
+        """
+        读取订阅当前状态；subscription_states 中尚无记录的订阅回退为从历史表取最新一条。
+        for_update 时按 subscription_id 顺序锁定状态行（SELECT ... FOR UPDATE），
+        使并发写入同一订阅的事务依次基于最新状态去重。
+        """
+        ids = set(subscription_ids)
+        states: Dict[uuid.UUID, dict] = {}
+        if ids:
+            statement = select(SubscriptionState).where(col(SubscriptionState.subscription_id).in_(ids))
+            if for_update:
+                statement = statement.order_by(col(SubscriptionState.subscription_id)).with_for_update()
+            for row in self.session.exec(statement).all():
+                states[row.subscription_id] = {
+                    "surplus": row.surplus,
+                    "last_reading_at": to_shanghai_naive(row.last_reading_at),
+                    "last_query_at": to_shanghai_naive(row.last_query_at),
+                    "burn_rate": row.burn_rate,
+                    "sample_count": row.sample_count,
+                    "surplus_sum": row.surplus_sum,
+                    "min_surplus": row.min_surplus,
+                    "max_surplus": row.max_surplus,
+                }
+
+        missing = ids - states.keys()
+        if missing:
+            # 尚无状态的订阅：一次分组聚合补齐累计值，之后由写入路径增量维护
+            totals = self.history_totals(missing)
+            for subscription_id, row in self.get_latest_map(missing).items():
+                timestamp = to_shanghai_naive(row.timestamp)
+                states[subscription_id] = {
+                    "surplus": row.surplus,
+                    "last_reading_at": timestamp,
+                    "last_query_at": max(timestamp, to_shanghai_naive(row.last_seen or row.timestamp)),
+                    "burn_rate": None,
+                    **totals[subscription_id],
+                }
+        return StateAccumulator(states)
+
+    def history_totals(self, subscription_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, dict]:
+        """
+        用一条分组聚合取出各订阅历史记录的条数、余额之和与最值，
+        返回 subscription_id -> {sample_count, surplus_sum, min_surplus, max_surplus}；没有记录的订阅不出现。
+        """
+        ids = list(set(subscription_ids))
+        if not ids:
+            return {}
+        statement = (
+            select(
+                ElectricityHistory.subscription_id,
+                func.count(col(ElectricityHistory.id)),
+                func.sum(ElectricityHistory.surplus),
+                func.min(ElectricityHistory.surplus),
+                func.max(ElectricityHistory.surplus),
+            )
+            .where(col(ElectricityHistory.subscription_id).in_(ids))
+            .group_by(ElectricityHistory.subscription_id)
+        )
+        return {
+            subscription_id: {
+                "sample_count": int(count),
+                "surplus_sum": float(total),
+                "min_surplus": float(minimum),
+                "max_surplus": float(maximum),
+            }
+            for subscription_id, count, total, minimum, maximum in self.session.exec(statement).all()
+        }
+
+    def refresh_state_aggregates(self, subscription_ids: Optional[Iterable[uuid.UUID]] = None):
+        """
+        保留策略删除历史记录后，按剩余记录重新计算订阅状态中的统计聚合（不提交），
+        使 get_stats 与直接聚合历史表的结果一致。不指定 subscription_ids 时刷新全部已有状态的订阅。
+        """
+        statement = select(SubscriptionState.subscription_id)
+        if subscription_ids is not None:
+            ids = list(set(subscription_ids))
+            if not ids:
+                return
+            statement = statement.where(col(SubscriptionState.subscription_id).in_(ids))
+        ids = list(self.session.exec(statement).all())
+        if not ids:
+            return
+        totals = self.history_totals(ids)
+        empty = {"sample_count": 0, "surplus_sum": 0.0, "min_surplus": None, "max_surplus": None}
+        table = SubscriptionState.__table__
+        statement = (
+            update(table)
+            .where(table.c.subscription_id == bindparam("state_subscription_id"))
+            .values(**{column: bindparam(f"state_{column}") for column in empty})
+        )
+        self.session.execute(
+            statement,
+            [
+                {
+                    "state_subscription_id": subscription_id,
+                    **{f"state_{column}": value for column, value in totals.get(subscription_id, empty).items()},
+                }
+                for subscription_id in ids
+            ],
+        )
+
+    def ingest(self, readings: List[HistoryReading], retry: bool = True) -> List[HistoryReading]:
+        """
+        批量写入读数，Tracker、独立采集脚本与手动查询共用的唯一写入入口：
+        一次读取（并锁定）各订阅当前状态，在内存中按去重规则筛选，
+        再以 INSERT ... ON CONFLICT DO NOTHING 写入历史，并在同一事务中更新汇总表与订阅当前状态。
+        不晚于已处理读数的读数（重放、乱序）直接丢弃（见 StateAccumulator.seen_until）；启用游程存储时，
+        余额未变的读数只延长该订阅最新一条记录（见 extend_runs）。
+        与另一写入方冲突（相同记录已写入、游程已被延长）时回滚，基于其提交后的状态重试一次。
+        返回新写入记录的读数。
+        """
+        if not readings:
+            return []
+
+        states = self.load_states((r.subscription_id for r in readings), for_update=True)
+        stored: List[HistoryReading] = []
+        rows = []
+        # 本批新写入的最新一条 / 需延长的已有记录，均按订阅索引
+        new_rows: Dict[uuid.UUID, dict] = {}
+        extended: Dict[uuid.UUID, dict] = {}
+        rollups = RollupAccumulator()
+        created_at = now_naive()
+        for reading in sorted(readings, key=lambda r: r.timestamp):
+            previous = states.latest(reading.subscription_id)
+            seen_until = states.seen_until(reading.subscription_id)
+            if seen_until and reading.timestamp <= seen_until:
+                continue
+            states.observe(reading)
+            if RUN_LENGTH_HISTORY and previous and previous[0] == reading.surplus:
+                # 游程中的读数同样计入所在的汇总桶（余额未变，不产生消耗），空闲时段的图表不会断开
+                rollups.add(reading, previous[0])
+                self._extend_run(new_rows, extended, reading, previous[1])
+                continue
+            if not RUN_LENGTH_HISTORY and not should_record(previous, reading.surplus, reading.timestamp):
+                continue
+            rollups.add(reading, previous[0] if previous else None)
+            states.record(reading)
+            stored.append(reading)
+            row = {
+                "subscription_id": reading.subscription_id,
+                "surplus": reading.surplus,
+                "timestamp": reading.timestamp,
+                "last_seen": None,
+                "samples": 1,
+                "created_at": created_at,
+            }
+            if not COMPACT_HISTORY:
+                row["id"] = uuid.uuid4()
+            rows.append(row)
+            new_rows[reading.subscription_id] = row
+
+        if rows:
+            if self.insert_history(rows) < len(rows):
+                # 另一写入方已提交相同 (订阅, 时间) 的记录：放弃本批的累加，基于其提交后的状态重新筛选一次
+                self.session.rollback()
+                return self.ingest(readings, retry=False) if retry else []
+        self.upsert_rollups(rollups)
+        if self.extend_runs(extended.values()) < len(extended):
+            # 游程已被另一写入方延长（或已被裁剪）：放弃本批，基于最新状态重新筛选一次；
+            # 重试仍失败时同样放弃，不提交未实际发生的延长对应的状态
+            self.session.rollback()
+            return self.ingest(readings, retry=False) if retry else []
+        self.upsert_states(states)
+        self.session.commit()
+        return stored
+
+    def insert_history(self, rows: List[dict]) -> int:
+        """写入历史记录，(subscription_id, timestamp) 已存在的行跳过（不提交）。返回实际写入的行数"""
+        table = ElectricityHistory.__table__
+        statement = self._dialect_insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.subscription_id, table.c.timestamp]
+        )
+        return len(self.session.execute(statement.returning(table.c.subscription_id), rows).all())
+
+    @staticmethod
+    def _extend_run(new_rows: Dict[uuid.UUID, dict], extended: Dict[uuid.UUID, dict], reading: HistoryReading, run_start: datetime):
+        """把一次未变的读数计入当前游程：本批刚写入的记录直接修改，已有记录累计到 extended"""
+        row = new_rows.get(reading.subscription_id)
+        if row is None:
+            row = extended.setdefault(
+                reading.subscription_id,
+                {
+                    "run_subscription_id": reading.subscription_id,
+                    "run_start": run_start,
+                    "run_first_seen": reading.timestamp,
+                    "run_last_seen": None,
+                    "run_samples": 0,
+                },
+            )
+            row["run_last_seen"] = reading.timestamp
+            row["run_samples"] += 1
+        else:
+            row["last_seen"] = reading.timestamp
+            row["samples"] += 1
+
+    def extend_runs(self, runs: Iterable[dict]) -> int:
+        """
+        按 (订阅, 游程起始时间) 定位已有记录，一次 executemany 更新 last_seen 并累加 samples（不提交）。
+        只在记录的 last_seen 早于本批第一次延长的读数时更新，已计入的读数不会重复累加。
+        返回实际更新的行数：记录已被裁剪或已被另一写入方延长时少于 runs 的条数。
+        """
+        runs = list(runs)
+        if not runs:
+            return 0
+        table = ElectricityHistory.__table__
+        statement = (
+            update(table)
+            .where(
+                table.c.subscription_id == bindparam("run_subscription_id"),
+                table.c.timestamp == bindparam("run_start"),
+                func.coalesce(table.c.last_seen, table.c.timestamp) < bindparam("run_first_seen"),
+            )
+            .values(last_seen=bindparam("run_last_seen"), samples=table.c.samples + bindparam("run_samples"))
+        )
+        return self.session.execute(statement, runs).rowcount
+
+    def _dialect_insert(self, table):
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        return dialect.insert(table)
+
+    def upsert_states(self, states: StateAccumulator):
+        """把有变化的订阅状态写回 subscription_states（不提交）"""
+        rows = states.rows()
+        if not rows:
+            return
+        table = SubscriptionState.__table__
+        statement = self._dialect_insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.subscription_id],
+            set_={
+                column: statement.excluded[column]
+                for column in (
+                    "surplus", "last_reading_at", "last_query_at", "burn_rate", "days_left", "updated_at",
+                    "sample_count", "surplus_sum", "min_surplus", "max_surplus",
+                )
+            },
+        )
+        self.session.execute(statement)
+
+    def upsert_rollups(self, rollups: RollupAccumulator):
+        """
+        把累加结果合并进汇总表（INSERT ... ON CONFLICT DO UPDATE），不提交，
+        以便与历史记录的写入处于同一事务。
+        """
+        for model, rows in rollups.rows_by_model():
+            table = model.__table__
+            statement = self._dialect_insert(table).values(rows)
+            new = statement.excluded
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.subscription_id, table.c.bucket_start],
+                set_={
+                    "consumption": table.c.consumption + new.consumption,
+                    "recharge": table.c.recharge + new.recharge,
+                    "min_surplus": case((new.min_surplus < table.c.min_surplus, new.min_surplus), else_=table.c.min_surplus),
+                    "max_surplus": case((new.max_surplus > table.c.max_surplus, new.max_surplus), else_=table.c.max_surplus),
+                    "sum_surplus": table.c.sum_surplus + new.sum_surplus,
+                    "samples": table.c.samples + new.samples,
+                    "first_surplus": case((new.first_timestamp < table.c.first_timestamp, new.first_surplus), else_=table.c.first_surplus),
+                    "first_timestamp": case((new.first_timestamp < table.c.first_timestamp, new.first_timestamp), else_=table.c.first_timestamp),
+                    "last_surplus": case((new.last_timestamp >= table.c.last_timestamp, new.last_surplus), else_=table.c.last_surplus),
+                    "last_timestamp": case((new.last_timestamp >= table.c.last_timestamp, new.last_timestamp), else_=table.c.last_timestamp),
+                },
+            )
+            self.session.execute(statement)
+
+    def rebuild_aggregates(self, subscription_ids: Optional[Iterable[uuid.UUID]] = None, batch_size: int = 5000) -> int:
+        """
+        根据原始历史记录重建汇总表与订阅当前状态（用于首次启用或数据修复），
+        逐个订阅流式读取并提交。不指定 subscription_ids 时重建全部订阅。返回处理的记录条数。
+        游程中间各次读数的时间已不可知，除首次外的读数（samples - 1 次）计入 last_seen 所在的桶。
+        """
+        if subscription_ids is None:
+            ids = list(self.session.exec(select(ElectricityHistory.subscription_id).distinct()).all())
+        else:
+            ids = list(set(subscription_ids))
+
+        total = 0
+        for subscription_id in ids:
+            for model in (*ROLLUP_MODELS.values(), SubscriptionState):
+                self.session.execute(delete(model).where(col(model.subscription_id) == subscription_id))
+
+            rollups = RollupAccumulator()
+            states = StateAccumulator()
+            statement = (
+                select(ElectricityHistory.timestamp, ElectricityHistory.surplus, ElectricityHistory.last_seen, ElectricityHistory.samples)
+                .where(ElectricityHistory.subscription_id == subscription_id)
+                .order_by(col(ElectricityHistory.timestamp).asc())
+                .execution_options(yield_per=batch_size)
+            )
+            for timestamp, surplus, last_seen, samples in self.session.exec(statement):
+                reading = HistoryReading(subscription_id, float(surplus), to_shanghai_naive(timestamp))
+                previous = states.latest(subscription_id)
+                rollups.add(reading, previous[0] if previous else None)
+                states.record(reading)
+                if last_seen and last_seen > timestamp and samples > 1:
+                    run_end = reading._replace(timestamp=to_shanghai_naive(last_seen))
+                    rollups.add(run_end, reading.surplus, samples - 1)
+                    states.observe(run_end)
+                total += 1
+            if rollups.rows:
+                self.upsert_rollups(rollups)
+                self.upsert_states(states)
+            self.session.commit()
+        return total
+
+    def trim_history(self, limit: int, subscription_ids: Optional[Iterable[uuid.UUID]] = None) -> int:
+        """
+        保留每个订阅最新的 limit 条记录，其余用一条 DELETE 语句删除，
+        并在同一事务中刷新被裁剪订阅的统计聚合（见 refresh_state_aggregates）。
+        不指定 subscription_ids 时对全部订阅执行，适合周期性维护。返回删除行数。
+        """
+        ranked = select(
+            ElectricityHistory.id,
+            func.row_number().over(
+                partition_by=col(ElectricityHistory.subscription_id),
+                order_by=col(ElectricityHistory.timestamp).desc(),
+            ).label("rn"),
+        )
+        if subscription_ids is not None:
+            ids = list(set(subscription_ids))
+            if not ids:
+                return 0
+            ranked = ranked.where(col(ElectricityHistory.subscription_id).in_(ids))
+        ranked = ranked.subquery()
+
+        statement = (
+            delete(ElectricityHistory)
+            .where(col(ElectricityHistory.id).in_(select(ranked.c.id).where(ranked.c.rn > limit)))
+            .returning(col(ElectricityHistory.subscription_id))
+            .execution_options(synchronize_session=False)
+        )
+        trimmed = [row[0] for row in self.session.execute(statement)]
+        self.refresh_state_aggregates(set(trimmed))
+        self.session.commit()
+        return len(trimmed)
+
+    def _range_filters(self, subscription_ids: List[uuid.UUID], start: Optional[datetime], end: Optional[datetime]):
+        filters: List[ColumnElement[bool]] = [col(ElectricityHistory.subscription_id).in_(subscription_ids)]
+        if start:
+            filters.append(col(ElectricityHistory.timestamp) >= start)
+        if end:
+            filters.append(col(ElectricityHistory.timestamp) <= end)
+        return filters
+
+    def bucket_series(self, subscription_id: uuid.UUID, start: Optional[datetime], end: Optional[datetime], bucket_seconds: int) -> List[SeriesBucket]:
+        """按固定时间桶聚合单个订阅，按时间升序返回"""
+        return self.bucket_series_many([subscription_id], start, end, bucket_seconds).get(subscription_id, [])
+
+    def bucket_series_many(
+        self, subscription_ids: Iterable[uuid.UUID], start: Optional[datetime], end: Optional[datetime], bucket_seconds: int
+    ) -> Dict[uuid.UUID, List[SeriesBucket]]:
+        """
+        用一条语句按固定时间桶聚合多个订阅，返回 subscription_id -> 按时间升序的桶。
+        桶宽为 1h / 1d 时直接读取汇总表，否则在 SQL 中对原始记录分桶聚合，
+        游程按 samples 加权，并在 last_seen 所在的桶额外计入一个点。
+        """
+        ids = list(set(subscription_ids))
+        if not ids:
+            return {}
+        if bucket_seconds in ROLLUP_MODELS:
+            return self.rollup_series_many(ids, start, end, bucket_seconds)
+
+        # 每条记录展开为读数点：首次读到的时间（代表 1 次读数），游程另有 last_seen（代表其余 samples - 1 次）
+        history = ElectricityHistory.__table__
+        run_end_filters = [history.c.subscription_id.in_(ids), history.c.last_seen > history.c.timestamp]
+        if start:
+            run_end_filters.append(history.c.last_seen >= start)
+        if end:
+            run_end_filters.append(history.c.last_seen <= end)
+        points = union_all(
+            select(
+                history.c.subscription_id, history.c.timestamp.label("point_at"), history.c.surplus, literal(1).label("weight")
+            ).where(*self._range_filters(ids, start, end)),
+            select(
+                history.c.subscription_id, history.c.last_seen.label("point_at"), history.c.surplus, (history.c.samples - 1).label("weight")
+            ).where(*run_end_filters),
+        ).subquery()
+
+        epoch = extract("epoch", points.c.point_at)
+        bucket = epoch - epoch % bucket_seconds
+        ranked = (
+            select(
+                points.c.subscription_id,
+                bucket.label("bucket"),
+                points.c.surplus,
+                points.c.weight,
+                func.row_number().over(
+                    partition_by=(points.c.subscription_id, bucket),
+                    order_by=points.c.point_at.desc(),
+                ).label("rn"),
+            )
+            .subquery()
+        )
+        # 按读数次数加权平均；紧凑结构下 surplus 为整数分，先按数值计算再还原为元
+        weighted_avg = type_coerce(
+            func.sum(type_coerce(ranked.c.surplus, Float) * ranked.c.weight) * 1.0 / func.sum(ranked.c.weight),
+            ranked.c.surplus.type,
+        )
+        statement = (
+            select(
+                ranked.c.subscription_id,
+                ranked.c.bucket,
+                func.min(ranked.c.surplus),
+                func.max(ranked.c.surplus),
+                weighted_avg,
+                func.max(case((ranked.c.rn == 1, ranked.c.surplus))),
+                func.sum(ranked.c.weight),
+            )
+            .group_by(ranked.c.subscription_id, ranked.c.bucket)
+            .order_by(ranked.c.subscription_id, ranked.c.bucket)
+        )
+        series: Dict[uuid.UUID, List[SeriesBucket]] = {}
+        for row in self.session.exec(statement).all():
+            series.setdefault(row[0], []).append(
+                SeriesBucket(EPOCH + timedelta(seconds=float(row[1])), float(row[2]), float(row[3]), float(row[4]), float(row[5]), int(row[6]))
+            )
+        return series
+
+    def rollup_series(self, subscription_id: uuid.UUID, start: Optional[datetime], end: Optional[datetime], bucket_seconds: int) -> List[SeriesBucket]:
+        """从汇总表读取单个订阅的序列"""
+        return self.rollup_series_many([subscription_id], start, end, bucket_seconds).get(subscription_id, [])
+
+    def rollup_series_many(
+        self, subscription_ids: List[uuid.UUID], start: Optional[datetime], end: Optional[datetime], bucket_seconds: int
+    ) -> Dict[uuid.UUID, List[SeriesBucket]]:
+        """从汇总表读取多个订阅的序列，起始桶按 start 所在桶对齐"""
+        model = ROLLUP_MODELS[bucket_seconds]
+        statement = select(model).where(col(model.subscription_id).in_(subscription_ids))
+        if start:
+            statement = statement.where(model.bucket_start >= floor_time(start, bucket_seconds))
+        if end:
+            statement = statement.where(model.bucket_start <= end)
+        statement = statement.order_by(col(model.subscription_id), col(model.bucket_start).asc())
+        series: Dict[uuid.UUID, List[SeriesBucket]] = {}
+        for row in self.session.exec(statement).all():
+            series.setdefault(row.subscription_id, []).append(
+                SeriesBucket(
+                    row.bucket_start,
+                    row.min_surplus,
+                    row.max_surplus,
+                    row.sum_surplus / row.samples if row.samples else row.last_surplus,
+                    row.last_surplus,
+                    row.samples,
+                    row.consumption,
+                    row.recharge,
+                )
+            )
+        return series
+
+    def get_stats(self, subscription_id: uuid.UUID) -> Optional[HistoryStats]:
+        """
+        汇总统计：直接读取订阅当前状态中的统计聚合（O(1)），
+        状态尚未建立时回退为对原始记录的聚合。无数据时返回 None。
+        """
+        state = self.session.get(SubscriptionState, subscription_id)
+        if state and state.sample_count:
+            return stats_from_state(state)
+
+        result = self.session.exec(
+            select(
+                func.count(col(ElectricityHistory.id)),
+                func.min(ElectricityHistory.surplus),
+                func.max(ElectricityHistory.surplus),
+                func.avg(ElectricityHistory.surplus, type_=ElectricityHistory.__table__.c.surplus.type),
+            ).where(ElectricityHistory.subscription_id == subscription_id)
+        ).first()
+        if not result or not result[0]:
+            return None
+        latest = self.get_latest_map([subscription_id])[subscription_id]
+        return HistoryStats(
+            total_records=int(result[0]),
+            min_surplus=float(result[1]),
+            max_surplus=float(result[2]),
+            avg_surplus=float(result[3]),
+            latest_surplus=latest.surplus,
+            latest_timestamp=to_shanghai_naive(latest.timestamp),
+        )
+
+    def iter_export_rows(
+        self,
+        subscription_ids: Iterable[uuid.UUID],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 2000,
+    ) -> Iterator[Tuple[uuid.UUID, str, datetime, float]]:
+        """
+        按 (订阅, 时间) 顺序流式产出 (subscription_id, room_name, timestamp, surplus)，游程展开为首末两个读数。
+        使用服务端游标分批读取，不会一次性把结果集载入内存。
+        """
+        ids = list(set(subscription_ids))
+        if not ids:
+            return
+        statement = (
+            select(
+                ElectricityHistory.subscription_id,
+                Subscription.room_name,
+                ElectricityHistory.timestamp,
+                ElectricityHistory.surplus,
+                ElectricityHistory.last_seen,
+            )
+            .join(Subscription, Subscription.id == ElectricityHistory.subscription_id)
+            .where(col(ElectricityHistory.subscription_id).in_(ids))
+        )
+        if start:
+            statement = statement.where(ElectricityHistory.timestamp >= start)
+        if end:
+            statement = statement.where(ElectricityHistory.timestamp <= end)
+        statement = statement.order_by(col(ElectricityHistory.subscription_id), ElectricityHistory.timestamp).execution_options(
+            stream_results=True, yield_per=batch_size
+        )
+        for subscription_id, room_name, timestamp, surplus, last_seen in self.session.exec(statement):
+            if end and last_seen and last_seen > end:
+                last_seen = None
+            for point_time, value in run_points(timestamp, float(surplus), last_seen):
+                yield subscription_id, room_name, to_shanghai_naive(point_time), value
+
+    def raw_series(
+        self, subscription_id: uuid.UUID, start: Optional[datetime], end: Optional[datetime], expand_runs: bool = True
+    ) -> List[Tuple[datetime, float]]:
+        """只取 (timestamp, surplus) 两列，按时间升序，不构造 ORM 对象"""
+        return self.raw_series_many([subscription_id], start, end, expand_runs).get(subscription_id, [])
+
+    def raw_series_many(
+        self,
+        subscription_ids: Iterable[uuid.UUID],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        expand_runs: bool = True,
+    ) -> Dict[uuid.UUID, List[Tuple[datetime, float]]]:
+        """
+        用一条语句取多个订阅的 (timestamp, surplus)，返回 subscription_id -> 按时间升序的读数。
+        expand_runs 时游程额外产出最后一次读到的点（不超过 end），否则每条记录只取首次读到的点。
+        """
+        ids = list(set(subscription_ids))
+        if not ids:
+            return {}
+        statement = (
+            select(ElectricityHistory.subscription_id, ElectricityHistory.timestamp, ElectricityHistory.surplus, ElectricityHistory.last_seen)
+            .where(*self._range_filters(ids, start, end))
+            .order_by(col(ElectricityHistory.subscription_id), col(ElectricityHistory.timestamp).asc())
+        )
+        series: Dict[uuid.UUID, List[Tuple[datetime, float]]] = {}
+        for subscription_id, timestamp, surplus, last_seen in self.session.exec(statement).all():
+            if not expand_runs or (end and last_seen and last_seen > end):
+                last_seen = None
+            series.setdefault(subscription_id, []).extend(run_points(timestamp, float(surplus), last_seen))
+        return series
@@ -1,11 +1,15 @@
-from sqlmodel import Session, select
+from sqlmodel import Session, col, func, select
+from sqlalchemy import and_, or_
+from app.models.history import ElectricityHistory
 from app.models.subscription import Subscription
+from app.models.subscription_state import SubscriptionState
 from app.models.user_subscription import UserSubscription
 from app.schemas.subscription import SubscriptionCreate, SubscriptionUpdate
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
 from datetime import datetime
 from app.utils.room_parser import parse_building_room, parse_room_name, RoomParseError
+from app.utils.timezone import to_shanghai_naive
 
 
 class SubscriptionService:
@@ -23,6 +27,72 @@ class SubscriptionService:
             )
         return list(self.session.exec(statement).all())
     
+    def list_subscriptions_with_state(
+        self, user_id: uuid.UUID, include_all: bool = False
+    ) -> List[Tuple[Subscription, Optional[bool], Optional[SubscriptionState]]]:
+        """
+        用一条语句列出用户的订阅，同时带出该用户的 is_owner 与订阅当前状态。
+        返回 (订阅, is_owner, 当前状态)；无映射或尚无读数时对应字段为 None。
+        尚无状态行的订阅（如升级后尚未执行 rebuild-rollups）在同一语句中外连接其最新一条历史记录，
+        构造不写回数据库的临时状态；该子查询只对没有状态行的订阅排序，状态齐全时不扫描历史。
+        """
+        latest = (
+            select(
+                ElectricityHistory.subscription_id,
+                ElectricityHistory.surplus,
+                ElectricityHistory.timestamp,
+                func.row_number().over(
+                    partition_by=col(ElectricityHistory.subscription_id),
+                    order_by=col(ElectricityHistory.timestamp).desc(),
+                ).label("rn"),
+            )
+            .where(col(ElectricityHistory.subscription_id).not_in(select(SubscriptionState.subscription_id)))
+            .subquery()
+        )
+        statement = (
+            select(Subscription, UserSubscription.is_owner, SubscriptionState, latest.c.surplus, latest.c.timestamp)
+            .join(
+                UserSubscription,
+                and_(UserSubscription.subscription_id == Subscription.id, UserSubscription.user_id == user_id),
+                isouter=include_all,
+            )
+            .outerjoin(SubscriptionState, SubscriptionState.subscription_id == Subscription.id)
+            .outerjoin(latest, and_(latest.c.subscription_id == Subscription.id, latest.c.rn == 1))
+        )
+        return [
+            (subscription, is_owner, state if state is not None else self._state_from_history(subscription.id, surplus, timestamp))
+            for subscription, is_owner, state, surplus, timestamp in self.session.exec(statement).all()
+        ]
+
+    @staticmethod
+    def _state_from_history(
+        subscription_id: uuid.UUID, surplus: Optional[float], timestamp: Optional[datetime]
+    ) -> Optional[SubscriptionState]:
+        if timestamp is None:
+            return None
+        timestamp = to_shanghai_naive(timestamp)
+        return SubscriptionState(
+            subscription_id=subscription_id,
+            surplus=surplus,
+            last_reading_at=timestamp,
+            last_query_at=timestamp,
+        )
+
+    def filter_accessible(self, subscription_ids: List[uuid.UUID], user_id: uuid.UUID, is_admin: bool = False) -> set:
+        """用一条查询返回给定订阅中该用户可访问的那部分 ID"""
+        if not subscription_ids:
+            return set()
+        statement = select(Subscription.id).where(Subscription.id.in_(subscription_ids))
+        if not is_admin:
+            statement = (
+                statement.outerjoin(
+                    UserSubscription,
+                    and_(UserSubscription.subscription_id == Subscription.id, UserSubscription.user_id == user_id),
+                )
+                .where(or_(Subscription.user_id == user_id, UserSubscription.user_id.is_not(None)))
+            )
+        return set(self.session.exec(statement).all())
+
     def _user_can_access(self, subscription_id: uuid.UUID, user_id: uuid.UUID, allow_admin: bool) -> bool:
         subscription = self.session.get(Subscription, subscription_id)
         if subscription and subscription.user_id == user_id:
@@ -134,6 +204,9 @@ class SubscriptionService:
                 return None
         
         update_data = data.model_dump(exclude_unset=True)
+        if update_data.get("room_name") and update_data["room_name"] != subscription.room_name:
+            # 房间变更后已保存的上游定位失效，由 Tracker 重新解析
+            subscription.resolved_location = None
         for key, value in update_data.items():
             setattr(subscription, key, value)
         
@@ -169,5 +242,17 @@ class SubscriptionService:
         statement = select(Subscription).where(Subscription.is_active == True)
         return list(self.session.exec(statement).all())
 
+    def save_resolved_location(self, subscription: Subscription, room_info: dict) -> bool:
+        """
+        暂存查询结果中的上游定位（未变化时不写库），返回是否有更新。
+        不提交：与本次读数在 HistoryService.ingest 的同一事务中提交，与独立采集脚本一致。
+        """
+        location = (room_info.get("data") or {}).get("location")
+        if not location or subscription.resolved_location == location:
+            return False
+        subscription.resolved_location = location
+        self.session.add(subscription)
+        return True
+
 
 
@@ -0,0 +1,67 @@
+"""时间序列降采样工具：桶宽解析与 LTTB（Largest-Triangle-Three-Buckets）抽稀"""
+import re
+from typing import List, Sequence, Tuple
+
+_BUCKET_RE = re.compile(r"^\s*(\d+)\s*([smhd])\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_bucket(value: str) -> int:
+    """
+    将 "15m" / "1h" / "1d" 之类的桶宽解析为秒数。
+    格式不正确或为 0 时抛出 ValueError。
+    """
+    match = _BUCKET_RE.match(value or "")
+    if not match:
+        raise ValueError(f"无效的时间桶: {value}，应为数字加单位 s/m/h/d，如 15m、1h、1d")
+    seconds = int(match.group(1)) * _UNIT_SECONDS[match.group(2).lower()]
+    if seconds <= 0:
+        raise ValueError(f"无效的时间桶: {value}")
+    return seconds
+
+
+def lttb_indices(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets 抽稀，返回被保留点的下标（含首尾，最多 threshold 个）。
+    points 为按 x 升序排列的 (x, y)。
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    if threshold <= 0:
+        return []
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点作为三角形的第三个顶点
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_len = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / next_len
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / next_len
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        best_area = -1.0
+        best_index = start
+        for j in range(start, end):
+            bx, by = points[j]
+            area = abs((ax - avg_x) * (by - ay) - (ax - bx) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best_index = j
+        selected.append(best_index)
+        a = best_index
+
+    selected.append(n - 1)
+    return selected
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """LTTB 抽稀，返回被保留的 (x, y) 点"""
+    return [points[i] for i in lttb_indices(points, threshold)]
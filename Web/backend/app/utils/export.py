@@ -0,0 +1,63 @@
+"""历史数据导出：把行迭代器逐块编码为 CSV / NDJSON，内存占用与总行数无关"""
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Tuple
+from datetime import datetime
+import uuid
+
+EXPORT_COLUMNS = ("subscription_id", "room_name", "timestamp", "surplus")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+# 累积到该字节数后输出一块，避免每行一次写入
+CHUNK_SIZE = 64 * 1024
+
+ExportRow = Tuple[uuid.UUID, str, datetime, float]
+
+
+def iter_csv(rows: Iterable[ExportRow], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for subscription_id, room_name, timestamp, surplus in rows:
+        writer.writerow((subscription_id, room_name, timestamp.isoformat(), surplus))
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[ExportRow], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    lines = []
+    size = 0
+    for subscription_id, room_name, timestamp, surplus in rows:
+        line = json.dumps(
+            {
+                "subscription_id": str(subscription_id),
+                "room_name": room_name,
+                "timestamp": timestamp.isoformat(),
+                "surplus": surplus,
+            },
+            ensure_ascii=False,
+        )
+        lines.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+            size = 0
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def iter_export(rows: Iterable[ExportRow], export_format: str) -> Iterator[str]:
+    """按格式（csv / ndjson）编码导出行"""
+    if export_format == "csv":
+        return iter_csv(rows)
+    if export_format == "ndjson":
+        return iter_ndjson(rows)
+    raise ValueError(f"不支持的导出格式: {export_format}")
@@ -0,0 +1,164 @@
+"""electricity_history 按月分区（仅 PostgreSQL，可选）
+
+启用 HISTORY_PARTITIONING 后，electricity_history 为按 timestamp 范围分区的父表，
+每月一个子分区（electricity_history_yYYYYmMM），另有一个 default 分区兜底。
+按时间的保留策略通过直接 DROP 过期的月分区实现，无需逐行删除。
+"""
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import Session
+
+from app.models.history import COMPACT_HISTORY, ElectricityHistory
+from app.services.history import HistoryService
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = "electricity_history"
+DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+_PARTITION_RE = re.compile(rf"^{HISTORY_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# 分区表的主键必须包含分区键，因此为 (id, timestamp)；删除订阅时级联删除历史，与模型一致。
+# 紧凑结构（HISTORY_COMPACT_SCHEMA）下 id 为 bigserial、余额为整数分，timestamp 使用 BRIN 索引
+_ID_COLUMN = "id BIGSERIAL" if COMPACT_HISTORY else "id UUID NOT NULL DEFAULT gen_random_uuid()"
+_SURPLUS_COLUMN = "surplus INTEGER NOT NULL" if COMPACT_HISTORY else "surplus FLOAT NOT NULL"
+PARTITIONED_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+    {_ID_COLUMN},
+    subscription_id UUID NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
+    {_SURPLUS_COLUMN},
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP,
+    samples INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+# 索引与模型 ElectricityHistory 同名同定义（由模型生成），分区与非分区两条路径不会分叉；
+# 唯一索引包含分区键 timestamp，可直接用于 ON CONFLICT
+HISTORY_INDEXES = sorted(ElectricityHistory.__table__.indexes, key=lambda index: index.name)
+PARTITIONED_INDEX_DDL = [
+    str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect())) for index in HISTORY_INDEXES
+]
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{HISTORY_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def is_history_partitioned(conn: Connection) -> bool:
+    """electricity_history 是否已是分区父表"""
+    if not is_postgres(conn):
+        return False
+    result = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": HISTORY_TABLE},
+    ).scalar()
+    return result == "p"
+
+
+def create_partitioned_history_table(conn: Connection):
+    """创建分区父表、索引与 default 分区（已存在时跳过）"""
+    conn.execute(text(PARTITIONED_TABLE_DDL))
+    for ddl in PARTITIONED_INDEX_DDL:
+        conn.execute(text(ddl))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {HISTORY_TABLE} DEFAULT"))
+
+
+def ensure_month_partitions(conn: Connection, start: date, end: date) -> List[str]:
+    """为 [start 所在月, end 所在月] 区间内缺失的月份创建分区，返回新建的分区名"""
+    existing = {name for name, _ in list_month_partitions(conn)}
+    created = []
+    month = _month_start(start)
+    last = _month_start(end)
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {HISTORY_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = _add_months(month, 1)
+    return created
+
+
+def ensure_upcoming_partitions(conn: Connection, today: date, months_ahead: int = 2) -> List[str]:
+    """确保本月及之后 months_ahead 个月的分区存在，避免数据落入 default 分区"""
+    return ensure_month_partitions(conn, today, _add_months(_month_start(today), months_ahead))
+
+
+def list_month_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """列出全部月分区及其起始月份（按时间排序）"""
+    rows = conn.execute(text(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :name
+        """
+    ), {"name": HISTORY_TABLE}).scalars().all()
+    partitions = []
+    for name in rows:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def drop_expired_partitions(conn: Connection, today: date, retention_months: int) -> List[str]:
+    """
+    删除整月都早于保留窗口的分区（保留本月及之前 retention_months 个月）。
+    retention_months <= 0 时不做任何处理。返回被删除的分区名。
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = _add_months(_month_start(today), -retention_months)
+    dropped = []
+    for name, month in list_month_partitions(conn):
+        if month < cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def maintain_history_partitions(engine: Engine, retention_months: int, now: datetime) -> Tuple[List[str], List[str]]:
+    """
+    周期性维护：补齐未来月份分区并删除过期分区，删除后在同一事务中刷新订阅状态的统计聚合。
+    未分区时直接返回。
+    """
+    if not is_postgres(engine):
+        return [], []
+    with engine.begin() as conn:
+        if not is_history_partitioned(conn):
+            return [], []
+        created = ensure_upcoming_partitions(conn, now.date())
+        dropped = drop_expired_partitions(conn, now.date(), retention_months)
+        if dropped:
+            HistoryService(Session(bind=conn)).refresh_state_aggregates()
+    for name in created:
+        logger.info("已创建历史分区 %s", name)
+    for name in dropped:
+        logger.info("已删除过期历史分区 %s", name)
+    return created, dropped
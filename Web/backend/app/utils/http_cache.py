@@ -0,0 +1,70 @@
+"""历史数据接口的条件请求（ETag / If-None-Match）与缓存头"""
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from app.config import settings
+from app.models.subscription_state import SubscriptionState
+
+# 历史数据最多每个 TRACKER_CHECK_INTERVAL 变化一次，但手动查询也可能写入，
+# 因此只让浏览器直接复用很短的一段时间，之后用 ETag 重新校验
+HISTORY_MAX_AGE = max(settings.TRACKER_CHECK_INTERVAL // 12, 0)
+
+
+def history_etag(
+    request: Request,
+    subscription_id: uuid.UUID,
+    state: Optional[SubscriptionState],
+    window: Optional[Tuple[datetime, datetime]] = None,
+) -> Optional[str]:
+    """
+    由 (订阅, 最新读数时间, 记录条数, 查询参数) 生成弱 ETag；订阅尚无状态时返回 None。
+    window 为服务端解析出的时间窗口（未指定 start / end 时随当前时间移动），一并计入。
+    """
+    if state is None:
+        return None
+    # 游程存储下每次查询都可能延长最新一条记录，改用最近查询时间
+    changed_at = state.last_query_at if settings.HISTORY_RUN_LENGTH else state.last_reading_at
+    params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    raw = f"{request.url.path}|{subscription_id}|{changed_at.isoformat()}|{state.sample_count}|{params}"
+    if window:
+        raw += f"|{window[0].isoformat()}|{window[1].isoformat()}"
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 比较时忽略弱校验前缀
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    subscription_id: uuid.UUID,
+    state: Optional[SubscriptionState],
+    window: Optional[Tuple[datetime, datetime]] = None,
+) -> Optional[Response]:
+    """
+    客户端缓存仍有效时返回 304 响应（调用方直接返回，不再查询和序列化数据）；
+    否则在 response 上设置 ETag / Cache-Control 并返回 None。
+    """
+    etag = history_etag(request, subscription_id, state, window)
+    if etag is None:
+        return None
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={HISTORY_MAX_AGE}, must-revalidate",
+        "Vary": "Authorization",
+    }
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
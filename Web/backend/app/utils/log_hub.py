@@ -0,0 +1,118 @@
+"""实时日志分发：每条日志只序列化一次，分发到各 WebSocket 连接的有界队列"""
+import asyncio
+import json
+import logging
+import threading
+from typing import FrozenSet, Iterable, List, Optional
+
+# 每个连接最多积压的消息数，超出时丢弃最旧的
+SUBSCRIBER_QUEUE_SIZE = 1000
+# 单个帧最多携带的消息数
+MAX_BATCH_SIZE = 500
+
+
+def level_number(level: Optional[str]) -> int:
+    """日志级别名 -> 数值，未知级别按 INFO 处理"""
+    value = logging.getLevelName((level or "INFO").upper())
+    return value if isinstance(value, int) else logging.INFO
+
+
+class LogSubscriber:
+    """
+    一个 WebSocket 连接：有界队列（满时丢弃最旧的消息）与丢弃计数，
+    以及客户端设置的过滤条件（最低级别、模块名前缀、进程名）。
+    """
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.min_level = logging.NOTSET
+        self.module_prefix: Optional[str] = None
+        self.processes: Optional[frozenset] = None
+
+    def set_filter(self, level: Optional[str] = None, module_prefix: Optional[str] = None, processes: Optional[Iterable[str]] = None):
+        """设置过滤条件，参数为 None 表示不按该项过滤"""
+        self.min_level = level_number(level) if level else logging.NOTSET
+        self.module_prefix = module_prefix or None
+        self.processes = frozenset(processes) if processes else None
+
+    def matches(self, level: str, module: Optional[str], process: Optional[str]) -> bool:
+        if self.min_level and level_number(level) < self.min_level:
+            return False
+        if self.module_prefix and not (module or "").startswith(self.module_prefix):
+            return False
+        if self.processes is not None and process not in self.processes:
+            return False
+        return True
+
+    def offer(self, payload: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def next_frame(self) -> str:
+        """等待至少一条消息，把当前积压的消息（及此前丢弃的条数）拼成一个批量帧"""
+        payloads = [await self.queue.get()]
+        while len(payloads) < MAX_BATCH_SIZE and not self.queue.empty():
+            payloads.append(self.queue.get_nowait())
+        dropped, self.dropped = self.dropped, 0
+        # 消息已是 JSON 字符串，直接拼接，不再逐条编码
+        return f'{{"type":"batch","dropped":{dropped},"messages":[{",".join(payloads)}]}}'
+
+
+class LogHub:
+    """
+    日志分发中心：publish 可在任意线程调用（logging 处理器、PM2 日志监控器）。
+    先按各订阅者的过滤条件筛选，没有订阅者需要时不做任何序列化；
+    否则消息序列化一次后在事件循环线程中放入匹配的订阅者队列。
+    subscribers 为不可变集合，订阅 / 取消订阅时整体替换（写入方加锁），
+    其他线程遍历时拿到的总是一个完整的快照。
+    """
+
+    def __init__(self):
+        self.subscribers: FrozenSet[LogSubscriber] = frozenset()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> LogSubscriber:
+        """在事件循环中调用，为一个连接创建订阅"""
+        self.loop = asyncio.get_running_loop()
+        subscriber = LogSubscriber()
+        with self._lock:
+            self.subscribers = self.subscribers | {subscriber}
+        return subscriber
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        with self._lock:
+            self.subscribers = self.subscribers - {subscriber}
+
+    def matching(self, level: str, module: Optional[str] = None, process: Optional[str] = None) -> List[LogSubscriber]:
+        """需要该日志的订阅者；调用方可据此在格式化消息之前跳过"""
+        return [subscriber for subscriber in self.subscribers if subscriber.matches(level, module, process)]
+
+    def publish(self, message: dict, subscribers: Optional[List[LogSubscriber]] = None):
+        """发布消息；subscribers 为调用方已筛选出的订阅者，未提供时按消息的 level / module / process 筛选"""
+        if subscribers is None:
+            subscribers = self.matching(message.get("level", "INFO"), message.get("module"), message.get("process"))
+        if not subscribers or self.loop is None or self.loop.is_closed():
+            return
+        payload = json.dumps(message, ensure_ascii=False, default=str)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._fan_out(payload, subscribers)
+        else:
+            # asyncio.Queue 不是线程安全的，其他线程的日志交给事件循环线程分发
+            self.loop.call_soon_threadsafe(self._fan_out, payload, subscribers)
+
+    def _fan_out(self, payload: str, subscribers: List[LogSubscriber]):
+        for subscriber in subscribers:
+            # 筛选之后可能已断开
+            if subscriber in self.subscribers:
+                subscriber.offer(payload)
+
+
+log_hub = LogHub()
@@ -0,0 +1,158 @@
+"""日志保留：分批删除过期日志，可选在删除前按天追加归档为压缩文件"""
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models.log import Log
+
+logger = logging.getLogger(__name__)
+
+# 每批删除的行数：单个事务足够小，不会长时间持有锁或撑大 WAL
+DELETE_BATCH_SIZE = 5000
+# 已写入归档、删除尚未确认提交的一批日志 id，下一次清理时不再重复归档
+PENDING_ARCHIVE_FILE = ".pending-archive.json"
+
+
+class PurgeResult(NamedTuple):
+    deleted: int
+    # 本次写入归档的行数：上一次已归档、删除未提交的行只删除，不计入
+    archived: int
+    elapsed: float
+    days: Set[date]
+
+
+def retention_cutoff(now: datetime, retention_days: int) -> datetime:
+    """保留 retention_days 天，截止到整天的零点，保证只删除 / 归档完整的日期"""
+    return datetime.combine((now - timedelta(days=retention_days)).date(), datetime.min.time())
+
+
+def archive_path(archive_dir: Path, day: date) -> Path:
+    return archive_dir / f"logs-{day.isoformat()}.ndjson.gz"
+
+
+def archive_rows(archive_dir: Path, rows: Iterable[Tuple]) -> Set[date]:
+    """
+    把 (id, timestamp, level, module, message) 按天追加到 archive_dir/logs-YYYY-MM-DD.ndjson.gz，
+    返回涉及的日期。每次追加一个 gzip 成员，已有内容不会被覆盖，gzip.open / zcat 可直接读取整个文件。
+    """
+    by_day: Dict[date, List[str]] = {}
+    for log_id, timestamp, level, module, message in rows:
+        by_day.setdefault(timestamp.date(), []).append(json.dumps(
+            {"id": str(log_id), "timestamp": timestamp.isoformat(), "level": level, "module": module, "message": message},
+            ensure_ascii=False,
+        ) + "\n")
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    sizes = {day: _file_size(archive_path(archive_dir, day)) for day in by_day}
+    try:
+        for day, lines in by_day.items():
+            with gzip.open(archive_path(archive_dir, day), "at", encoding="utf-8") as f:
+                f.writelines(lines)
+    except BaseException:
+        # 写入失败：截回写入前的长度，不留下不完整的 gzip 成员
+        for day, size in sizes.items():
+            _truncate(archive_path(archive_dir, day), size)
+        raise
+    return set(by_day)
+
+
+def _file_size(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return None
+
+
+def _truncate(path: Path, size: Optional[int]):
+    if size is None:
+        path.unlink(missing_ok=True)
+    elif path.exists():
+        os.truncate(path, size)
+
+
+def load_pending_archive(archive_dir: Path) -> Set[str]:
+    """上一次清理已归档、但删除未提交（失败或进程中断）的日志 id"""
+    try:
+        return set(json.loads((archive_dir / PENDING_ARCHIVE_FILE).read_text(encoding="utf-8")))
+    except FileNotFoundError:
+        return set()
+
+
+def save_pending_archive(archive_dir: Path, log_ids: Optional[Iterable[str]]):
+    """在删除提交前记录本批已归档的 id（原子替换），提交后传入 None 清除"""
+    path = archive_dir / PENDING_ARCHIVE_FILE
+    if log_ids is None:
+        path.unlink(missing_ok=True)
+        return
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(sorted(log_ids)), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def purge_logs_before(
+    cutoff: datetime, archive_dir: Optional[Path] = None, batch_size: int = DELETE_BATCH_SIZE
+) -> PurgeResult:
+    """
+    分批删除 cutoff 之前的日志，每批单独提交。返回删除行数、归档行数、用时秒数与归档涉及的日期。
+    未指定 archive_dir 时每批为一条 DELETE ... WHERE id IN (SELECT id ... LIMIT n)；
+    指定时先读出一批、追加写入归档文件，再按这批的 id 删除，只删除已归档的行
+    （归档与删除之间新写入的旧时间戳日志留到下一批或下一次清理）。
+    删除提交前把这批 id 记录到 PENDING_ARCHIVE_FILE：删除失败或进程中断时，
+    下一次清理跳过这些行的归档、只删除，归档中不会出现重复记录。
+    """
+    deleted = 0
+    archived_rows = 0
+    archived: Set[date] = set()
+    started = time.perf_counter()
+    while True:
+        with Session(engine) as session:
+            if archive_dir is None:
+                expired = select(Log.id).where(Log.timestamp < cutoff).limit(batch_size)
+                result = session.execute(delete(Log).where(Log.id.in_(expired)).execution_options(synchronize_session=False))
+                count = result.rowcount or 0
+            else:
+                rows = session.exec(
+                    select(Log.id, Log.timestamp, Log.level, Log.module, Log.message)
+                    .where(Log.timestamp < cutoff)
+                    .order_by(Log.timestamp, Log.id)
+                    .limit(batch_size)
+                ).all()
+                count = len(rows)
+                if rows:
+                    pending = load_pending_archive(archive_dir)
+                    to_archive = [row for row in rows if str(row[0]) not in pending]
+                    archived |= archive_rows(archive_dir, to_archive)
+                    archived_rows += len(to_archive)
+                    save_pending_archive(archive_dir, (str(row[0]) for row in rows))
+                    session.execute(
+                        delete(Log).where(Log.id.in_([row[0] for row in rows])).execution_options(synchronize_session=False)
+                    )
+            session.commit()
+        if archive_dir is not None and count:
+            save_pending_archive(archive_dir, None)
+        deleted += count
+        if count < batch_size:
+            break
+    return PurgeResult(deleted, archived_rows, time.perf_counter() - started, archived)
+
+
+def cleanup_logs(now: datetime, retention_days: int, archive_dir: Optional[Path] = None) -> int:
+    """归档（如已配置）并删除超过保留天数的日志，返回删除行数"""
+    cutoff = retention_cutoff(now, retention_days)
+    deleted, archived_rows, elapsed, archived = purge_logs_before(cutoff, archive_dir)
+    if archived:
+        logger.info(f"Archived {archived_rows} log entries from {len(archived)} day(s) to {archive_dir}")
+    if deleted:
+        rate = deleted / elapsed if elapsed > 0 else float(deleted)
+        logger.info(
+            f"Cleaned up {deleted} old log entries (before {cutoff:%Y-%m-%d}) in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        )
+    return deleted
@@ -1,82 +1,154 @@
 """自定义日志配置：支持数据库和 WebSocket"""
 import logging
+import queue
 import sys
+import threading
+import time
+import uuid
 from typing import List, Optional
 from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.config import settings
 from app.models.log import Log
 from sqlmodel import Session, select
 from app.database import engine
+from app.utils.log_hub import log_hub
+from app.utils.timezone import now_naive
+
+# 本进程在 PM2 中的名称，实时日志按进程名过滤时与 PM2 日志一致
+BACKEND_PROCESS = "web-backend"
 
 
 class DatabaseLogHandler(logging.Handler):
-    """写入数据库的日志处理器"""
-    
-    def __init__(self, session: Optional[Session] = None):
+    """
+    写入数据库的日志处理器：emit 只把记录放入有界队列，
+    由后台线程按条数或时间间隔攒批，用一条多行 INSERT 写入 logs。
+    队列满时按 overflow 策略丢弃（drop）或等待（block，最多 BLOCK_TIMEOUT 秒后仍丢弃）；
+    写入失败的一批同样计入丢弃数，在下一次写入时以一条 WARNING 记录报告；
+    关闭时（含进程退出时的 logging.shutdown）写完队列中剩余的记录。
+    """
+
+    BLOCK_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 1000,
+        overflow: str = "drop",
+    ):
         super().__init__()
-        self.session = session
-    
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"不支持的日志队列溢出策略: {overflow}")
+        self.queue: "queue.Queue[dict]" = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.block = overflow == "block"
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="db-log-writer", daemon=True)
+        self._writer.start()
+
     def emit(self, record: logging.LogRecord):
-        """将日志记录写入数据库"""
+        """把日志记录放入队列（不访问数据库）"""
         try:
-            from app.utils.timezone import now_naive
-            log_entry = Log(
-                level=record.levelname,
-                message=self.format(record),
-                module=record.module if hasattr(record, 'module') else None,
-                timestamp=now_naive()
-            )
-            if self.session:
-                self.session.add(log_entry)
-                self.session.commit()
+            entry = {
+                "id": uuid.uuid4(),
+                "level": record.levelname,
+                "message": self.format(record),
+                "module": record.module if hasattr(record, 'module') else None,
+                "timestamp": now_naive(),
+            }
+            if self.block and not self._stopping.is_set():
+                self.queue.put(entry, timeout=self.BLOCK_TIMEOUT)
             else:
-                with Session(engine) as session:
-                    session.add(log_entry)
-                    session.commit()
-                    # 保留最近 30 天日志，避免无限增长
-                    # 注意：这里每次写入都会清理，可能影响性能，改为批量清理
-                    # 实际清理逻辑在PM2日志监控器中也会执行
-                    pass
+                self.queue.put_nowait(entry)
+        except queue.Full:
+            self._add_dropped(1)
         except Exception:
-            pass
+            self.handleError(record)
+
+    def _take_batch(self) -> List[dict]:
+        """等待第一条记录，再在 flush_interval 内继续收集，直到凑满 batch_size"""
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _add_dropped(self, count: int):
+        with self._dropped_lock:
+            self.dropped += count
+
+    def _take_dropped(self) -> int:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def _write(self, batch: List[dict]):
+        dropped = self._take_dropped()
+        rows = list(batch)
+        if dropped:
+            # 丢弃情况作为一条日志写入，便于在日志页面中发现
+            rows.append({
+                "id": uuid.uuid4(),
+                "level": "WARNING",
+                "message": f"数据库日志队列已满或写入失败，丢弃了 {dropped} 条日志",
+                "module": "logging",
+                "timestamp": now_naive(),
+            })
+        try:
+            with Session(engine) as session:
+                session.execute(insert(Log), rows)
+                session.commit()
+        except Exception as e:
+            # 不能再通过 logging 报告（会重新进入本处理器）：放弃这一批并计入丢弃数，
+            # 由下一次写入成功时的告警记录报告，同时输出到 stderr
+            self._add_dropped(len(batch) + dropped)
+            sys.stderr.write(f"数据库日志写入失败，丢弃了 {len(batch)} 条日志: {e!r}\n")
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def close(self):
+        """停止后台线程，并写完队列中剩余的记录"""
+        if not self._stopping.is_set():
+            self._stopping.set()
+            self._writer.join(timeout=self.flush_interval + 10)
+        super().close()
 
 
 class WebSocketLogHandler(logging.Handler):
-    """向 WebSocket 连接广播的日志处理器"""
-    
-    def __init__(self):
-        super().__init__()
-        self.connections: List = []
-    
-    def add_connection(self, websocket):
-        """添加 WebSocket 连接"""
-        self.connections.append(websocket)
-    
-    def remove_connection(self, websocket):
-        """移除 WebSocket 连接"""
-        if websocket in self.connections:
-            self.connections.remove(websocket)
+    """把日志记录发布到实时日志分发中心（由其分发给各 WebSocket 连接）"""
     
     def emit(self, record: logging.LogRecord):
-        """向所有 WebSocket 连接发送日志记录"""
+        """
+        发布日志记录；没有连接需要该记录（按连接的过滤条件）时不做任何格式化与序列化。
+        本进程的日志标记为 BACKEND_PROCESS，与 PM2 日志一样可按进程名过滤。
+        """
         try:
-            from app.utils.timezone import now_naive
-            message = {
+            module = record.module if hasattr(record, 'module') else None
+            subscribers = log_hub.matching(record.levelname, module, BACKEND_PROCESS)
+            if not subscribers:
+                return
+            log_hub.publish({
                 "level": record.levelname,
                 "message": self.format(record),
-                "module": record.module if hasattr(record, 'module') else None,
-                "timestamp": now_naive().isoformat()
-            }
-            
-            disconnected = []
-            for conn in self.connections:
-                try:
-                    if hasattr(conn, '_message_queue'):
-                        conn._message_queue.append(message)
-                except Exception:
-                    disconnected.append(conn)
-            
-            for conn in disconnected:
-                self.remove_connection(conn)
+                "module": module,
+                "timestamp": now_naive().isoformat(),
+                "process": BACKEND_PROCESS,
+            }, subscribers)
         except Exception:
             pass
 
@@ -110,7 +182,12 @@ def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None):
         file_handler.setFormatter(formatter)
         root_logger.addHandler(file_handler)
     
-    db_handler = DatabaseLogHandler()
+    db_handler = DatabaseLogHandler(
+        queue_size=settings.LOG_DB_QUEUE_SIZE,
+        batch_size=settings.LOG_DB_BATCH_SIZE,
+        flush_interval_ms=settings.LOG_DB_FLUSH_INTERVAL_MS,
+        overflow=settings.LOG_DB_OVERFLOW,
+    )
     db_handler.setFormatter(formatter)
     root_logger.addHandler(db_handler)
     
@@ -0,0 +1,35 @@
+"""基于 (timestamp, id) 的游标分页（keyset pagination）"""
+import base64
+import uuid
+from datetime import datetime
+from typing import Tuple, Union
+
+from sqlalchemy import tuple_
+
+# 下一页游标通过响应头返回，保持列表响应体不变
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: Union[uuid.UUID, int]) -> str:
+    """把一页最后一行的 (timestamp, id) 编码为不透明的游标字符串"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Union[uuid.UUID, int]]:
+    """解析游标（id 为 UUID 或紧凑历史表的 bigint），格式不正确时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id) if row_id.isdigit() else uuid.UUID(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def apply_desc_cursor(statement, timestamp_column, id_column, cursor: str):
+    """
+    只取按 (timestamp, id) 降序排列时位于游标所指行之后的记录（调用方负责排序）。
+    配合 (timestamp, id) 上的索引，任意页的代价都与第一页相同。
+    """
+    timestamp, row_id = decode_cursor(cursor)
+    return statement.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
@@ -1,13 +1,19 @@
 """PM2日志监控器：读取PM2日志文件并推送到WebSocket和数据库"""
 import asyncio
 import os
+import uuid
 from pathlib import Path
-from typing import Dict, Optional
-from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, List, Optional
+from datetime import datetime
 import logging
-from app.utils.logging import websocket_log_handler
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.config import settings
+from app.utils.log_retention import cleanup_logs
+from app.utils.log_hub import log_hub
 from app.utils.timezone import now_naive
-from app.models.log import Log
+from app.models.config import Config
+from app.models.log import Log, LogTailOffset
 from app.database import engine
 from sqlmodel import Session, select
 
@@ -25,6 +31,11 @@ PM2_LOG_FILES = {
     "tracker": ["tracker.log", "tracker-error.log", "tracker-out.log"],
 }
 
+# 旧版本把已读取位置保存在 config 表中的该键下，首次加载时迁移到 log_tail_offsets
+LEGACY_OFFSETS_CONFIG_KEY = "pm2_log_offsets"
+# 每个文件每轮最多读取的字节数，避免一次突发把整批日志读入内存
+MAX_READ_BYTES = 1024 * 1024
+
 # 进程颜色映射（用于前端显示）
 PROCESS_COLORS = {
     "web-backend": "blue",      # 蓝色
@@ -33,14 +44,81 @@ PROCESS_COLORS = {
 }
 
 
+class TailedFile:
+    """
+    持续打开的日志文件：position 为已处理到的字节位置（只推进到最后一个完整行之后）。
+    通过 inode 变化识别轮转、通过文件变短识别截断。
+    """
+
+    def __init__(self, path: Path, source: str):
+        self.path = path
+        self.source = source
+        self.handle: Optional[BinaryIO] = None
+        self.inode: Optional[int] = None
+        self.position = 0
+        # 上次读取读满了 MAX_READ_BYTES，说明还有积压
+        self.backlog = False
+
+    def open(self, inode: int, position: int):
+        self.close()
+        self.handle = open(self.path, "rb")
+        self.inode = inode
+        self.position = position
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+        self.handle = None
+
+    def read_lines(self) -> List[str]:
+        """读取自上次位置以来的完整行，处理轮转与截断；文件不存在时返回空列表"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        lines: List[str] = []
+        self.backlog = False
+        if self.handle is None:
+            self.open(stat.st_ino, self.position if stat.st_ino == self.inode else 0)
+        elif stat.st_ino != self.inode:
+            # 已轮转：先读完旧文件剩余的内容，再从头读新文件
+            lines += self._read_available()
+            while self.backlog:
+                lines += self._read_available()
+            self.open(stat.st_ino, 0)
+        elif stat.st_size < self.position:
+            # 被截断（如 pm2 flush）：从头开始
+            self.position = 0
+        if stat.st_size > self.position:
+            lines += self._read_available()
+        return lines
+
+    def _read_available(self) -> List[str]:
+        self.handle.seek(self.position)
+        data = self.handle.read(MAX_READ_BYTES)
+        self.backlog = len(data) == MAX_READ_BYTES
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            if not self.backlog:
+                # 最后一行尚未写完，下次再读
+                return []
+            # 单行超过 MAX_READ_BYTES：整块作为一行
+            end = len(data)
+        self.position += end
+        return data[:end].decode("utf-8", errors="ignore").splitlines()
+
+
 class PM2LogMonitor:
     """PM2日志文件监控器"""
     
     def __init__(self):
-        self.file_positions: Dict[str, int] = {}
+        self.files: Dict[str, TailedFile] = {}
         self.running = False
         self.monitor_task: Optional[asyncio.Task] = None
         self.cleanup_task: Optional[asyncio.Task] = None
+        # 停止时唤醒两个后台任务中的等待，使其尽快自行退出
+        self.stop_event: Optional[asyncio.Event] = None
         self.last_cleanup_time: Optional[datetime] = None
     
     def parse_pm2_log_line(self, line: str, source: str) -> Optional[dict]:
@@ -118,146 +196,180 @@ class PM2LogMonitor:
             "process": service_name,  # 添加进程名称用于前端颜色区分
         }
     
-    async def read_new_lines(self, file_path: Path, source: str):
-        """读取文件的新行"""
-        if not file_path.exists():
+    def collect_new_entries(self) -> List[dict]:
+        """从所有日志文件读取新增的完整行并解析（阻塞的文件读取，由监控循环放到线程中执行）"""
+        entries = []
+        for tailed in self.files.values():
+            try:
+                lines = tailed.read_lines()
+            except Exception as e:
+                logger.debug(f"Failed to read PM2 log file {tailed.path}: {e}")
+                tailed.close()
+                continue
+            for line in lines:
+                log_entry = self.parse_pm2_log_line(line, tailed.source)
+                if log_entry:
+                    entries.append(log_entry)
+        return entries
+
+    def broadcast(self, entries: List[dict]):
+        """发布到实时日志分发中心（由其按各连接的过滤条件筛选）"""
+        if not log_hub.subscribers:
             return
-        
-        file_key = str(file_path)
-        current_position = self.file_positions.get(file_key, 0)
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                # 移动到上次读取的位置
-                f.seek(current_position)
-                
-                # 读取新行
-                new_lines = f.readlines()
-                
-                # 更新位置
-                self.file_positions[file_key] = f.tell()
-                
-                # 处理新行
-                for line in new_lines:
-                    log_entry = self.parse_pm2_log_line(line, source)
-                    if log_entry:
-                        # 推送到WebSocket
-                        try:
-                            message = {
-                                "level": log_entry["level"],
-                                "message": log_entry["message"],
-                                "module": log_entry["module"],
-                                "timestamp": log_entry["timestamp"],
-                                "process": log_entry.get("process", "unknown"),  # 添加进程名称
-                            }
-                            
-                            # 添加到所有WebSocket连接的消息队列
-                            disconnected = []
-                            for conn in websocket_log_handler.connections:
-                                try:
-                                    if hasattr(conn, '_message_queue'):
-                                        conn._message_queue.append(message)
-                                except Exception:
-                                    disconnected.append(conn)
-                            
-                            # 移除断开的连接
-                            for conn in disconnected:
-                                websocket_log_handler.remove_connection(conn)
-                        except Exception as e:
-                            logger.debug(f"Failed to send PM2 log to WebSocket: {e}")
-                        
-                        # 写入数据库（用于历史日志查询）
-                        try:
-                            self.save_to_database(log_entry)
-                        except Exception as e:
-                            logger.debug(f"Failed to save PM2 log to database: {e}")
-        except Exception as e:
-            logger.debug(f"Failed to read PM2 log file {file_path}: {e}")
-    
-    def save_to_database(self, log_entry: dict):
-        """将PM2日志保存到数据库"""
+        for log_entry in entries:
+            process = log_entry.get("process", "unknown")
+            subscribers = log_hub.matching(log_entry["level"], log_entry["module"], process)
+            if not subscribers:
+                continue
+            log_hub.publish({
+                "level": log_entry["level"],
+                "message": log_entry["message"],
+                "module": log_entry["module"],
+                "timestamp": log_entry["timestamp"],
+                "process": process,  # 添加进程名称
+            }, subscribers)
+
+    @staticmethod
+    def _entry_timestamp(log_entry: dict) -> datetime:
+        timestamp_str = log_entry.get("timestamp")
+        if isinstance(timestamp_str, str):
+            try:
+                return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        return now_naive()
+
+    def offsets(self) -> Dict[str, dict]:
+        return {
+            key: {"inode": tailed.inode, "position": tailed.position}
+            for key, tailed in self.files.items()
+            if tailed.inode is not None
+        }
+
+    def save_batch(self, entries: List[dict], offsets: Dict[str, dict]):
+        """用一条多行 INSERT 写入一批日志，并在同一事务中保存各文件的读取位置"""
+        with Session(engine) as session:
+            if entries:
+                session.execute(insert(Log), [
+                    {
+                        "id": uuid.uuid4(),
+                        "level": log_entry["level"],
+                        "message": log_entry["message"],
+                        "module": log_entry["module"],
+                        "timestamp": self._entry_timestamp(log_entry),
+                    }
+                    for log_entry in entries
+                ])
+            self._upsert_offsets(session, offsets)
+            session.commit()
+
+    @staticmethod
+    def _upsert_offsets(session: Session, offsets: Dict[str, dict]):
+        if not offsets:
+            return
+        dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+        table = LogTailOffset.__table__
+        updated_at = now_naive()
+        statement = dialect.insert(table).values([
+            {"file_key": key, "inode": offset["inode"], "position": offset["position"], "updated_at": updated_at}
+            for key, offset in offsets.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.file_key],
+            set_={column: statement.excluded[column] for column in ("inode", "position", "updated_at")},
+        )
+        session.execute(statement)
+
+    def load_offsets(self) -> Dict[str, dict]:
+        """读取各文件的已读取位置；仍保存在 config 表中的旧数据迁移到 log_tail_offsets 后删除"""
         try:
-            timestamp_str = log_entry.get("timestamp")
-            if isinstance(timestamp_str, str):
-                try:
-                    # 处理ISO格式时间戳
-                    if 'T' in timestamp_str:
-                        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    else:
-                        timestamp = datetime.fromisoformat(timestamp_str)
-                except:
-                    timestamp = now_naive()
-            else:
-                timestamp = now_naive()
-            
-            log_db = Log(
-                level=log_entry["level"],
-                message=log_entry["message"],
-                module=log_entry["module"],
-                timestamp=timestamp
-            )
-            
             with Session(engine) as session:
-                session.add(log_db)
-                session.commit()
+                offsets = {
+                    row.file_key: {"inode": row.inode, "position": row.position}
+                    for row in session.exec(select(LogTailOffset)).all()
+                }
+                legacy = session.exec(select(Config).where(Config.key == LEGACY_OFFSETS_CONFIG_KEY)).first()
+                if legacy is not None:
+                    offsets = {**dict(legacy.value or {}), **offsets}
+                    self._upsert_offsets(session, offsets)
+                    session.execute(delete(Config).where(Config.key == LEGACY_OFFSETS_CONFIG_KEY))
+                    session.commit()
+                return offsets
         except Exception as e:
-            logger.debug(f"Failed to save PM2 log to database: {e}")
+            logger.debug(f"Failed to load PM2 log offsets: {e}")
+            return {}
     
-    def cleanup_old_logs(self, session: Session):
-        """清理超过30天的旧日志（批量清理，避免频繁操作）"""
+    def cleanup_old_logs(self):
+        """清理超过保留天数的旧日志（分批 DELETE，可选先按天归档）"""
         try:
             # 每小时清理一次
-            now = datetime.utcnow()
+            now = now_naive()
             if self.last_cleanup_time and (now - self.last_cleanup_time).total_seconds() < 3600:
                 return
-            
-            cutoff = now - timedelta(days=30)
-            stmt = select(Log).where(Log.timestamp < cutoff)
-            old_logs = list(session.exec(stmt).all())
-            if old_logs:
-                for log_entry in old_logs:
-                    session.delete(log_entry)
-                session.commit()
-                self.last_cleanup_time = now
-                logger.info(f"Cleaned up {len(old_logs)} old log entries (older than 30 days)")
+            self.last_cleanup_time = now
+            archive_dir = Path(settings.LOG_ARCHIVE_DIR) if settings.LOG_ARCHIVE_DIR else None
+            cleanup_logs(now, settings.LOG_RETENTION_DAYS, archive_dir)
         except Exception as e:
             logger.debug(f"Failed to cleanup old logs: {e}")
     
+    async def _sleep(self, seconds: float):
+        """等待 seconds 秒，停止时提前返回"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
     async def cleanup_loop(self):
         """定期清理旧日志的后台任务"""
         while self.running:
             try:
-                await asyncio.sleep(3600)  # 每小时执行一次
+                await self._sleep(3600)  # 每小时执行一次
                 if self.running:
                     try:
-                        with Session(engine) as session:
-                            self.cleanup_old_logs(session)
+                        await asyncio.to_thread(self.cleanup_old_logs)
                     except Exception as e:
                         logger.error(f"Error in cleanup loop: {e}")
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in cleanup loop: {e}")
-                await asyncio.sleep(3600)
+                await self._sleep(3600)
     
     async def monitor_loop(self):
         """监控循环"""
         logger.info("PM2 log monitor started")
         
+        saved_offsets = self.offsets()
+        # 已读取但尚未写入数据库的一批日志及其对应的读取位置；写入成功前不再读取新内容
+        pending_entries: List[dict] = []
+        pending_offsets: Optional[Dict[str, dict]] = None
         while self.running:
             try:
-                # 遍历所有要监控的日志文件
-                for service_name, log_files in PM2_LOG_FILES.items():
-                    for log_file in log_files:
-                        file_path = PM2_LOG_DIR / log_file
-                        source = f"{service_name}.{log_file.replace('.log', '')}"
-                        await self.read_new_lines(file_path, source)
-                
-                # 等待1秒后再次检查
-                await asyncio.sleep(1)
+                # 每秒只对各文件 stat 一次，有新内容时才读取（在线程中执行，不阻塞事件循环）；整批日志一个事务写入
+                if pending_offsets is None:
+                    entries = await asyncio.to_thread(self.collect_new_entries)
+                    offsets = self.offsets()
+                    if entries:
+                        self.broadcast(entries)
+                    if entries or offsets != saved_offsets:
+                        pending_entries, pending_offsets = entries, offsets
+                if pending_offsets is not None:
+                    try:
+                        await asyncio.to_thread(self.save_batch, pending_entries, pending_offsets)
+                    except Exception as e:
+                        # 数据库暂时不可用：保留这一批，稍后原样重试，既不丢失也不重复读取
+                        logger.warning(f"Failed to save PM2 logs to database, will retry: {e}")
+                        await self._sleep(5)
+                        continue
+                    saved_offsets = pending_offsets
+                    pending_entries, pending_offsets = [], None
+
+                # 读满一块说明还有积压，立即继续；否则等待1秒后再次检查
+                if not any(tailed.backlog for tailed in self.files.values()):
+                    await self._sleep(1)
             except Exception as e:
                 logger.error(f"Error in PM2 log monitor loop: {e}")
-                await asyncio.sleep(5)
+                await self._sleep(5)
     
     def start(self):
         """启动监控器"""
@@ -276,22 +388,34 @@ class PM2LogMonitor:
                 return
         
         self.running = True
+        self.stop_event = asyncio.Event()
         
-        # 初始化文件位置（从文件末尾开始读取，只读取新日志）
+        # 初始化文件位置：优先从上次保存的位置继续（同一 inode 且未被截断），
+        # 没有保存过位置的文件从末尾开始读取（只读取新日志）
+        saved = self.load_offsets()
         for service_name, log_files in PM2_LOG_FILES.items():
             for log_file in log_files:
                 file_path = PM2_LOG_DIR / log_file
                 file_key = str(file_path)
-                if file_path.exists():
-                    try:
-                        # 从文件末尾开始读取（只读取新日志）
-                        self.file_positions[file_key] = file_path.stat().st_size
-                    except Exception:
-                        self.file_positions[file_key] = 0
-                else:
-                    # 文件不存在时，位置设为0，等待文件创建
-                    self.file_positions[file_key] = 0
+                tailed = self.files[file_key] = TailedFile(file_path, f"{service_name}.{log_file.replace('.log', '')}")
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    # 文件不存在时，等待文件创建后从头读取
                     logger.debug(f"PM2 log file does not exist yet: {file_path}, will monitor for creation")
+                    continue
+                offset = saved.get(file_key)
+                if offset is None:
+                    position = stat.st_size
+                elif offset.get("inode") == stat.st_ino and offset.get("position", 0) <= stat.st_size:
+                    position = offset["position"]
+                else:
+                    # 停机期间已轮转或截断：新文件从头读取
+                    position = 0
+                try:
+                    tailed.open(stat.st_ino, position)
+                except OSError as e:
+                    logger.debug(f"Failed to open PM2 log file {file_path}: {e}")
         
         # 启动监控任务（在当前的asyncio事件循环中）
         try:
@@ -307,16 +431,21 @@ class PM2LogMonitor:
         
         logger.info("PM2 log monitor started successfully")
     
-    def stop(self):
-        """停止监控器"""
+    async def stop(self):
+        """
+        停止监控器：唤醒并等待两个后台任务退出，再关闭日志文件。
+        不取消任务——取消只会中断等待，asyncio.to_thread 中正在进行的读取 / 写入仍会继续，
+        此时关闭文件会与之竞争；等任务自行退出即保证线程中的调用已经完成。
+        """
         if not self.running:
             return
         
         self.running = False
-        if self.monitor_task:
-            self.monitor_task.cancel()
-        if self.cleanup_task:
-            self.cleanup_task.cancel()
+        self.stop_event.set()
+        tasks = [task for task in (self.monitor_task, self.cleanup_task) if task]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for tailed in self.files.values():
+            tailed.close()
         logger.info("PM2 log monitor stopped")
 
 
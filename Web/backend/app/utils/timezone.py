@@ -1,5 +1,6 @@
 """时间相关的辅助函数"""
 from datetime import datetime, timezone
+from typing import overload
 from zoneinfo import ZoneInfo
 
 # 上海时区
@@ -16,6 +17,10 @@ def now_naive() -> datetime:
     return datetime.now(SHANGHAI_TZ).replace(tzinfo=None)
 
 
+@overload
+def to_shanghai_naive(dt: datetime) -> datetime: ...
+@overload
+def to_shanghai_naive(dt: None) -> None: ...
 def to_shanghai_naive(dt: datetime | None) -> datetime | None:
     """
     将给定时间转换为上海时区的 naive 时间。
@@ -29,3 +34,10 @@ def to_shanghai_naive(dt: datetime | None) -> datetime | None:
         return dt
     # 如果是 tz-aware 时间，转换为上海时间
     return dt.astimezone(SHANGHAI_TZ).replace(tzinfo=None)
+
+
+def to_epoch_seconds(dt: datetime) -> int:
+    """将时间转换为 Unix 时间戳（秒）；naive 时间视为上海时间"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=SHANGHAI_TZ)
+    return int(dt.timestamp())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+对比 electricity_history 两种表结构的写入吞吐与磁盘占用（仅 PostgreSQL）
+
+- uuid：当前默认结构（UUID 主键、FLOAT 余额、B-tree 时间索引）
+- compact：HISTORY_COMPACT_SCHEMA 对应的结构（bigint 自增主键、整数分、BRIN 时间索引）
+
+在临时表上写入相同的合成数据，不影响业务表；结束后删除临时表（--keep 保留）。
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.database import engine
+from app.utils.history_partitions import is_postgres
+
+SCHEMAS = {
+    "uuid": [
+        """
+        CREATE TABLE {table} (
+            id UUID PRIMARY KEY,
+            subscription_id UUID NOT NULL,
+            surplus FLOAT NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX {table}_ts ON {table} (timestamp)",
+        "CREATE UNIQUE INDEX {table}_sub_ts ON {table} (subscription_id, timestamp)",
+    ],
+    "compact": [
+        """
+        CREATE TABLE {table} (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            subscription_id UUID NOT NULL,
+            surplus INTEGER NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE UNIQUE INDEX {table}_sub_ts ON {table} (subscription_id, timestamp)",
+        "CREATE INDEX {table}_ts_brin ON {table} USING brin (timestamp)",
+    ],
+}
+
+INSERT_SQL = {
+    "uuid": "INSERT INTO {table} (id, subscription_id, surplus, timestamp) VALUES (:id, :subscription_id, :surplus, :timestamp)",
+    "compact": "INSERT INTO {table} (subscription_id, surplus, timestamp) VALUES (:subscription_id, :surplus, :timestamp)",
+}
+
+
+def generate_batches(rows: int, batch_size: int, subscriptions: int):
+    """按时间顺序生成读数：每轮每个订阅一条，与采集器的写入模式一致"""
+    sub_ids = [uuid.uuid4() for _ in range(subscriptions)]
+    surplus = {sub_id: random.uniform(20, 200) for sub_id in sub_ids}
+    timestamp = datetime(2024, 1, 1)
+    batch = []
+    produced = 0
+    while produced < rows:
+        timestamp += timedelta(hours=1)
+        for sub_id in sub_ids:
+            if produced >= rows:
+                break
+            surplus[sub_id] = max(surplus[sub_id] - random.uniform(0, 0.8), 0.0)
+            batch.append((sub_id, round(surplus[sub_id], 2), timestamp))
+            produced += 1
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def run(schema: str, args) -> dict:
+    table = f"bench_history_{schema}"
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        for ddl in SCHEMAS[schema]:
+            conn.execute(text(ddl.format(table=table)))
+
+    random.seed(args.seed)
+    insert = text(INSERT_SQL[schema].format(table=table))
+    started = time.perf_counter()
+    for batch in generate_batches(args.rows, args.batch_size, args.subscriptions):
+        if schema == "uuid":
+            params = [
+                {"id": uuid.uuid4(), "subscription_id": sub_id, "surplus": value, "timestamp": ts}
+                for sub_id, value, ts in batch
+            ]
+        else:
+            params = [
+                {"subscription_id": sub_id, "surplus": int(round(value * 100)), "timestamp": ts}
+                for sub_id, value, ts in batch
+            ]
+        with engine.begin() as conn:
+            conn.execute(insert, params)
+    elapsed = time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {table}"))
+        total_size, index_size = conn.execute(text(
+            "SELECT pg_total_relation_size(:table), pg_indexes_size(:table)"
+        ), {"table": table}).one()
+        if not args.keep:
+            conn.execute(text(f"DROP TABLE {table}"))
+
+    return {"elapsed": elapsed, "rate": args.rows / elapsed if elapsed else 0.0,
+            "total": total_size, "indexes": index_size}
+
+
+def _mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比历史表 uuid / compact 两种结构的写入吞吐与磁盘占用")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="每种结构写入的行数（默认 1000000）")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每个事务写入的行数（默认 5000）")
+    parser.add_argument("--subscriptions", type=int, default=500, help="模拟的订阅数量（默认 500）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，保证两种结构写入相同数据")
+    parser.add_argument("--keep", action="store_true", help="保留临时表以便进一步分析")
+    args = parser.parse_args()
+
+    if not is_postgres(engine):
+        print("❌ 基准测试仅支持 PostgreSQL")
+        sys.exit(1)
+
+    results = {}
+    try:
+        for schema in SCHEMAS:
+            print(f"正在测试 {schema} 结构（{args.rows} 行）...")
+            results[schema] = run(schema, args)
+    except Exception as e:
+        print(f"❌ 基准测试失败: {e}")
+        sys.exit(1)
+
+    print(f"\n{'结构':<10}{'用时':>10}{'行/秒':>12}{'总大小':>14}{'索引大小':>14}")
+    for schema, result in results.items():
+        print(
+            f"{schema:<10}{result['elapsed']:>9.1f}s{result['rate']:>12.0f}"
+            f"{_mb(result['total']):>14}{_mb(result['indexes']):>14}"
+        )
+    base, compact = results["uuid"], results["compact"]
+    if base["total"]:
+        print(f"\n✓ compact 总大小为 uuid 的 {compact['total'] / base['total']:.0%}，"
+              f"写入吞吐为 {compact['rate'] / base['rate']:.2f} 倍")
+
+
+if __name__ == "__main__":
+    main()
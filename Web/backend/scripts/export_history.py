@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+流式导出电费历史为 CSV / NDJSON
+
+示例：
+    python scripts/export_history.py --format csv -o history.csv
+    python scripts/export_history.py --format ndjson --subscription <ID> --start 2025-09-01
+"""
+import argparse
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlmodel import Session, select
+from app.database import engine
+from app.models.subscription import Subscription
+from app.services.history import HistoryService
+from app.utils.export import iter_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出电费历史")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv", help="导出格式（默认 csv）")
+    parser.add_argument("--subscription", action="append", type=uuid.UUID, help="只导出指定订阅（可重复），默认全部")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="起始时间（上海时间，ISO 格式）")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="结束时间（上海时间，ISO 格式）")
+    parser.add_argument("-o", "--output", help="输出文件，默认写到标准输出")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        with Session(engine) as session:
+            ids = args.subscription or list(session.exec(select(Subscription.id)).all())
+            rows = HistoryService(session).iter_export_rows(ids, args.start, args.end)
+            for chunk in iter_export(rows, args.format):
+                output.write(chunk)
+    except Exception as e:
+        print(f"❌ 导出失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.output:
+        print(f"✓ 已导出到 {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
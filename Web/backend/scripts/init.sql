@@ -29,6 +29,7 @@ CREATE TABLE IF NOT EXISTS subscriptions (
     building_code VARCHAR(50) NOT NULL,
     floor_code VARCHAR(50) NOT NULL,
     room_code VARCHAR(50) NOT NULL,
+    resolved_location JSONB,
     threshold FLOAT DEFAULT 20.0,
     email_recipients JSONB DEFAULT '[]'::jsonb,
     is_active BOOLEAN DEFAULT TRUE,
@@ -40,17 +41,68 @@ CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_room_name ON subscriptions(room_name);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_is_active ON subscriptions(is_active);
 
--- 创建历史数据表
+-- 创建历史数据表（HISTORY_COMPACT_SCHEMA=true 时的紧凑结构见 scripts/migrate_history_to_compact.py）
 CREATE TABLE IF NOT EXISTS electricity_history (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     subscription_id UUID NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
     surplus FLOAT NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP,
+    samples INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE INDEX IF NOT EXISTS idx_history_subscription_id ON electricity_history(subscription_id);
 CREATE INDEX IF NOT EXISTS idx_history_timestamp ON electricity_history(timestamp);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_history_subscription_timestamp ON electricity_history(subscription_id, timestamp);
+
+-- 创建订阅当前状态表（由写入路径在同一事务中维护）
+CREATE TABLE IF NOT EXISTS subscription_states (
+    subscription_id UUID PRIMARY KEY REFERENCES subscriptions(id) ON DELETE CASCADE,
+    surplus FLOAT NOT NULL,
+    last_reading_at TIMESTAMP NOT NULL,
+    last_query_at TIMESTAMP NOT NULL,
+    burn_rate FLOAT,
+    days_left FLOAT,
+    sample_count INTEGER NOT NULL DEFAULT 0,
+    surplus_sum FLOAT NOT NULL DEFAULT 0,
+    min_surplus FLOAT,
+    max_surplus FLOAT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 创建历史汇总表（按小时 / 按天，由写入路径增量维护）
+CREATE TABLE IF NOT EXISTS electricity_history_hourly (
+    subscription_id UUID NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    consumption FLOAT NOT NULL DEFAULT 0,
+    recharge FLOAT NOT NULL DEFAULT 0,
+    min_surplus FLOAT NOT NULL,
+    max_surplus FLOAT NOT NULL,
+    sum_surplus FLOAT NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    first_surplus FLOAT NOT NULL,
+    first_timestamp TIMESTAMP NOT NULL,
+    last_surplus FLOAT NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (subscription_id, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS electricity_history_daily (
+    subscription_id UUID NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
+    bucket_start TIMESTAMP NOT NULL,
+    consumption FLOAT NOT NULL DEFAULT 0,
+    recharge FLOAT NOT NULL DEFAULT 0,
+    min_surplus FLOAT NOT NULL,
+    max_surplus FLOAT NOT NULL,
+    sum_surplus FLOAT NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    first_surplus FLOAT NOT NULL,
+    first_timestamp TIMESTAMP NOT NULL,
+    last_surplus FLOAT NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (subscription_id, bucket_start)
+);
 
 -- 创建配置表
 CREATE TABLE IF NOT EXISTS config (
@@ -76,6 +128,15 @@ CREATE TABLE IF NOT EXISTS logs (
 CREATE INDEX IF NOT EXISTS idx_logs_level ON logs(level);
 CREATE INDEX IF NOT EXISTS idx_logs_module ON logs(module);
 CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON logs(timestamp, id);
+
+-- PM2 日志文件的已读取位置
+CREATE TABLE IF NOT EXISTS log_tail_offsets (
+    file_key VARCHAR(500) PRIMARY KEY,
+    inode BIGINT NOT NULL,
+    position BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- 显示创建的表
 \dt
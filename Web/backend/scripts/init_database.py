@@ -9,6 +9,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.database import init_db, engine
+from app.config import settings
 from app.models import User, Subscription, ElectricityHistory, Config, Log
 from sqlmodel import SQLModel
 import logging
@@ -23,16 +24,22 @@ def main():
         logger.info("开始初始化数据库...")
         logger.info(f"数据库连接: {engine.url}")
         
-        # Create all tables
-        SQLModel.metadata.create_all(engine)
+        # Create all tables (electricity_history is partitioned when HISTORY_PARTITIONING is on)
+        init_db()
         
         logger.info("✓ 数据库表创建成功！")
         logger.info("已创建的表:")
         logger.info("  - users (用户表)")
         logger.info("  - subscriptions (订阅表)")
-        logger.info("  - electricity_history (历史数据表)")
+        logger.info("  - subscription_states (订阅当前状态表)")
+        if settings.HISTORY_PARTITIONING:
+            logger.info("  - electricity_history (历史数据表，按月分区)")
+        else:
+            logger.info("  - electricity_history (历史数据表)")
+        logger.info("  - electricity_history_hourly / electricity_history_daily (历史汇总表)")
         logger.info("  - config (配置表)")
         logger.info("  - logs (日志表)")
+        logger.info("  - log_tail_offsets (PM2 日志读取位置表)")
         logger.info("")
         logger.info("数据库初始化完成！")
         
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""为 electricity_history 添加游程字段（last_seen / samples），供 HISTORY_RUN_LENGTH 使用"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import engine
+from sqlmodel import text, Session
+
+# 两个字段都不需要重写已有数据：last_seen 为空表示与 timestamp 相同，samples 默认 1
+COLUMNS = [
+    ("last_seen", "TIMESTAMP"),
+    ("samples", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+
+def main():
+    """添加游程字段"""
+    try:
+        with Session(engine) as session:
+            added = []
+            for name, ddl in COLUMNS:
+                found = session.exec(text("""
+                    SELECT COUNT(*) FROM information_schema.columns
+                    WHERE table_name = 'electricity_history' AND column_name = :name
+                """).bindparams(name=name)).scalar() > 0
+                if not found:
+                    session.exec(text(f"ALTER TABLE electricity_history ADD COLUMN {name} {ddl}"))
+                    added.append(name)
+
+            if not added:
+                print("✓ 游程字段已存在，无需迁移")
+                return
+
+            session.commit()
+            print(f"✓ 成功添加字段: {', '.join(added)}")
+
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
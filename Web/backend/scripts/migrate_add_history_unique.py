@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+为 electricity_history 添加 (subscription_id, timestamp) 唯一索引
+
+写入路径使用 INSERT ... ON CONFLICT DO NOTHING，多个写入方（Web 服务、独立 Tracker、手动查询）
+并发写入同一读数时只保留一条。添加前先删除已有的重复记录（每组保留一条），
+唯一索引同时取代原来的 (subscription_id, timestamp, id) 分页索引。
+分区表按模型重建索引，并删除早期版本分区表上名称不同的索引。
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.database import engine
+from app.utils.history_partitions import HISTORY_TABLE, PARTITIONED_INDEX_DDL, is_history_partitioned, is_postgres
+
+UNIQUE_INDEX = "uq_history_subscription_timestamp"
+# 被唯一索引取代的分页索引，以及早期版本分区表上与模型不同名的索引
+LEGACY_INDEXES = [
+    "idx_history_subscription_ts_id",
+    "idx_history_part_subscription_ts",
+    "uq_history_part_subscription_ts",
+    "idx_history_part_timestamp",
+]
+
+
+def index_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT COUNT(*) FROM pg_indexes WHERE indexname = :name"), {"name": name}).scalar() > 0
+
+
+def main():
+    """删除重复记录并添加唯一索引"""
+    if not is_postgres(engine):
+        print("✓ 非 PostgreSQL 数据库，启动服务时会按模型创建唯一索引")
+        return
+
+    try:
+        with engine.begin() as conn:
+            if index_exists(conn, UNIQUE_INDEX):
+                print("✓ 唯一索引已存在，无需迁移")
+                return
+
+            print("正在删除重复的历史记录...")
+            deleted = conn.execute(text(f"""
+                DELETE FROM {HISTORY_TABLE} AS a
+                USING {HISTORY_TABLE} AS b
+                WHERE a.subscription_id = b.subscription_id
+                  AND a.timestamp = b.timestamp
+                  AND a.id > b.id
+            """)).rowcount or 0
+
+            print(f"正在创建唯一索引 {UNIQUE_INDEX}...")
+            if is_history_partitioned(conn):
+                for ddl in PARTITIONED_INDEX_DDL:
+                    conn.execute(text(ddl))
+            else:
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON {HISTORY_TABLE} (subscription_id, timestamp)"
+                ))
+            for name in LEGACY_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        print(f"✓ 已删除 {deleted} 条重复记录并添加唯一索引")
+        if deleted:
+            print("  删除了重复记录，请运行 manage.sh db rebuild-rollups 重建汇总表与订阅状态")
+
+    except Exception as e:
+        print(f"❌ 迁移失败（已回滚）: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""为游标分页添加 (timestamp, id) 复合索引（历史表由 (subscription_id, timestamp) 唯一索引覆盖，见 migrate_add_history_unique.py）"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import engine
+from sqlmodel import text, Session
+
+INDEXES = [
+    ("idx_logs_timestamp_id", "CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON logs (timestamp, id)"),
+]
+
+
+def main():
+    """添加游标分页所需的索引"""
+    try:
+        with Session(engine) as session:
+            for name, ddl in INDEXES:
+                print(f"正在创建索引 {name}...")
+                session.exec(text(ddl))
+            session.commit()
+            print("✓ 游标分页索引已就绪")
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""添加 resolved_location 字段到 subscriptions 表"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import engine
+from sqlmodel import text, Session
+
+def main():
+    """添加 resolved_location 字段"""
+    try:
+        with Session(engine) as session:
+            # 检查字段是否已存在
+            result = session.exec(text("""
+                SELECT COUNT(*) FROM information_schema.columns 
+                WHERE table_name = 'subscriptions' AND column_name = 'resolved_location'
+            """))
+            exists = result.scalar() > 0
+            
+            if exists:
+                print("✓ resolved_location 字段已存在，无需迁移")
+                return
+            
+            print("正在添加 resolved_location 字段...")
+            session.exec(text("ALTER TABLE subscriptions ADD COLUMN resolved_location JSONB"))
+            session.commit()
+            
+            print("✓ 成功添加 resolved_location 字段")
+            print("\n提示: 现有订阅的定位为空，Tracker 下一轮查询成功后会自动写入")
+            
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
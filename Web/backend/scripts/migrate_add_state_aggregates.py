@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""为 subscription_states 添加累计聚合字段，并根据历史记录回填"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import engine
+from app.models.history import COMPACT_HISTORY
+from sqlmodel import text, Session
+
+COLUMNS = [
+    ("sample_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("surplus_sum", "FLOAT NOT NULL DEFAULT 0"),
+    ("min_surplus", "FLOAT"),
+    ("max_surplus", "FLOAT"),
+]
+
+
+def main():
+    """添加累计聚合字段"""
+    try:
+        with Session(engine) as session:
+            exists = session.exec(text("""
+                SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'subscription_states'
+            """)).scalar() > 0
+            if not exists:
+                print("✓ subscription_states 表不存在，启动服务或运行 db rebuild-rollups 时会自动创建")
+                return
+
+            added = []
+            for name, ddl in COLUMNS:
+                found = session.exec(text("""
+                    SELECT COUNT(*) FROM information_schema.columns
+                    WHERE table_name = 'subscription_states' AND column_name = :name
+                """).bindparams(name=name)).scalar() > 0
+                if not found:
+                    session.exec(text(f"ALTER TABLE subscription_states ADD COLUMN {name} {ddl}"))
+                    added.append(name)
+
+            if not added:
+                print("✓ 累计聚合字段已存在，无需迁移")
+                return
+
+            print(f"已添加字段: {', '.join(added)}，正在根据历史记录回填...")
+            # 紧凑历史表中余额以分存储
+            surplus = "surplus / 100.0" if COMPACT_HISTORY else "surplus"
+            session.exec(text(f"""
+                UPDATE subscription_states AS s
+                SET sample_count = h.cnt, surplus_sum = h.total, min_surplus = h.min_v, max_surplus = h.max_v
+                FROM (
+                    SELECT subscription_id, COUNT(*) AS cnt, SUM({surplus}) AS total,
+                           MIN({surplus}) AS min_v, MAX({surplus}) AS max_v
+                    FROM electricity_history
+                    GROUP BY subscription_id
+                ) AS h
+                WHERE s.subscription_id = h.subscription_id
+            """))
+            session.commit()
+            print("✓ 成功添加并回填累计聚合字段")
+
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+将 electricity_history 迁移为紧凑表结构（仅 PostgreSQL）
+
+紧凑结构：bigint 自增主键（按插入顺序追加，索引不再随机分裂）、余额以整数分存储、
+(subscription_id, timestamp) 唯一索引 + timestamp 上的 BRIN 索引。
+
+步骤（单个事务内完成，失败自动回滚）：
+1. 原表重命名为 electricity_history_uuid
+2. 创建紧凑表与索引
+3. 按时间顺序复制全部数据（余额四舍五入到分）并校验行数，默认删除旧表（--keep-legacy 保留）
+
+运行前需先执行 db migrate（旧表需包含 last_seen / samples 字段）。
+迁移后在 .env 中设置 HISTORY_COMPACT_SCHEMA=true。已启用分区时请先迁回普通表，
+或在本脚本之后再运行 migrate_history_to_partitioned.py。
+"""
+import argparse
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.database import engine
+from app.utils.history_partitions import HISTORY_TABLE, is_history_partitioned, is_postgres
+
+LEGACY_TABLE = f"{HISTORY_TABLE}_uuid"
+
+COMPACT_TABLE_DDL = f"""
+CREATE TABLE {HISTORY_TABLE} (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    subscription_id UUID NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
+    surplus INTEGER NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP,
+    samples INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+COMPACT_INDEX_DDL = [
+    f"CREATE UNIQUE INDEX uq_history_subscription_timestamp ON {HISTORY_TABLE} (subscription_id, timestamp)",
+    f"CREATE INDEX idx_history_timestamp_brin ON {HISTORY_TABLE} USING brin (timestamp)",
+]
+
+
+def is_compact(conn) -> bool:
+    data_type = conn.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = 'id'"
+    ), {"table": HISTORY_TABLE}).scalar()
+    return data_type == "bigint"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 electricity_history 迁移为紧凑表结构")
+    parser.add_argument("--keep-legacy", action="store_true", help=f"迁移后保留旧表 {LEGACY_TABLE}")
+    args = parser.parse_args()
+
+    if not is_postgres(engine):
+        print("❌ 紧凑表迁移仅支持 PostgreSQL")
+        sys.exit(1)
+
+    try:
+        with engine.begin() as conn:
+            if is_compact(conn):
+                print(f"✓ {HISTORY_TABLE} 已是紧凑结构，无需迁移")
+                return
+            if is_history_partitioned(conn):
+                print(f"❌ {HISTORY_TABLE} 为分区表，请先迁回普通表再执行本脚本")
+                sys.exit(1)
+
+            print(f"正在将 {HISTORY_TABLE} 重命名为 {LEGACY_TABLE}...")
+            conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {LEGACY_TABLE}"))
+            # 主键与同名索引在 schema 内唯一，需让出给新表
+            conn.execute(text(f"ALTER INDEX IF EXISTS {HISTORY_TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey"))
+            conn.execute(text("DROP INDEX IF EXISTS uq_history_subscription_timestamp"))
+            conn.execute(text("DROP INDEX IF EXISTS idx_history_subscription_ts_id"))
+
+            print("正在创建紧凑表...")
+            conn.execute(text(COMPACT_TABLE_DDL))
+
+            print("正在复制历史数据...")
+            conn.execute(text(
+                f"""
+                INSERT INTO {HISTORY_TABLE} (subscription_id, surplus, timestamp, last_seen, samples, created_at)
+                SELECT subscription_id, ROUND(surplus * 100)::INTEGER,
+                       COALESCE(timestamp, created_at, CURRENT_TIMESTAMP),
+                       last_seen, samples,
+                       COALESCE(created_at, CURRENT_TIMESTAMP)
+                FROM {LEGACY_TABLE}
+                ORDER BY COALESCE(timestamp, created_at)
+                """
+            ))
+            # 数据就位后再建索引，比边插入边维护索引快得多
+            for ddl in COMPACT_INDEX_DDL:
+                conn.execute(text(ddl))
+
+            old_count = conn.execute(text(f"SELECT COUNT(*) FROM {LEGACY_TABLE}")).scalar()
+            new_count = conn.execute(text(f"SELECT COUNT(*) FROM {HISTORY_TABLE}")).scalar()
+            if old_count != new_count:
+                raise RuntimeError(f"行数校验失败：旧表 {old_count} 条，新表 {new_count} 条")
+            print(f"✓ 已复制 {new_count} 条记录")
+
+            if not args.keep_legacy:
+                conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+                print(f"✓ 已删除旧表 {LEGACY_TABLE}")
+
+        print("\n迁移完成！请在 .env 中设置 HISTORY_COMPACT_SCHEMA=true 并重启服务")
+
+    except Exception as e:
+        print(f"❌ 迁移失败（已回滚）: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+将 electricity_history 迁移为按月分区表（仅 PostgreSQL）
+
+步骤（单个事务内完成，失败自动回滚）：
+1. 原表重命名为 electricity_history_legacy
+2. 创建分区父表、索引与 default 分区
+3. 按原数据的时间范围创建月分区，并补齐未来两个月
+4. 复制全部数据并校验行数，默认删除旧表（--keep-legacy 保留）
+
+运行前需先执行 db migrate（旧表需包含 last_seen / samples 字段）。迁移后在 .env 中设置 HISTORY_PARTITIONING=true。
+如需同时使用紧凑表结构，请先运行 migrate_history_to_compact.py 并设置 HISTORY_COMPACT_SCHEMA=true，再执行本脚本。
+"""
+import argparse
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.database import engine
+from app.models.history import COMPACT_HISTORY
+from app.utils.history_partitions import (
+    HISTORY_INDEXES,
+    HISTORY_TABLE,
+    create_partitioned_history_table,
+    ensure_month_partitions,
+    ensure_upcoming_partitions,
+    is_history_partitioned,
+    is_postgres,
+)
+from app.utils.timezone import now_naive
+
+LEGACY_TABLE = f"{HISTORY_TABLE}_legacy"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 electricity_history 迁移为按月分区表")
+    parser.add_argument("--keep-legacy", action="store_true", help=f"迁移后保留旧表 {LEGACY_TABLE}")
+    args = parser.parse_args()
+
+    if not is_postgres(engine):
+        print("❌ 分区表仅支持 PostgreSQL")
+        sys.exit(1)
+
+    try:
+        with engine.begin() as conn:
+            if is_history_partitioned(conn):
+                print(f"✓ {HISTORY_TABLE} 已是分区表，无需迁移")
+                return
+
+            print(f"正在将 {HISTORY_TABLE} 重命名为 {LEGACY_TABLE}...")
+            conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {LEGACY_TABLE}"))
+            # 主键与模型索引的名称在 schema 内唯一，需让出给新表
+            conn.execute(text(f"ALTER INDEX IF EXISTS {HISTORY_TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey"))
+            for index in HISTORY_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+            print("正在创建分区表...")
+            create_partitioned_history_table(conn)
+
+            bounds = conn.execute(text(
+                f"SELECT MIN(COALESCE(timestamp, created_at)), MAX(COALESCE(timestamp, created_at)) FROM {LEGACY_TABLE}"
+            )).first()
+            created = []
+            if bounds and bounds[0] is not None:
+                created += ensure_month_partitions(conn, bounds[0].date(), bounds[1].date())
+            created += ensure_upcoming_partitions(conn, now_naive().date())
+            print(f"✓ 已创建 {len(created)} 个月分区")
+
+            print("正在复制历史数据...")
+            conn.execute(text(
+                f"""
+                INSERT INTO {HISTORY_TABLE} (id, subscription_id, surplus, timestamp, last_seen, samples, created_at)
+                SELECT id, subscription_id, surplus,
+                       COALESCE(timestamp, created_at, CURRENT_TIMESTAMP),
+                       last_seen, samples,
+                       COALESCE(created_at, CURRENT_TIMESTAMP)
+                FROM {LEGACY_TABLE}
+                """
+            ))
+            if COMPACT_HISTORY:
+                # 复制了原有的 bigint id，需把新表序列推进到最大值之后
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{HISTORY_TABLE}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {HISTORY_TABLE}), 0) + 1, false)"
+                ))
+            old_count = conn.execute(text(f"SELECT COUNT(*) FROM {LEGACY_TABLE}")).scalar()
+            new_count = conn.execute(text(f"SELECT COUNT(*) FROM {HISTORY_TABLE}")).scalar()
+            if old_count != new_count:
+                raise RuntimeError(f"行数校验失败：旧表 {old_count} 条，新表 {new_count} 条")
+            print(f"✓ 已复制 {new_count} 条记录")
+
+            if not args.keep_legacy:
+                conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+                print(f"✓ 已删除旧表 {LEGACY_TABLE}")
+
+        print("\n迁移完成！请在 .env 中设置 HISTORY_PARTITIONING=true 并重启服务")
+
+    except Exception as e:
+        print(f"❌ 迁移失败（已回滚）: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
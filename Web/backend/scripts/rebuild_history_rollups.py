@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+根据 electricity_history 重建小时 / 天汇总表与订阅当前状态（subscription_states）
+
+首次启用或手工修正历史数据后运行；日常由写入路径增量维护，无需重复执行。
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlmodel import SQLModel, Session
+from app.database import engine
+from app.models.rollup import HistoryRollupDaily, HistoryRollupHourly
+from app.models.subscription_state import SubscriptionState
+from app.services.history import HistoryService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建电费历史的小时 / 天汇总表与订阅当前状态")
+    parser.add_argument("--subscription", action="append", type=uuid.UUID, help="只重建指定订阅（可重复）")
+    args = parser.parse_args()
+
+    try:
+        SQLModel.metadata.create_all(
+            engine, tables=[HistoryRollupHourly.__table__, HistoryRollupDaily.__table__, SubscriptionState.__table__]
+        )
+        started = time.perf_counter()
+        with Session(engine) as session:
+            total = HistoryService(session).rebuild_aggregates(args.subscription)
+        print(f"✓ 已根据 {total} 条历史记录重建汇总表与订阅状态，用时 {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ 重建失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""测试公共夹具：内存 SQLite 数据库、订阅与 SQL 语句计数"""
+from typing import Optional
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+import app.models.history  # noqa: F401  注册全部表
+import app.models.log  # noqa: F401
+import app.models.rollup  # noqa: F401
+import app.models.subscription  # noqa: F401
+import app.models.subscription_state  # noqa: F401
+import app.models.user  # noqa: F401
+import app.models.user_subscription  # noqa: F401
+from app.models.subscription import Subscription
+from app.models.user_subscription import UserSubscription
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def make_subscription(session):
+    """返回工厂：make_subscription(owner) 创建并提交一个订阅，返回其 id；指定 owner 时同时建立所有者映射"""
+
+    def make(owner: Optional[uuid.UUID] = None) -> uuid.UUID:
+        subscription_id = uuid.uuid4()
+        session.add(Subscription(
+            id=subscription_id,
+            user_id=owner or uuid.uuid4(),
+            room_name=str(subscription_id),
+            area_id="0",
+            building_code="b",
+            floor_code="1",
+            room_code="101",
+        ))
+        if owner:
+            session.add(UserSubscription(user_id=owner, subscription_id=subscription_id, is_owner=True))
+        session.commit()
+        return subscription_id
+
+    return make
+
+
+class StatementCounter:
+    """记录执行的 SQL 语句（通过 before_cursor_execute 钩子）"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements(engine):
+    """返回一个上下文管理器工厂：with count_statements() as counter: ..."""
+    from contextlib import contextmanager
+
+    @contextmanager
+    def counting():
+        counter = StatementCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+
+    return counting
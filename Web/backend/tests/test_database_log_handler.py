@@ -0,0 +1,50 @@
+"""数据库日志处理器：写入失败的一批计入丢弃数，并在下一次写入时报告"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import select
+
+from app.models.log import Log
+from app.utils import logging as logging_module
+from app.utils.logging import DatabaseLogHandler
+from app.utils.timezone import now_naive
+
+
+def _entries(*messages) -> list:
+    return [
+        {"id": uuid.uuid4(), "level": "INFO", "message": message, "module": "test", "timestamp": now_naive()}
+        for message in messages
+    ]
+
+
+@pytest.fixture
+def handler():
+    handler = DatabaseLogHandler()
+    yield handler
+    handler.close()
+
+
+def test_failed_batch_is_counted_and_reported(handler, engine, session, monkeypatch, capsys):
+    # 没有 logs 表的数据库：插入失败
+    monkeypatch.setattr(logging_module, "engine", create_engine("sqlite://"))
+    handler._write(_entries("a", "b", "c"))
+
+    assert handler.dropped == 3
+    assert "丢弃了 3 条日志" in capsys.readouterr().err
+
+    monkeypatch.setattr(logging_module, "engine", engine)
+    handler._write(_entries("d"))
+
+    rows = session.exec(select(Log).order_by(Log.level)).all()
+    assert [(row.level, row.message) for row in rows] == [("INFO", "d"), ("WARNING", "数据库日志队列已满或写入失败，丢弃了 3 条日志")]
+    assert handler.dropped == 0
+
+
+def test_dropped_count_survives_repeated_failures(handler, monkeypatch, capsys):
+    monkeypatch.setattr(logging_module, "engine", create_engine("sqlite://"))
+    handler._add_dropped(2)
+    handler._write(_entries("a"))
+    handler._write(_entries("b", "c"))
+
+    assert handler.dropped == 5
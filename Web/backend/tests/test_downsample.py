@@ -0,0 +1,37 @@
+"""降采样工具：桶宽解析与 LTTB 抽稀"""
+import pytest
+
+from app.utils.downsample import lttb, lttb_indices, parse_bucket
+
+
+@pytest.mark.parametrize("value, seconds", [("30s", 30), ("15m", 900), (" 1H ", 3600), ("7d", 604800)])
+def test_parse_bucket(value, seconds):
+    assert parse_bucket(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["", "15", "m", "1w", "1.5h", "-1h", "0m"])
+def test_parse_bucket_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_bucket(value)
+
+
+def test_lttb_keeps_all_points_under_the_threshold():
+    points = [(float(i), float(i)) for i in range(5)]
+    assert lttb_indices(points, 5) == [0, 1, 2, 3, 4]
+    assert lttb_indices(points, 100) == [0, 1, 2, 3, 4]
+    assert lttb_indices(points, 0) == []
+    assert lttb_indices(points, 2) == [0, 4]
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    points = [(float(i), 10.0) for i in range(100)]
+    points[37] = (37.0, 80.0)
+    points[71] = (71.0, -50.0)
+
+    indices = lttb_indices(points, 10)
+
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert indices == sorted(set(indices))
+    assert {37, 71} <= set(indices)
+    assert lttb(points, 10) == [points[i] for i in indices]
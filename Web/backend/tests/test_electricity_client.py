@@ -0,0 +1,129 @@
+"""上游查询客户端：同步 / 异步实现共用查询步骤，楼层房间列表缓存"""
+import asyncio
+
+import pytest
+
+from app.core import electricity
+from app.core.electricity import AsyncECampusElectricity, ECampusElectricity
+
+
+class FakeUpstream:
+    """按 uri 返回固定响应并记录请求；rooms 为楼层 F2 的房间名列表"""
+
+    def __init__(self, rooms):
+        self.rooms = rooms
+        self.requests = []
+
+    def __call__(self, uri, params):
+        self.requests.append(uri)
+        if uri == "queryArea":
+            return {"success": True, "rows": [{"id": "A0"}]}
+        if uri == "queryBuilding":
+            return {"success": True, "rows": [{"buildingCode": "B0"}]}
+        if uri == "queryFloor":
+            return {"success": True, "rows": [{"floorCode": "F1"}, {"floorCode": "F2"}]}
+        if uri == "queryRoom":
+            return {"success": True, "rows": [{"roomCode": f"R{name}", "displayRoomName": name} for name in self.rooms]}
+        if uri == "queryRoomSurplus":
+            return {"success": True, "data": {"amount": 12.5, "displayRoomName": params["roomCode"]}}
+        return {"success": False, "statusCode": 404, "message": uri}
+
+    def count(self, uri):
+        return self.requests.count(uri)
+
+
+class SyncClient(ECampusElectricity):
+    def __init__(self, upstream, config):
+        super().__init__(config)
+        self.upstream = upstream
+
+    def _request(self, uri, params):
+        return self.upstream(uri, params)
+
+
+class AsyncClient(AsyncECampusElectricity):
+    def __init__(self, upstream, config):
+        super().__init__(config)
+        self.upstream = upstream
+
+    async def _request(self, uri, params):
+        await asyncio.sleep(0)
+        return self.upstream(uri, params)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """楼层偏移缓存写到临时文件，结束后恢复模块级缓存"""
+    for name, value in (("_OFFSET_FILE", None), ("_OFFSET_CACHE", {}), ("_OFFSET_LOADED", False)):
+        monkeypatch.setattr(electricity, name, value)
+    return {"floor_offset_file": str(tmp_path / "floor_offset.json")}
+
+
+@pytest.fixture(params=["sync", "async"])
+def make_client(request, config):
+    """返回 (upstream, query)：query(room_name) 以同步或异步客户端执行完整定位查询"""
+
+    def make(rooms):
+        upstream = FakeUpstream(rooms)
+        if request.param == "sync":
+            client = SyncClient(upstream, config)
+            return upstream, client.query_room_surplus_by_room_name
+        client = AsyncClient(upstream, config)
+        return upstream, lambda room_name: asyncio.run(client.query_room_surplus_by_room_name(room_name))
+
+    return make
+
+
+def test_sync_and_async_clients_share_the_query_steps(config):
+    sync_upstream, async_upstream = FakeUpstream(["1东201", "1东202", "1东203"]), FakeUpstream(["1东201", "1东202", "1东203"])
+    sync_result = SyncClient(sync_upstream, config).query_room_surplus_by_room_name("1东 203")
+    async_result = asyncio.run(AsyncClient(async_upstream, config).query_room_surplus_by_room_name("1东 203"))
+
+    assert sync_result == async_result
+    assert sync_result["data"]["surplus"] == 12.5
+    assert sync_result["data"]["location"] == {"area_id": "A0", "building_code": "B0", "floor_code": "F2", "room_code": "R1东203"}
+    assert sync_upstream.requests == async_upstream.requests == ["queryArea", "queryBuilding", "queryFloor", "queryRoom", "queryRoomSurplus"]
+
+
+def test_resolved_location_skips_the_lookup_chain(config):
+    upstream = FakeUpstream([])
+    client = SyncClient(upstream, config)
+    location = {"area_id": "A0", "building_code": "B0", "floor_code": "F2", "room_code": "R1东203"}
+
+    result = client.query_room_surplus_resolved("1东 203", location)
+
+    assert result["data"]["location"] == location
+    assert upstream.requests == ["queryRoomSurplus"]
+
+
+def test_room_list_is_cached_per_floor(make_client):
+    upstream, query = make_client(["1东201", "1东202", "1东203"])
+    for _ in range(3):
+        assert query("1东 203")["data"]["location"]["room_code"] == "R1东203"
+    assert upstream.count("queryRoom") == 1
+
+
+def test_irregular_floor_does_not_refetch_room_list(make_client):
+    # 缺少 202：201 与 203 的偏移不同，按楼层缓存的偏移总有一个对不上
+    upstream, query = make_client(["1东201", "1东203", "1东204"])
+    for room in ("1东 203", "1东 201", "1东 203", "1东 201"):
+        assert query(room)["data"]["location"]["room_code"] == f"R{room.replace(' ', '')}"
+    assert upstream.count("queryRoom") == 1
+
+
+def test_missing_room_is_negatively_cached(make_client):
+    upstream, query = make_client(["1东201", "1东202"])
+    for _ in range(3):
+        assert query("1东 205")["error"] == 1
+    assert upstream.count("queryRoom") == 1
+
+
+def test_room_missing_from_cached_list_refetches_once(make_client):
+    upstream, query = make_client(["1东201", "1东202", "1东203"])
+    assert query("1东 203")["data"]["location"]["room_code"] == "R1东203"
+
+    # 楼层新增了房间：缓存的列表中没有 204，重新拉取一次后命中
+    upstream.rooms = ["1东201", "1东202", "1东203", "1东204"]
+    for _ in range(2):
+        assert query("1东 204")["data"]["location"]["room_code"] == "R1东204"
+    assert upstream.count("queryRoom") == 2
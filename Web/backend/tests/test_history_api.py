@@ -0,0 +1,115 @@
+"""历史接口：ETag 条件请求、默认时间窗口与降采样序列"""
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import history as history_api
+from app.database import get_session
+from app.dependencies import get_current_user
+from app.models.user import User
+from app.services import history as history_module
+from app.services.history import HistoryReading, HistoryService
+
+NOW = datetime(2026, 1, 10, 12, 1)
+
+
+@pytest.fixture
+def user(session) -> User:
+    user = User(id=uuid.uuid4(), username="owner", email="owner@example.com", hashed_password="x")
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def client(session, user, monkeypatch):
+    monkeypatch.setattr(history_api, "now_naive", lambda: NOW)
+    app = FastAPI()
+    app.include_router(history_api.router, prefix="/api/history")
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+@pytest.fixture
+def subscription_id(session, user, make_subscription) -> uuid.UUID:
+    subscription_id = make_subscription(user.id)
+    HistoryService(session).ingest([HistoryReading(subscription_id, 50.0, NOW - timedelta(hours=3))])
+    return subscription_id
+
+
+def test_unchanged_history_returns_not_modified(client, session, subscription_id):
+    url = f"/api/history/stats/{subscription_id}"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    HistoryService(session).ingest([HistoryReading(subscription_id, 48.0, NOW - timedelta(hours=1))])
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["latest_surplus"] == 48.0
+
+
+def test_default_series_window_is_part_of_the_etag(client, subscription_id, monkeypatch):
+    url = f"/api/history/subscriptions/{subscription_id}/series"
+    first = client.get(url)
+    body = first.json()
+    assert datetime.fromisoformat(body["end"]) == datetime(2026, 1, 10, 12, 5)
+    assert datetime.fromisoformat(body["start"]) == datetime(2025, 12, 11, 12, 5)
+
+    # 同一步长内窗口不变，可以复用缓存
+    monkeypatch.setattr(history_api, "now_naive", lambda: NOW + timedelta(minutes=3))
+    assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # 窗口随时间移动后必须返回新的窗口
+    monkeypatch.setattr(history_api, "now_naive", lambda: NOW + timedelta(minutes=5))
+    moved = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert moved.status_code == 200
+    assert datetime.fromisoformat(moved.json()["end"]) == datetime(2026, 1, 10, 12, 10)
+
+
+def test_bucket_series_window_is_aligned_to_the_bucket(client, subscription_id):
+    body = client.get(f"/api/history/subscriptions/{subscription_id}/series", params={"bucket": "1h"}).json()
+    assert datetime.fromisoformat(body["end"]) == datetime(2026, 1, 10, 13)
+    assert [point["surplus"] for point in body["points"]] == [50.0]
+
+
+@pytest.mark.parametrize("params", [{"bucket": "1w"}, {"bucket": "1m", "start": "2025-01-01T00:00:00"}])
+def test_invalid_or_too_many_buckets_are_rejected(client, subscription_id, params):
+    response = client.get(f"/api/history/subscriptions/{subscription_id}/series", params=params)
+    assert response.status_code == 400
+
+
+def test_raw_series_is_downsampled_to_max_points(client, session, subscription_id):
+    HistoryService(session).ingest([
+        HistoryReading(subscription_id, 40.0 - i * 0.1, NOW - timedelta(hours=2) + timedelta(minutes=i))
+        for i in range(60)
+    ])
+    body = client.get(f"/api/history/subscriptions/{subscription_id}/series", params={"max_points": 10}).json()
+
+    assert body["mode"] == "lttb"
+    assert len(body["points"]) == 10
+    assert body["points"][0]["surplus"] == 50.0
+    assert body["points"][-1]["surplus"] == pytest.approx(34.1)
+
+
+def test_expanded_run_end_has_no_record_id(client, session, subscription_id, monkeypatch):
+    monkeypatch.setattr(history_module, "RUN_LENGTH_HISTORY", True)
+    HistoryService(session).ingest([HistoryReading(subscription_id, 50.0, NOW - timedelta(hours=2))])
+
+    rows = client.get(f"/api/history/subscriptions/{subscription_id}").json()
+
+    assert [(row["timestamp"], row["run_end"]) for row in rows] == [
+        ((NOW - timedelta(hours=2)).isoformat(), True),
+        ((NOW - timedelta(hours=3)).isoformat(), False),
+    ]
+    assert rows[0]["id"] is None and rows[1]["id"] is not None
+    assert rows[0]["samples"] == rows[1]["samples"] == 2
@@ -0,0 +1,147 @@
+"""历史写入：重放与重叠批次的幂等性（普通存储与游程存储两种模式）"""
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+from sqlmodel import select
+
+from app.models.history import ElectricityHistory
+from app.models.rollup import HistoryRollupHourly
+from app.models.subscription_state import SubscriptionState
+from app.services import history as history_module
+from app.services.history import HistoryReading, HistoryService
+
+START = datetime(2026, 1, 1)
+SURPLUSES = [50.0, 50.0, 50.0, 50.0, 49.0, 49.0, 49.0]
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "run_length"])
+def run_length(request, monkeypatch):
+    monkeypatch.setattr(history_module, "RUN_LENGTH_HISTORY", request.param)
+    return request.param
+
+
+def _readings(subscription_id: uuid.UUID, indexes) -> list:
+    return [HistoryReading(subscription_id, SURPLUSES[i], START + timedelta(hours=i)) for i in indexes]
+
+
+def _snapshot(session, subscription_id: uuid.UUID):
+    """历史记录、订阅状态统计与小时汇总，用于比较两次写入的结果"""
+    session.expire_all()
+    rows = session.exec(
+        select(ElectricityHistory.timestamp, ElectricityHistory.surplus, ElectricityHistory.last_seen, ElectricityHistory.samples)
+        .where(ElectricityHistory.subscription_id == subscription_id)
+        .order_by(ElectricityHistory.timestamp)
+    ).all()
+    state = session.get(SubscriptionState, subscription_id)
+    rollups = session.exec(
+        select(HistoryRollupHourly.bucket_start, HistoryRollupHourly.samples, HistoryRollupHourly.consumption)
+        .where(HistoryRollupHourly.subscription_id == subscription_id)
+        .order_by(HistoryRollupHourly.bucket_start)
+    ).all()
+    return (
+        [tuple(row) for row in rows],
+        (state.sample_count, state.surplus_sum, state.last_reading_at, state.last_query_at),
+        [tuple(row) for row in rollups],
+    )
+
+
+def _expected(session, make_subscription, indexes):
+    """把全部读数按顺序一次写入另一个订阅得到的结果"""
+    subscription_id = make_subscription()
+    HistoryService(session).ingest(_readings(subscription_id, indexes))
+    return _snapshot(session, subscription_id)
+
+
+def test_replayed_batch_is_a_no_op(session, make_subscription, run_length):
+    subscription_id = make_subscription()
+    service = HistoryService(session)
+    batch = _readings(subscription_id, range(len(SURPLUSES)))
+
+    assert service.ingest(batch)
+    first = _snapshot(session, subscription_id)
+    assert service.ingest(batch) == []
+    assert _snapshot(session, subscription_id) == first
+
+    history, _, _ = first
+    assert sum(samples for *_, samples in history) == (len(SURPLUSES) if run_length else len(history))
+
+
+def test_overlapping_batches_count_each_reading_once(session, make_subscription, run_length):
+    subscription_id = make_subscription()
+    service = HistoryService(session)
+
+    service.ingest(_readings(subscription_id, range(0, 4)))
+    service.ingest(_readings(subscription_id, range(2, 7)))
+
+    assert _snapshot(session, subscription_id) == _expected(session, make_subscription, range(7))
+
+
+def test_writer_with_stale_state_retries_on_fresh_state(session, make_subscription, run_length, monkeypatch):
+    subscription_id = make_subscription()
+    service = HistoryService(session)
+    service.ingest(_readings(subscription_id, [0]))
+
+    # 模拟并发：第二个写入方在第一个提交前读取了状态
+    stale = service.load_states([subscription_id])
+    service.ingest(_readings(subscription_id, [1, 2]))
+
+    load_states = service.load_states
+    calls = []
+
+    def load_stale_first(subscription_ids, for_update=False):
+        calls.append(for_update)
+        return stale if len(calls) == 1 else load_states(subscription_ids, for_update)
+
+    monkeypatch.setattr(service, "load_states", load_stale_first)
+    service.ingest(_readings(subscription_id, [2, 3]))
+
+    assert len(calls) == 2
+    assert _snapshot(session, subscription_id) == _expected(session, make_subscription, range(4))
+
+
+def test_run_extension_lost_twice_is_not_committed(session, make_subscription, monkeypatch):
+    monkeypatch.setattr(history_module, "RUN_LENGTH_HISTORY", True)
+    subscription_id = make_subscription()
+    service = HistoryService(session)
+    service.ingest(_readings(subscription_id, [0]))
+    before = _snapshot(session, subscription_id)
+
+    # 两次尝试时游程都已被另一写入方延长（或已被裁剪）
+    monkeypatch.setattr(service, "extend_runs", lambda runs: 0)
+
+    assert service.ingest(_readings(subscription_id, [1, 2])) == []
+    assert _snapshot(session, subscription_id) == before
+
+
+def _hourly_samples(session, subscription_id: uuid.UUID) -> list:
+    session.expire_all()
+    return [
+        (row.bucket_start.hour, row.samples)
+        for row in session.exec(
+            select(HistoryRollupHourly)
+            .where(HistoryRollupHourly.subscription_id == subscription_id)
+            .order_by(HistoryRollupHourly.bucket_start)
+        ).all()
+    ]
+
+
+def test_run_length_readings_are_counted_in_buckets(session, make_subscription, monkeypatch):
+    monkeypatch.setattr(history_module, "RUN_LENGTH_HISTORY", True)
+    subscription_id = make_subscription()
+    service = HistoryService(session)
+    service.ingest(_readings(subscription_id, range(len(SURPLUSES))))
+
+    # 汇总表：游程中的每次读数都落在各自的小时桶，空闲时段没有缺口
+    assert _hourly_samples(session, subscription_id) == [(hour, 1) for hour in range(len(SURPLUSES))]
+
+    # 原始记录分桶：游程按 samples 加权，末尾的读数计入 last_seen 所在的桶
+    buckets = service.bucket_series(subscription_id, None, None, 1800)
+    assert [(b.bucket_start.hour, b.last_surplus, b.samples) for b in buckets] == [
+        (0, 50.0, 1), (3, 50.0, 3), (4, 49.0, 1), (6, 49.0, 2),
+    ]
+    assert sum(b.samples for b in buckets) == len(SURPLUSES)
+
+    # 重建汇总表：游程中间的读数时间已不可知，计入 last_seen 所在的桶，总数不变
+    service.rebuild_aggregates([subscription_id])
+    assert _hourly_samples(session, subscription_id) == [(0, 1), (3, 3), (4, 1), (6, 2)]
@@ -0,0 +1,56 @@
+"""汇总统计：读取订阅状态中的统计聚合，与按原始记录聚合的结果一致，裁剪后同步刷新"""
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+
+from app.models.subscription_state import SubscriptionState
+from app.services.history import HistoryReading, HistoryService
+
+START = datetime(2026, 1, 1)
+SURPLUSES = [50.0, 47.5, 45.0, 80.0, 77.0, 71.5]
+
+
+@pytest.fixture
+def subscription_id(session, make_subscription) -> uuid.UUID:
+    subscription_id = make_subscription()
+    HistoryService(session).ingest([
+        HistoryReading(subscription_id, surplus, START + timedelta(hours=i)) for i, surplus in enumerate(SURPLUSES)
+    ])
+    return subscription_id
+
+
+def _assert_matches_aggregate(session, subscription_id: uuid.UUID, stats):
+    """删除状态行后按原始记录聚合，结果应与状态中的统计一致"""
+    session.delete(session.get(SubscriptionState, subscription_id))
+    session.commit()
+    aggregate = HistoryService(session).get_stats(subscription_id)
+    assert aggregate._replace(avg_surplus=pytest.approx(stats.avg_surplus)) == stats
+
+
+def test_stats_are_read_from_the_state_row(session, subscription_id, count_statements):
+    with count_statements() as counter:
+        stats = HistoryService(session).get_stats(subscription_id)
+
+    assert counter.count == 1
+    assert stats.total_records == len(SURPLUSES)
+    assert (stats.min_surplus, stats.max_surplus) == (45.0, 80.0)
+    assert stats.avg_surplus == pytest.approx(sum(SURPLUSES) / len(SURPLUSES))
+    assert (stats.latest_surplus, stats.latest_timestamp) == (71.5, START + timedelta(hours=5))
+    _assert_matches_aggregate(session, subscription_id, stats)
+
+
+def test_stats_follow_trimmed_history(session, subscription_id):
+    assert HistoryService(session).trim_history(3) == 3
+
+    session.expire_all()
+    stats = HistoryService(session).get_stats(subscription_id)
+
+    assert stats.total_records == 3
+    assert (stats.min_surplus, stats.max_surplus) == (71.5, 80.0)
+    assert stats.avg_surplus == pytest.approx(sum(SURPLUSES[3:]) / 3)
+    _assert_matches_aggregate(session, subscription_id, stats)
+
+
+def test_stats_without_history(session):
+    assert HistoryService(session).get_stats(uuid.uuid4()) is None
@@ -0,0 +1,88 @@
+"""实时日志分发：有界队列丢弃最旧的消息、批量帧与按连接过滤"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.utils import log_hub as log_hub_module
+from app.utils.log_hub import LogHub, LogSubscriber
+
+
+def _messages(frame: str) -> list:
+    return [message["message"] for message in json.loads(frame)["messages"]]
+
+
+def test_full_queue_drops_the_oldest_and_reports_the_count():
+    async def main():
+        subscriber = LogSubscriber(maxsize=3)
+        for i in range(5):
+            subscriber.offer(json.dumps({"message": i}))
+        frame = json.loads(await subscriber.next_frame())
+        assert frame["dropped"] == 2
+        assert [message["message"] for message in frame["messages"]] == [2, 3, 4]
+
+        subscriber.offer(json.dumps({"message": 5}))
+        assert json.loads(await subscriber.next_frame())["dropped"] == 0
+
+    asyncio.run(main())
+
+
+def test_frames_are_capped_at_the_batch_size(monkeypatch):
+    monkeypatch.setattr(log_hub_module, "MAX_BATCH_SIZE", 2)
+
+    async def main():
+        subscriber = LogSubscriber()
+        for i in range(3):
+            subscriber.offer(json.dumps({"message": i}))
+        assert _messages(await subscriber.next_frame()) == [0, 1]
+        assert _messages(await subscriber.next_frame()) == [2]
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("level, module, process, expected", [
+    ("DEBUG", "app.api.history", "web-backend", False),
+    ("WARNING", "app.api.history", "web-backend", True),
+    ("ERROR", "tracker", "web-backend", False),
+    ("ERROR", "app.services", "tracker", False),
+    ("CUSTOM", "app.api", "web-backend", False),
+])
+def test_subscriber_filter(level, module, process, expected):
+    subscriber = LogSubscriber()
+    subscriber.set_filter(level="warning", module_prefix="app.", processes=["web-backend"])
+    assert subscriber.matches(level, module, process) is expected
+
+
+def test_publish_fans_out_to_matching_subscribers_from_other_threads():
+    hub = LogHub()
+
+    async def main():
+        errors, everything = hub.subscribe(), hub.subscribe()
+        errors.set_filter(level="ERROR")
+        publisher = threading.Thread(target=lambda: [
+            hub.publish({"level": "INFO", "message": "info"}),
+            hub.publish({"level": "ERROR", "message": "boom"}),
+        ])
+        publisher.start()
+        publisher.join()
+        assert _messages(await everything.next_frame()) == ["info", "boom"]
+        assert _messages(await errors.next_frame()) == ["boom"]
+
+        hub.unsubscribe(everything)
+        hub.publish({"level": "ERROR", "message": "later"})
+        assert everything.queue.empty()
+        assert _messages(await errors.next_frame()) == ["later"]
+
+    asyncio.run(main())
+
+
+def test_publish_without_matching_subscribers_does_not_serialize(monkeypatch):
+    hub = LogHub()
+
+    async def main():
+        hub.subscribe().set_filter(level="ERROR")
+        monkeypatch.setattr(log_hub_module.json, "dumps", lambda *args, **kwargs: pytest.fail("serialized"))
+        hub.publish({"level": "INFO", "message": "skipped"})
+
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""日志清理：分批删除与归档，删除失败后重试不会重复归档"""
+from datetime import datetime, timedelta
+import gzip
+import json
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.log import Log
+from app.utils import log_retention
+from app.utils.log_retention import PENDING_ARCHIVE_FILE, archive_path, purge_logs_before
+
+CUTOFF = datetime(2026, 1, 3)
+
+
+@pytest.fixture(autouse=True)
+def use_test_engine(engine, monkeypatch):
+    monkeypatch.setattr(log_retention, "engine", engine)
+
+
+@pytest.fixture
+def expired_ids(session) -> list:
+    """写入两天的过期日志与一条未过期日志，返回过期日志的 id"""
+    rows = [Log(level="INFO", message=f"m{i}", timestamp=datetime(2026, 1, 1) + timedelta(hours=10 * i)) for i in range(5)]
+    session.add_all([*rows, Log(level="INFO", message="kept", timestamp=CUTOFF + timedelta(hours=1))])
+    session.commit()
+    return sorted(str(row.id) for row in rows)
+
+
+def _archived_ids(archive_dir) -> list:
+    ids = []
+    for path in sorted(archive_dir.glob("logs-*.ndjson.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            ids += [json.loads(line)["id"] for line in f]
+    return ids
+
+
+def _remaining(session) -> list:
+    session.expire_all()
+    return [log.message for log in session.exec(select(Log)).all()]
+
+
+def test_purge_archives_and_deletes_in_batches(session, expired_ids, tmp_path):
+    deleted, archived, _, days = purge_logs_before(CUTOFF, tmp_path, batch_size=2)
+
+    assert deleted == archived == 5
+    assert days == {datetime(2026, 1, 1).date(), datetime(2026, 1, 2).date()}
+    assert sorted(_archived_ids(tmp_path)) == expired_ids
+    assert _remaining(session) == ["kept"]
+    assert not (tmp_path / PENDING_ARCHIVE_FILE).exists()
+
+
+def test_failed_delete_is_not_archived_twice(session, expired_ids, tmp_path, monkeypatch):
+    commit = Session.commit
+
+    def fail_once(self):
+        monkeypatch.setattr(Session, "commit", commit)
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(Session, "commit", fail_once)
+    with pytest.raises(RuntimeError):
+        purge_logs_before(CUTOFF, tmp_path, batch_size=2)
+    assert len(_archived_ids(tmp_path)) == 2
+    assert len(_remaining(session)) == 6
+
+    result = purge_logs_before(CUTOFF, tmp_path, batch_size=2)
+
+    # 删除失败的那一批已在归档中，这次只删除
+    assert (result.deleted, result.archived) == (5, 3)
+    assert sorted(_archived_ids(tmp_path)) == expired_ids
+    assert _remaining(session) == ["kept"]
+
+
+class FailingArchive:
+    """写入第一行并落盘后抛出异常，模拟磁盘写满"""
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.handle.close()
+
+    def writelines(self, lines):
+        self.handle.write(lines[0])
+        self.handle.flush()
+        raise OSError("disk full")
+
+
+def test_failed_archive_write_leaves_no_partial_member(session, expired_ids, tmp_path, monkeypatch):
+    path = archive_path(tmp_path, datetime(2026, 1, 1).date())
+    purge_logs_before(datetime(2026, 1, 1, 5), tmp_path)
+    size = path.stat().st_size
+
+    gzip_open = gzip.open
+    monkeypatch.setattr(log_retention.gzip, "open", lambda *args, **kwargs: FailingArchive(gzip_open(*args, **kwargs)))
+    with pytest.raises(OSError):
+        purge_logs_before(CUTOFF, tmp_path)
+    monkeypatch.setattr(log_retention.gzip, "open", gzip_open)
+
+    assert path.stat().st_size == size
+    assert len(_remaining(session)) == 5
+    purge_logs_before(CUTOFF, tmp_path)
+    assert sorted(_archived_ids(tmp_path)) == expired_ids
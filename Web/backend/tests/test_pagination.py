@@ -0,0 +1,86 @@
+"""游标分页：逐页遍历、相同时间戳的排序与无效游标"""
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import history as history_api, logs as logs_api
+from app.database import get_session
+from app.dependencies import get_current_user
+from app.models.history import ElectricityHistory
+from app.models.log import Log
+from app.models.user import User
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def user(session) -> User:
+    user = User(id=uuid.uuid4(), username="owner", email="owner@example.com", hashed_password="x", is_admin=True)
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def client(session, user):
+    app = FastAPI()
+    app.include_router(history_api.router, prefix="/api/history")
+    app.include_router(logs_api.router, prefix="/api/logs")
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def _pages(client, url: str, limit: int) -> list:
+    """沿 X-Next-Cursor 读取全部页，返回每页的 id 列表"""
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        pages.append([item["id"] for item in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+        params = {"limit": limit, "cursor": cursor}
+
+
+def test_log_pages_cover_identical_timestamps_once(client, session):
+    # 每 3 条共用一个时间戳，页边界落在同一时间戳内部
+    logs = [Log(level="INFO", message=str(i), timestamp=START + timedelta(seconds=i // 3)) for i in range(10)]
+    session.add_all(logs)
+    session.commit()
+
+    pages = _pages(client, "/api/logs", limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 2]
+    expected = sorted(logs, key=lambda log: (log.timestamp, log.id), reverse=True)
+    assert [item for page in pages for item in page] == [str(log.id) for log in expected]
+
+
+def test_history_pages_follow_the_cursor(client, session, user, make_subscription):
+    subscription_id = make_subscription(user.id)
+    rows = [ElectricityHistory(subscription_id=subscription_id, surplus=50.0 - i, timestamp=START + timedelta(hours=i)) for i in range(5)]
+    session.add_all(rows)
+    session.commit()
+    ids = [str(row.id) for row in reversed(rows)]
+
+    pages = _pages(client, f"/api/history/subscriptions/{subscription_id}", limit=2)
+
+    assert pages == [ids[0:2], ids[2:4], ids[4:5]]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(START, uuid.uuid4())[:-3], "fA"])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/api/logs", params={"cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_cursor_round_trip():
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(START, row_id)) == (START, row_id)
+    assert decode_cursor(encode_cursor(START, 42)) == (START, 42)
@@ -0,0 +1,131 @@
+"""PM2 日志跟踪：轮转、截断、未写完的行、读取位置的保存与停止"""
+import asyncio
+import os
+import threading
+
+import pytest
+from sqlmodel import select
+
+from app.models.config import Config
+from app.models.log import Log, LogTailOffset
+from app.utils import pm2_log_monitor as monitor_module
+from app.utils.pm2_log_monitor import LEGACY_OFFSETS_CONFIG_KEY, PM2LogMonitor, TailedFile
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "tracker.log"
+
+
+def _append(path, text: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _tail(path) -> TailedFile:
+    path.touch()
+    tailed = TailedFile(path, "tracker.tracker")
+    tailed.open(os.stat(path).st_ino, 0)
+    return tailed
+
+
+def test_partial_line_is_read_once_complete(log_path):
+    tailed = _tail(log_path)
+    _append(log_path, "first\nsec")
+    assert tailed.read_lines() == ["first"]
+    _append(log_path, "ond\n")
+    assert tailed.read_lines() == ["second"]
+    assert tailed.read_lines() == []
+
+
+def test_truncated_file_is_read_from_the_start(log_path):
+    tailed = _tail(log_path)
+    _append(log_path, "before flush, a longer line\n")
+    assert tailed.read_lines() == ["before flush, a longer line"]
+
+    log_path.write_text("after\n", encoding="utf-8")
+    assert tailed.read_lines() == ["after"]
+
+
+def test_rotated_file_is_drained_before_switching(log_path):
+    tailed = _tail(log_path)
+    _append(log_path, "one\n")
+    assert tailed.read_lines() == ["one"]
+
+    # 轮转前最后写入的行仍在旧文件中
+    _append(log_path, "two\n")
+    log_path.rename(log_path.with_suffix(".log.1"))
+    _append(log_path, "three\n")
+    assert tailed.read_lines() == ["two", "three"]
+    assert tailed.inode == os.stat(log_path).st_ino
+
+
+def test_oversized_line_is_split_at_the_read_limit(log_path, monkeypatch):
+    monkeypatch.setattr(monitor_module, "MAX_READ_BYTES", 8)
+    tailed = _tail(log_path)
+    _append(log_path, "0123456789\nok\n")
+
+    assert tailed.read_lines() == ["01234567"]
+    assert tailed.backlog
+    assert tailed.read_lines() == ["89", "ok"]
+    assert not tailed.backlog
+
+
+def test_offsets_are_saved_outside_the_config_table(engine, session, log_path, monkeypatch):
+    monkeypatch.setattr(monitor_module, "engine", engine)
+    monitor = PM2LogMonitor()
+    offsets = {str(log_path): {"inode": 42, "position": 10}}
+
+    monitor.save_batch([monitor.parse_pm2_log_line("[ERROR] boom", "tracker.tracker-error")], offsets)
+    offsets[str(log_path)]["position"] = 20
+    monitor.save_batch([], offsets)
+
+    assert [(log.level, log.message) for log in session.exec(select(Log)).all()] == [("ERROR", "boom")]
+    assert session.exec(select(Config)).all() == []
+    assert monitor.load_offsets() == offsets
+
+
+def test_legacy_offsets_move_out_of_the_config_table(engine, session, log_path, monkeypatch):
+    monkeypatch.setattr(monitor_module, "engine", engine)
+    legacy = {str(log_path): {"inode": 7, "position": 3}}
+    session.add(Config(key=LEGACY_OFFSETS_CONFIG_KEY, value=legacy))
+    session.commit()
+
+    assert PM2LogMonitor().load_offsets() == legacy
+
+    session.expire_all()
+    assert session.exec(select(Config)).all() == []
+    assert [(row.file_key, row.inode, row.position) for row in session.exec(select(LogTailOffset)).all()] == [(str(log_path), 7, 3)]
+
+
+def test_stop_waits_for_the_reader_thread_before_closing_files(engine, tmp_path, log_path, monkeypatch):
+    monkeypatch.setattr(monitor_module, "engine", engine)
+    monkeypatch.setattr(monitor_module, "PM2_LOG_DIR", tmp_path)
+    monkeypatch.setattr(monitor_module, "PM2_LOG_FILES", {"tracker": [log_path.name]})
+    log_path.touch()
+    monitor = PM2LogMonitor()
+    reading, release = threading.Event(), threading.Event()
+    open_during_read = []
+
+    def slow_collect():
+        reading.set()
+        release.wait(5)
+        open_during_read.append(all(tailed.handle for tailed in monitor.files.values()))
+        return []
+
+    monitor.collect_new_entries = slow_collect
+
+    async def main():
+        monitor.start()
+        await asyncio.to_thread(reading.wait, 5)
+        stopping = asyncio.create_task(monitor.stop())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+        release.set()
+        await asyncio.wait_for(stopping, 5)
+
+    asyncio.run(main())
+
+    assert open_during_read == [True]
+    assert all(tailed.handle is None for tailed in monitor.files.values())
+    assert monitor.monitor_task.done() and monitor.cleanup_task.done()
@@ -0,0 +1,132 @@
+"""订阅服务：列表查询的语句数量不随订阅数增长，上游定位与读数同一事务提交"""
+from datetime import datetime, timedelta
+import uuid
+
+from sqlmodel import select
+
+from app.models.history import ElectricityHistory
+from app.models.subscription import Subscription
+from app.models.subscription_state import SubscriptionState
+from app.models.user import User
+from app.models.user_subscription import UserSubscription
+from app.services.history import HistoryReading, HistoryService
+from app.services.subscription import SubscriptionService
+
+
+def _create_user(session, name: str, is_admin: bool = False) -> uuid.UUID:
+    user_id = uuid.uuid4()
+    session.add(User(id=user_id, username=name, email=f"{name}@example.com", hashed_password="x", is_admin=is_admin))
+    session.commit()
+    return user_id
+
+
+def _create_subscriptions(session, user_id: uuid.UUID, count: int, with_state: bool = True):
+    """创建订阅与映射；with_state=False 时只写历史记录，模拟升级后尚未回填的状态表"""
+    now = datetime(2026, 1, 1)
+    for i in range(count):
+        subscription_id = uuid.uuid4()
+        session.add(Subscription(
+            id=subscription_id,
+            user_id=user_id,
+            room_name=f"{user_id}-{i}",
+            area_id="0",
+            building_code="b",
+            floor_code="1",
+            room_code=str(i),
+            email_recipients=[f"{i}@example.com"],
+        ))
+        session.add(UserSubscription(user_id=user_id, subscription_id=subscription_id, is_owner=True))
+        if not with_state:
+            session.add(ElectricityHistory(subscription_id=subscription_id, surplus=40.0 + i, timestamp=now))
+            continue
+        session.add(SubscriptionState(
+            subscription_id=subscription_id,
+            surplus=50.0 + i,
+            last_reading_at=now,
+            last_query_at=now + timedelta(hours=1),
+            sample_count=1,
+            surplus_sum=50.0 + i,
+            min_surplus=50.0 + i,
+            max_surplus=50.0 + i,
+        ))
+    session.commit()
+
+
+def _list_and_touch(session, user_id: uuid.UUID, include_all: bool = False) -> int:
+    """列出订阅并访问接口用到的全部字段（惰性加载也会被计入），返回条数"""
+    session.expire_all()
+    rows = SubscriptionService(session).list_subscriptions_with_state(user_id, include_all=include_all)
+    for subscription, is_owner, state in rows:
+        subscription.model_dump()
+        len(subscription.email_recipients or [])
+        if state is not None:
+            state.model_dump()
+    return len(rows)
+
+
+def test_listing_statement_count_is_constant(session, count_statements):
+    single = _create_user(session, "single")
+    many = _create_user(session, "many")
+    _create_subscriptions(session, single, 1)
+    _create_subscriptions(session, many, 25)
+
+    with count_statements() as one:
+        assert _list_and_touch(session, single) == 1
+    with count_statements() as n:
+        assert _list_and_touch(session, many) == 25
+
+    assert one.count == n.count == 1
+
+
+def test_admin_listing_statement_count_is_constant(session, count_statements):
+    admin = _create_user(session, "admin", is_admin=True)
+    owner = _create_user(session, "owner")
+    _create_subscriptions(session, owner, 1)
+
+    with count_statements() as one:
+        assert _list_and_touch(session, admin, include_all=True) == 1
+    _create_subscriptions(session, owner, 24)
+    with count_statements() as n:
+        assert _list_and_touch(session, admin, include_all=True) == 25
+
+    assert one.count == n.count == 1
+
+
+def test_listing_falls_back_to_latest_history_without_state(session, count_statements):
+    single = _create_user(session, "single")
+    many = _create_user(session, "many")
+    _create_subscriptions(session, single, 1, with_state=False)
+    _create_subscriptions(session, many, 25, with_state=False)
+
+    with count_statements() as one:
+        assert _list_and_touch(session, single) == 1
+    with count_statements() as n:
+        assert _list_and_touch(session, many) == 25
+    assert one.count == n.count == 1
+
+    # 更早的记录不影响临时状态（取每个订阅最新的一条）
+    for subscription, _, _ in SubscriptionService(session).list_subscriptions_with_state(many):
+        session.add(ElectricityHistory(subscription_id=subscription.id, surplus=99.0, timestamp=datetime(2025, 12, 31)))
+    session.commit()
+    rows = SubscriptionService(session).list_subscriptions_with_state(many)
+    surpluses = sorted(state.surplus for _, _, state in rows if state is not None)
+    assert surpluses == [40.0 + i for i in range(25)]
+    assert all(state is not None and state.last_query_at == datetime(2026, 1, 1) for _, _, state in rows)
+
+
+def test_resolved_location_is_committed_with_the_reading(session, monkeypatch):
+    user_id = _create_user(session, "owner")
+    _create_subscriptions(session, user_id, 1)
+    subscription = session.exec(select(Subscription)).one()
+    location = {"area_id": "0", "building_code": "b", "floor_code": "1", "room_code": "R0"}
+    commits = []
+    commit = session.commit
+    monkeypatch.setattr(session, "commit", lambda: commits.append(1) or commit())
+
+    assert SubscriptionService(session).save_resolved_location(subscription, {"data": {"location": location}})
+    assert commits == []
+    HistoryService(session).ingest([HistoryReading(subscription.id, 42.0, datetime(2026, 1, 2))])
+
+    assert commits == [1]
+    session.expire_all()
+    assert session.get(Subscription, subscription.id).resolved_location == location
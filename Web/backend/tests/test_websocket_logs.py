@@ -0,0 +1,54 @@
+"""实时日志 WebSocket：日志帧与确认消息串行写入同一连接"""
+import asyncio
+import json
+
+from fastapi import WebSocketDisconnect
+
+from app.api.websocket import websocket_logs
+from app.utils.log_hub import log_hub
+
+
+class FakeWebSocket:
+    """每次收到客户端消息前发布一条日志；发送时让出事件循环，重叠的发送会被记录"""
+
+    def __init__(self, pings: int):
+        self.pings = pings
+        self.sent = []
+        self.sending = False
+        self.overlapped = False
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self) -> str:
+        await asyncio.sleep(0)
+        if not self.pings:
+            # 等最后一条日志发出后再断开
+            while not any("ping 0" in text for text in self.sent):
+                await asyncio.sleep(0.01)
+            raise WebSocketDisconnect()
+        self.pings -= 1
+        log_hub.publish({"level": "INFO", "message": f"ping {self.pings}"})
+        return json.dumps({"type": "ping"})
+
+    async def send_text(self, text: str):
+        self.overlapped |= self.sending
+        self.sending = True
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.sent.append(text)
+        self.sending = False
+
+    async def send_json(self, data: dict):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+def test_acks_and_log_frames_are_not_sent_concurrently():
+    websocket = FakeWebSocket(pings=20)
+    asyncio.run(websocket_logs(websocket))
+
+    frames = [json.loads(text) for text in websocket.sent]
+    assert not websocket.overlapped
+    assert sum(frame["type"] == "ack" for frame in frames) == 20
+    assert [m["message"] for f in frames if f["type"] == "batch" for m in f["messages"]] == [f"ping {i}" for i in reversed(range(20))]
+    assert not log_hub.subscribers
@@ -145,14 +145,15 @@ export default function DashboardPage() {
     try {
       setRefreshing(true);
       const timeParams = getTimeRangeParams();
-      const resp = await api.get(`/api/history/subscriptions/${subscriptionId}`, {
+      const resp = await api.get(`/api/history/subscriptions/${subscriptionId}/series`, {
         params: {
-          limit: 1000,
-          ...timeParams
+          max_points: 500,
+          start: timeParams.start_time,
+          end: timeParams.end_time
         }
       });
-      const data = resp.data || [];
-      setHistory(Array.isArray(data) ? data.slice().reverse() : []);
+      const points = resp.data?.points || [];
+      setHistory(Array.isArray(points) ? points : []);
     } catch (error) {
       console.error('Failed to fetch history:', error);
       setHistory([]);
@@ -18,9 +18,11 @@ import api from '@/lib/api';
 import { isAuthenticated } from '@/lib/auth';
 
 interface HistoryRecord {
-  id: string;
+  // 游程展开出的末次读数没有对应的记录 id
+  id: string | null;
   surplus: number;
   timestamp: string;
+  run_end?: boolean;
 }
 
 type TimeRange = 'today' | '24h' | '48h' | '72h' | 'week' | 'month' | 'custom';
@@ -349,7 +351,7 @@ export default function HistoryPage() {
                   <div className="space-y-3">
                     {history.map((record, index) => (
                       <motion.div
-                        key={record.id}
+                        key={record.run_end ? `${record.timestamp}-run-end` : record.id!}
                         initial={{ opacity: 0, x: -20 }}
                         animate={{ opacity: 1, x: 0 }}
                         transition={{ delay: 0.3 + index * 0.05 }}
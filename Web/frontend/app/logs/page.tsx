@@ -525,11 +525,50 @@ export default function LogsPage() {
         
         try {
           ws.send(JSON.stringify({ type: 'ping' }));
+          // 只订阅 PM2 日志，由后端过滤，不再接收全部日志后在前端丢弃
+          ws.send(JSON.stringify({ type: 'subscribe', module: 'pm2.' }));
         } catch (e) {
           console.error('Failed to send ping:', e);
         }
       };
 
+      const handleLogMessage = (data: any) => {
+        if (!data.message && !data.level) {
+          console.warn('Invalid WebSocket message format:', data);
+          return;
+        }
+        
+        // 过滤掉无关的日志：只显示PM2日志
+        const module = data.module || '';
+        const isPm2Log = module.startsWith('pm2.');
+        
+        // 过滤掉websocket连接相关的日志
+        const isWebSocketLog = module === 'websocket' || 
+                               (typeof data.message === 'string' && 
+                                (data.message.includes('WebSocket connection') || 
+                                 data.message.includes('WebSocket error') ||
+                                 data.message.includes('WebSocket closed')));
+        
+        // 只显示PM2日志，过滤掉其他无关日志
+        if (!isPm2Log || isWebSocketLog) {
+          return;
+        }
+        
+        const line: LogRecord = {
+          level: (data.level || 'INFO').toUpperCase(),
+          message: String(data.message || ''),
+          module: data.module || null,
+          timestamp: data.timestamp || new Date().toISOString(),
+          process: data.process || null, // PM2进程名称
+        };
+        
+        if (terminal && terminalInstanceRef.current) {
+          writeLogToTerminal(terminal, line);
+        } else {
+          console.warn('Terminal not available when receiving WebSocket message');
+        }
+      };
+
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
@@ -538,40 +577,16 @@ export default function LogsPage() {
             return;
           }
           
-          if (!data.message && !data.level) {
-            console.warn('Invalid WebSocket message format:', data);
-            return;
-          }
-          
-          // 过滤掉无关的日志：只显示PM2日志
-          const module = data.module || '';
-          const isPm2Log = module.startsWith('pm2.');
-          
-          // 过滤掉websocket连接相关的日志
-          const isWebSocketLog = module === 'websocket' || 
-                                 (typeof data.message === 'string' && 
-                                  (data.message.includes('WebSocket connection') || 
-                                   data.message.includes('WebSocket error') ||
-                                   data.message.includes('WebSocket closed')));
-          
-          // 只显示PM2日志，过滤掉其他无关日志
-          if (!isPm2Log || isWebSocketLog) {
+          // 后端把积压的日志合并为一个帧发送；跟不上时会丢弃最旧的日志
+          if (data.type === 'batch') {
+            if (data.dropped > 0 && terminal && terminalInstanceRef.current) {
+              terminal.writeln(`\x1b[33m[已跳过 ${data.dropped} 条日志：显示速度跟不上日志产生速度]\x1b[0m`);
+            }
+            (data.messages || []).forEach(handleLogMessage);
             return;
           }
           
-          const line: LogRecord = {
-            level: (data.level || 'INFO').toUpperCase(),
-            message: String(data.message || ''),
-            module: data.module || null,
-            timestamp: data.timestamp || new Date().toISOString(),
-            process: data.process || null, // PM2进程名称
-          };
-          
-          if (terminal && terminalInstanceRef.current) {
-            writeLogToTerminal(terminal, line);
-          } else {
-            console.warn('Terminal not available when receiving WebSocket message');
-          }
+          handleLogMessage(data);
         } catch (e) {
           console.error('Failed to parse ws log message', e, event.data);
           // 尝试显示原始消息
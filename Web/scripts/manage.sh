@@ -250,8 +250,17 @@ db_operation() {
             python scripts/check_db.py
             ;;
         migrate)
-            print_header "数据库迁移（添加管理员字段）"
+            print_header "数据库迁移（增量字段）"
             python scripts/migrate_add_admin.py
+            python scripts/migrate_add_resolved_location.py
+            python scripts/migrate_add_pagination_indexes.py
+            python scripts/migrate_add_state_aggregates.py
+            python scripts/migrate_add_history_runs.py
+            python scripts/migrate_add_history_unique.py
+            ;;
+        rebuild-rollups)
+            print_header "重建历史汇总表与订阅状态"
+            python scripts/rebuild_history_rollups.py
             ;;
         migrate-mode2)
             print_header "从 Bot 版本迁移数据"
@@ -263,6 +272,7 @@ db_operation() {
             echo -e "  ${CYAN}init${NC}          # 初始化数据库"
             echo -e "  ${CYAN}check${NC}         # 检查数据库状态"
             echo -e "  ${CYAN}migrate${NC}       # 数据库迁移"
+            echo -e "  ${CYAN}rebuild-rollups${NC} # 重建历史汇总表与订阅状态"
             echo -e "  ${CYAN}migrate-mode2${NC} # 从 Bot 版本迁移数据"
             exit 1
             ;;
@@ -337,6 +347,7 @@ show_help() {
     echo -e "  ${YELLOW}init${NC}          # 初始化数据库"
     echo -e "  ${YELLOW}check${NC}         # 检查数据库状态"
     echo -e "  ${YELLOW}migrate${NC}       # 数据库迁移（添加管理员字段）"
+    echo -e "  ${YELLOW}rebuild-rollups${NC} # 重建历史汇总表（小时 / 天）与订阅状态"
     echo -e "  ${YELLOW}migrate-mode2${NC} # 从 Bot 版本迁移数据"
     
     echo -e "\n${CYAN}清理目标:${NC}"